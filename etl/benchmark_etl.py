@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmark_etl.py
+============================================================================
+
+OBJETIVO
+--------
+Saber si un cambio en `normalizar_CSVs.py` lo hace más rápido o más lento.
+Mide cada etapa del ETL y el ETL completo sobre fuentes sintéticas de varios
+tamaños (`generar_sinteticos.py`), guarda filas/s y memoria pico en un JSON y
+lo compara con una línea base: si alguna medida empeora más del umbral, el
+script termina con código 1.
+
+Etapas (cada una sobre las tres fuentes):
+  - leer:              `_read_csv_any`
+  - renombrar:         `_rename_cols`
+  - fechas:            `_to_iso_series` (la versión por columna de `_to_iso`) en las tres columnas de fecha
+  - categorizar:       `_categorizar_paralelo` en serie (bucle de categorización)
+  - postfix:           `_postfix_dates_states` sobre el DF unificado
+  - extremo_a_extremo: `normalizar_CSVs.py --fuentes ... --sin-cache --jobs 1` en un subproceso
+
+PUNTOS CLAVE:
+------------
+1) Cada (tamaño, etapa) se mide en un proceso nuevo: la preparación de la
+   entrada (leer, normalizar...) no cuenta y la memoria de una etapa no se
+   mezcla con la de otras. La memoria es el pico de RSS *durante* la etapa
+   (en Linux se reinicia el pico con `/proc/self/clear_refs`; en otros
+   sistemas es el pico del proceso desde que arrancó).
+2) Se repite cada etapa `--repeticiones` veces y se guarda el mejor tiempo
+   (el menos afectado por el ruido) y el mayor pico de memoria.
+3) Las fuentes se generan una vez por tamaño y semilla en
+   `data/sinteticos/benchmark/` y se reutilizan en las siguientes ejecuciones.
+4) Regresión: `filas_s` por debajo de `base * (1 - --umbral)` o memoria por
+   encima de `base * (1 + --umbral-memoria)`. Las etapas que tardan menos de
+   `MIN_SEGUNDOS` no se comparan en tiempo (solo ruido).
+
+Uso:
+    python etl/benchmark_etl.py [--filas 10k,100k,1M,10M] [--guardar-baseline]
+    python etl/benchmark_etl.py --filas 10k,100k --baseline logs/benchmark_baseline.json --umbral 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import generar_sinteticos
+import normalizar_CSVs as etl
+from instrumentacion import _rss_max_mb
+
+
+DATOS: Path = etl.ROOT / "data" / "sinteticos" / "benchmark"
+RESULTADOS: Path = etl.LOGS_DIR / "benchmark_etl.json"
+BASELINE: Path = etl.LOGS_DIR / "benchmark_baseline.json"
+SCRIPT_ETL: Path = Path(__file__).resolve().parent / "normalizar_CSVs.py"
+
+TAMANOS: str = "10k,100k,1M,10M"
+ETAPAS: Tuple[str, ...] = ("leer", "renombrar", "fechas", "categorizar", "postfix", "extremo_a_extremo")
+UMBRAL: float = 0.20
+UMBRAL_MEMORIA: float = 0.25
+MIN_SEGUNDOS: float = 0.05
+# `now` fijo: el postfix (cierres en el futuro) no depende del día en que se mida
+AHORA = pd.Timestamp("2026-01-01 00:00")
+
+
+def _tamano(texto: str) -> int:
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500."""
+    t = texto.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(t[-1:], 1)
+    return int(float(t[:-1] if mult > 1 else t) * mult)
+
+
+def _fuentes(filas: int, seed: int) -> Path:
+    """`fuentes.json` de las fuentes sintéticas de `filas` filas (las genera si no existen)."""
+    destino = DATOS / f"{filas}_s{seed}"
+    registro = destino / "fuentes.json"
+    if not registro.exists():
+        generar_sinteticos.generar(destino, filas, seed)
+    return registro
+
+
+#------------------------------
+# MEDIDA (en un proceso nuevo)
+#------------------------------
+
+def _reiniciar_pico() -> bool:
+    """Reinicia el pico de RSS del proceso (Linux); devuelve si se ha podido."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _preparar(etapa: str, fuentes: List[dict]) -> Callable[[], int]:
+    """Prepara la entrada de `etapa` (sin medir) y devuelve la función a medir (devuelve filas)."""
+    if etapa == "leer":
+        return lambda: sum(len(etl._read_csv_any(Path(spec["ruta"]))) for spec in fuentes)
+
+    crudos = [etl._read_csv_any(Path(spec["ruta"])) for spec in fuentes]
+    if etapa == "renombrar":
+        return lambda: sum(len(etl._rename_cols(df)) for df in crudos)
+
+    renombrados = [etl._rename_cols(df) for df in crudos]
+    del crudos
+    if etapa == "fechas":
+        def fechas() -> int:
+            for df in renombrados:
+                for c in etl.COLS_FECHA:
+                    if c in df.columns:
+                        etl._to_iso_series(df[c])
+            return sum(map(len, renombrados))
+        return fechas
+
+    if etapa == "categorizar":
+        textos = [etl._normalizar_campos(df, spec)["texto_norm"] for df, spec in zip(renombrados, fuentes)]
+        del renombrados
+        return lambda: sum(len(etl._categorizar_paralelo(t)[0]) for t in textos)
+
+    if etapa == "postfix":
+        final = etl._concatenar([etl._normalize_frame(df, spec)[0] for df, spec in zip(renombrados, fuentes)])
+        del renombrados
+        return lambda: len(etl._postfix_dates_states(final, AHORA)[0])
+
+    raise ValueError(f"Etapa desconocida: {etapa!r}")
+
+
+def _medir_etapa(etapa: str, registro: str, repeticiones: int) -> dict:
+    """Punto de entrada del proceso de medida de una etapa."""
+    # El manifiesto de dialectos de las fuentes de prueba no va al del ETL
+    etl.MANIFIESTO_CSV = Path(registro).parent / "csv_dialectos.json"
+    medir = _preparar(etapa, etl._cargar_fuentes(Path(registro)))
+    mejor, cpu, pico, filas = float("inf"), 0.0, 0.0, 0
+    for _ in range(repeticiones):
+        reiniciado = _reiniciar_pico()
+        base = _rss_max_mb()
+        t0, c0 = time.perf_counter(), time.process_time()
+        filas = medir()
+        wall, c = time.perf_counter() - t0, time.process_time() - c0
+        if wall < mejor:
+            mejor, cpu = wall, c
+        pico = max(pico, _rss_max_mb() or 0.0)
+    return {"filas_etapa": int(filas), "wall_s": mejor, "cpu_s": cpu,
+            "mem_base_mb": base, "mem_pico_mb": pico, "pico_reiniciado": reiniciado}
+
+
+def _medir_extremo(registro: Path, repeticiones: int) -> dict:
+    """ETL completo en un subproceso (con `cwd` propio: no toca las salidas reales)."""
+    trabajo = registro.parent / "trabajo"
+    trabajo.mkdir(exist_ok=True)
+    cmd = [sys.executable, str(SCRIPT_ETL), "--fuentes", str(registro), "--sin-cache", "--jobs", "1"]
+    mejor, pico = float("inf"), None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=trabajo, stdout=subprocess.DEVNULL)
+        if hasattr(os, "wait4"):  # uso de recursos de este hijo (ru_maxrss en KB en Linux)
+            _, estado, uso = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(estado)
+            pico = max(pico or 0.0, uso.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10))
+        else:
+            proc.wait()
+        mejor = min(mejor, time.perf_counter() - t0)
+        if proc.returncode != 0:
+            raise RuntimeError(f"El ETL ha terminado con código {proc.returncode}: {' '.join(cmd)}")
+    reporte = json.loads((trabajo / "logs" / etl.REPORT_PATH.name).read_text(encoding="utf-8"))
+    return {"filas_etapa": int(reporte["total"]), "wall_s": mejor, "cpu_s": None,
+            "mem_base_mb": None, "mem_pico_mb": pico, "pico_reiniciado": False}
+
+
+def _medir(filas: int, etapa: str, registro: Path, repeticiones: int) -> dict:
+    if etapa == "extremo_a_extremo":
+        r = _medir_extremo(registro, repeticiones)
+    else:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as ex:
+            r = ex.submit(_medir_etapa, etapa, str(registro), repeticiones).result()
+    r["filas_s"] = r["filas_etapa"] / r["wall_s"] if r["wall_s"] > 0 else None
+    redondear = lambda v, d: round(v, d) if v is not None else None
+    return {"filas": filas, "etapa": etapa, **{k: redondear(v, 4 if k.endswith("_s") else 1)
+                                               if isinstance(v, float) else v for k, v in r.items()}}
+
+
+#------------------------------
+# LÍNEA BASE
+#------------------------------
+
+def _regresiones(actual: List[dict], base: List[dict], umbral: float, umbral_memoria: float) -> List[str]:
+    """Medidas de `actual` que empeoran respecto a la misma (filas, etapa) de `base` más que el umbral."""
+    previas = {(r["filas"], r["etapa"]): r for r in base}
+    out = []
+    for r in actual:
+        b = previas.get((r["filas"], r["etapa"]))
+        if b is None:
+            continue
+        nombre = f"{r['etapa']} ({r['filas']:,} filas)"
+        if (r["filas_s"] and b["filas_s"] and min(r["wall_s"], b["wall_s"]) >= MIN_SEGUNDOS
+                and r["filas_s"] < b["filas_s"] * (1 - umbral)):
+            out.append(f"{nombre}: {r['filas_s']:,.0f} filas/s frente a {b['filas_s']:,.0f} "
+                       f"({r['filas_s'] / b['filas_s'] - 1:+.0%})")
+        if r["mem_pico_mb"] and b["mem_pico_mb"] and r["mem_pico_mb"] > b["mem_pico_mb"] * (1 + umbral_memoria):
+            out.append(f"{nombre}: {r['mem_pico_mb']:,.0f} MB frente a {b['mem_pico_mb']:,.0f} "
+                       f"({r['mem_pico_mb'] / b['mem_pico_mb'] - 1:+.0%})")
+    return out
+
+
+def _entorno() -> Dict[str, Optional[str]]:
+    return {"fecha": pd.Timestamp.now().isoformat(timespec="seconds"), "plataforma": platform.platform(),
+            "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "pyarrow": "sí" if etl.lectura_csv.HAY_ARROW else "no", "cpus": str(os.cpu_count())}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--filas", default=TAMANOS, help=f"Tamaños separados por comas (por defecto {TAMANOS}).")
+    ap.add_argument("--etapas", default=",".join(ETAPAS), help="Etapas a medir, separadas por comas.")
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--salida", type=Path, default=RESULTADOS)
+    ap.add_argument("--baseline", type=Path, default=BASELINE, help="JSON de referencia (si existe, se compara).")
+    ap.add_argument("--guardar-baseline", action="store_true", help="Guarda los resultados como nueva línea base.")
+    ap.add_argument("--umbral", type=float, default=UMBRAL, help="Caída máxima de filas/s admitida (0.2 = 20%%).")
+    ap.add_argument("--umbral-memoria", type=float, default=UMBRAL_MEMORIA, help="Aumento máximo de memoria pico admitido.")
+    args = ap.parse_args()
+
+    etapas = [e.strip() for e in args.etapas.split(",") if e.strip()]
+    desconocidas = set(etapas) - set(ETAPAS)
+    if desconocidas:
+        ap.error(f"etapas desconocidas: {sorted(desconocidas)} (disponibles: {', '.join(ETAPAS)})")
+    if args.repeticiones < 1:
+        ap.error(f"--repeticiones debe ser al menos 1 (recibido {args.repeticiones})")
+
+    resultados = []
+    print(f"{'filas':>12} {'etapa':<18} {'wall (s)':>9} {'filas/s':>13} {'mem pico (MB)':>14}")
+    for filas in map(_tamano, args.filas.split(",")):
+        registro = _fuentes(filas, args.seed)
+        for nombre in etapas:
+            r = _medir(filas, nombre, registro, args.repeticiones)
+            resultados.append(r)
+            print(f"{filas:>12,} {nombre:<18} {r['wall_s']:>9.3f} {r['filas_s'] or 0:>13,.0f} "
+                  f"{r['mem_pico_mb'] or 0:>14,.1f}")
+
+    informe = {"entorno": _entorno(), "seed": args.seed, "repeticiones": args.repeticiones,
+               "resultados": resultados}
+    args.salida.parent.mkdir(parents=True, exist_ok=True)
+    args.salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Resultados: {args.salida}")
+
+    if args.guardar_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Línea base guardada: {args.baseline}")
+    elif args.baseline.exists():
+        base = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regresiones = _regresiones(resultados, base["resultados"], args.umbral, args.umbral_memoria)
+        if regresiones:
+            print(f"REGRESIÓN respecto a {args.baseline}:")
+            for r in regresiones:
+                print(f"  - {r}")
+            sys.exit(1)
+        print(f"Sin regresiones respecto a {args.baseline} (umbral {args.umbral:.0%}, memoria {args.umbral_memoria:.0%}).")
+    else:
+        print(f"Sin línea base en {args.baseline}: usa --guardar-baseline para crearla.")
+
+
+if __name__ == "__main__":
+    main()
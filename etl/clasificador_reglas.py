@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+clasificador_reglas.py
+============================================================================
+
+OBJETIVO
+--------
+Clasificador de categorías por reglas (diccionarios `KW`/`ADD`/`NEG` y
+reglas contextuales) reutilizable fuera del ETL: triaje de lotes, scripts de
+ML como alternativa al modelo, etc. Es el mismo que usa `normalizar_CSVs.py`
+(mismas categorías, bit a bit).
+
+PUNTOS CLAVE:
+------------
+1) Las reglas están en `reglas/categorias.json` (pesos, orden de desempate,
+   `KW`, `ADD`, `NEG` y `reglas_contextuales`), no en el código.
+2) Se compilan una vez en un artefacto serializado
+   `reglas/compilado/reglas-<huella>-f<formato>-u<unicode>.pkl`: fuentes de
+   los patrones, índice por primera palabra, arrays de categoría/peso/tipo
+   por patrón y la tabla de marcas diacríticas para plegar el texto. La huella es el hash del
+   contenido de las reglas (JSON canónico): el artefacto solo se reconstruye
+   cuando cambian (o cambia el formato del artefacto o la versión de
+   Unicode de Python).
+3) Cargar el artefacto no importa pandas ni recorre la tabla Unicode; solo
+   compila los regex (~20 ms).
+4) `classify_batch(textos)` pliega los textos (sin tildes, en minúsculas) y
+   clasifica una vez cada texto distinto.
+
+Uso:
+    from clasificador_reglas import classify_batch
+    classify_batch(["No puedo entrar en Outlook", "La VPN va muy lenta"])  # ["MAIL", "NET"]
+
+    python etl/clasificador_reglas.py [--reglas RUTA] [--compilar] "texto 1" "texto 2"
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import re
+import sys
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+REGLAS_JSON: Path = Path(__file__).resolve().parent / "reglas" / "categorias.json"
+ARTEFACTOS_DIR: Path = REGLAS_JSON.parent / "compilado"
+# Versión del formato del artefacto: cambiarla si cambia lo que se guarda o cómo se usa
+FORMATO: int = 1
+
+TIPOS: Tuple[str, ...] = ("KW", "ADD", "NEG")
+METRICAS: Tuple[str, ...] = ("filas_con_add", "filas_con_neg", "filas_ajustadas_por_reglas")
+
+# Caracteres no ASCII que `re.I` iguala a una letra ASCII.
+_PLIEGUE_IGNORECASE = str.maketrans({"İ": "i", "ı": "i", "ſ": "s", "K": "k"})
+_RE_PALABRA = re.compile(r"\w+")
+
+
+#------------------------------
+# REGLAS Y HUELLA
+#------------------------------
+
+def cargar_reglas(ruta: Path = REGLAS_JSON) -> dict:
+    """Lee y valida el fichero de reglas."""
+    reglas = json.loads(Path(ruta).read_text(encoding="utf-8"))
+    faltan = {"pesos", "orden_desempate", *TIPOS, "reglas_contextuales"} - set(reglas)
+    if faltan:
+        raise ValueError(f"{ruta}: faltan claves {sorted(faltan)}")
+    cats = set(reglas["KW"])
+    for clave in ("ADD", "NEG"):
+        if set(reglas[clave]) - cats:
+            raise ValueError(f"{ruta}: categorías de {clave} sin KW: {sorted(set(reglas[clave]) - cats)}")
+    if set(reglas["orden_desempate"]) != cats:
+        raise ValueError(f"{ruta}: orden_desempate debe contener exactamente las categorías de KW")
+    for regla in reglas["reglas_contextuales"]:
+        usadas = {regla.get("prefer"), *regla.get("demote", [])} - {None}
+        if usadas - cats:
+            raise ValueError(f"{ruta}: regla contextual con categorías desconocidas {sorted(usadas - cats)}")
+    return reglas
+
+
+def huella_reglas(reglas: dict) -> str:
+    """Hash del contenido de las reglas (independiente del formato del fichero)."""
+    texto = json.dumps(reglas, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+#------------------------------
+# COMPILACIÓN
+#------------------------------
+
+def _normalize_for_regex(token: str) -> str:
+    """Quita tildes y convierte espacios en `\\s+` para cuadrar variantes."""
+    t = "".join(c for c in unicodedata.normalize("NFD", token) if unicodedata.category(c) != "Mn")
+    t = re.sub(r"\s+", r"\\s+", t.strip())
+    return t
+
+
+def _indice_palabra(fuentes: List[str]) -> Tuple[Dict[str, List[int]], List[int]]:
+    """
+    Índice `primera palabra -> ids de patrón` y lista de ids que no se pueden
+    indexar (se buscan con `search` sobre todo el texto).
+
+    Todos los patrones empiezan en un inicio de palabra (`(?<!\\w)` + carácter
+    de palabra), así que solo pueden casar donde empieza un tramo `\\w+` del
+    texto. Los patrones cuya primera palabra no es literal (p. ej. "802.1x",
+    el punto es comodín) se buscan aparte.
+    """
+    indice: Dict[str, List[int]] = {}
+    siempre: List[int] = []
+    for i, patron in enumerate(fuentes):
+        fuente = patron[len(r"(?<!\w)"):]
+        m = re.match(r"[A-Za-z0-9_]+", fuente)
+        resto = fuente[m.end():] if m else ""
+        if m and (resto.startswith((r"\s+", r"(?!\w)")) or resto[:1] == "-"):
+            indice.setdefault(m.group().lower(), []).append(i)
+        else:
+            siempre.append(i)
+    return indice, siempre
+
+
+def compilar(reglas: dict) -> dict:
+    """Reglas -> artefacto (dict serializable, sin objetos de este módulo)."""
+    cats = list(reglas["KW"])
+    idx = {c: i for i, c in enumerate(cats)}
+    # Entradas en el orden original (KW, ADD, NEG): (fuente regex, categoría, tipo)
+    patrones = [(rf"(?<!\w){_normalize_for_regex(tok)}(?!\w)", cat, tipo)
+                for tipo in TIPOS for cat, toks in reglas[tipo].items() for tok in toks]
+    indice, siempre = _indice_palabra([p for p, _, _ in patrones])
+    return {
+        "formato": FORMATO,
+        "huella": huella_reglas(reglas),
+        "unicode": unicodedata.unidata_version,
+        "reglas": reglas,
+        "patrones": patrones,
+        "indice": indice,
+        "siempre": siempre,
+        "col": np.array([idx[cat] for _, cat, _ in patrones], dtype=np.int64),
+        "peso": np.array([reglas["pesos"][tipo] for _, _, tipo in patrones], dtype=np.float64),
+        "es_add": np.array([tipo == "ADD" for _, _, tipo in patrones], dtype=bool),
+        "es_neg": np.array([tipo == "NEG" for _, _, tipo in patrones], dtype=bool),
+        # Tabla para `str.translate`: borra todos los caracteres de categoría `Mn`
+        "marcas": dict.fromkeys(cp for cp in range(sys.maxunicode + 1) if unicodedata.category(chr(cp)) == "Mn"),
+    }
+
+
+#------------------------------
+# CLASIFICADOR
+#------------------------------
+
+class Clasificador:
+    """Reglas compiladas: búsqueda de patrones por texto y categorización por lotes."""
+
+    def __init__(self, artefacto: dict):
+        self.huella: str = artefacto["huella"]
+        self.reglas: dict = artefacto["reglas"]
+        self.cats: List[str] = list(self.reglas["KW"])
+        self.orden: List[str] = self.reglas["orden_desempate"]
+        self.marcas: Dict[int, None] = artefacto["marcas"]
+        self.patrones: List[Tuple[re.Pattern, str, str]] = [
+            (re.compile(p, flags=re.I), cat, tipo) for p, cat, tipo in artefacto["patrones"]]
+        self._regex = [p for p, _, _ in self.patrones]
+        self._indice: Dict[str, List[int]] = artefacto["indice"]
+        self._siempre: List[int] = artefacto["siempre"]
+        self._col, self._peso = artefacto["col"], artefacto["peso"]
+        self._es_add, self._es_neg = artefacto["es_add"], artefacto["es_neg"]
+        self._idx = {c: i for i, c in enumerate(self.cats)}
+        self._desempate = np.array([self._idx[c] for c in self.orden], dtype=np.int64)
+
+    def plegar(self, text: str) -> str:
+        """Texto sin tildes y en minúsculas (lo que consumen los comparadores)."""
+        if text.isascii():
+            return text.lower()
+        return unicodedata.normalize("NFD", text).translate(self.marcas).lower()
+
+    def hits(self, t: str) -> List[int]:
+        """
+        Ids (ordenados) de los patrones presentes en el texto `t` (ya
+        plegado). Equivale a `p.search(t)` para cada patrón, pero recorre el
+        texto una vez, palabra a palabra, y solo verifica (con `match` en esa
+        posición) los patrones cuya primera palabra coincide.
+        """
+        found = set()
+        regex = self._regex
+        for m in _RE_PALABRA.finditer(t):
+            ids = self._indice.get(m.group().translate(_PLIEGUE_IGNORECASE).lower())
+            if ids:
+                pos = m.start()
+                for i in ids:
+                    if i not in found and regex[i].match(t, pos):
+                        found.add(i)
+        for i in self._siempre:
+            if regex[i].search(t):
+                found.add(i)
+        return sorted(found)
+
+    def puntuar(self, t: str) -> Tuple[Dict[str, float], int, int]:
+        """
+        Puntuación por categoría del texto `t` (ya plegado) antes de las
+        reglas contextuales y nº de impactos ADD y NEG. Es la fila de
+        `categorizar` para un solo texto (mismo orden de sumas).
+        """
+        pesos = self.reglas["pesos"]
+        scores: Dict[str, float] = {c: 0.0 for c in self.cats}
+        impactos = {"ADD": 0, "NEG": 0}
+        for i in self.hits(t):
+            _, cat, tipo = self.patrones[i]
+            scores[cat] += pesos[tipo]
+            if tipo in impactos:
+                impactos[tipo] += 1
+        return scores, impactos["ADD"], impactos["NEG"]
+
+    def categorizar(self, textos: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Categoriza textos ya plegados. Devuelve el array de categorías y una
+        matriz booleana (textos x `METRICAS`) con los indicadores de impacto
+        ADD, impacto NEG y ajuste por reglas contextuales de cada texto.
+
+        Las operaciones por celda se hacen en el mismo orden que la versión
+        por fila original del ETL (puntuar, reglas contextuales y decidir),
+        así que las puntuaciones coinciden bit a bit.
+        """
+        n = len(textos)
+
+        # 1) Impactos por fila -> matriz de puntuaciones
+        hits = [self.hits(t) for t in textos]
+        por_fila = np.fromiter(map(len, hits), dtype=np.int64, count=n)
+        filas = np.repeat(np.arange(n, dtype=np.int64), por_fila)
+        ids = np.fromiter(itertools.chain.from_iterable(hits), dtype=np.int64, count=int(por_fila.sum()))
+        scores = np.zeros((n, len(self.cats)), dtype=np.float64)
+        np.add.at(scores, (filas, self._col[ids]), self._peso[ids])
+        add_rows = np.bincount(filas[self._es_add[ids]], minlength=n) > 0
+        neg_rows = np.bincount(filas[self._es_neg[ids]], minlength=n) > 0
+
+        # 2) Reglas contextuales como máscaras booleanas
+        s = scores.copy()
+        for regla in self.reglas["reglas_contextuales"]:
+            toks = regla["if_any"]
+            mask = np.fromiter((any(tok in t for tok in toks) for t in textos), dtype=bool, count=n)
+            if not mask.any():
+                continue
+            pref   = regla.get("prefer")
+            demote = regla.get("demote", [])
+            boost  = float(regla.get("boost", 0.0))
+            force  = bool(regla.get("force", False))
+
+            if pref:
+                p = self._idx[pref]
+                s[mask, p] += boost
+                if force:
+                    otras = [i for i in range(len(self.cats)) if i != p]
+                    sub = s[np.ix_(mask, otras)]
+                    s[np.ix_(mask, otras)] = np.minimum(sub, s[mask, p][:, None] - 1e-6)
+
+            for c in demote:
+                s[mask, self._idx[c]] -= boost/2.0
+        ctx_rows = (s != scores).any(axis=1)
+
+        # 3) Decisión: máximo con desempate por `orden_desempate` (argmax = primer candidato)
+        ordenada = s[:, self._desempate]
+        mv = ordenada.max(axis=1) if n else np.zeros(0)
+        cands = np.abs(ordenada - mv[:, None]) < 1e-12
+        cats = np.array(self.orden, dtype=object)[cands.argmax(axis=1)]
+        cats[mv <= 0.0] = "SRV"
+
+        return cats, np.column_stack([add_rows, neg_rows, ctx_rows])
+
+    def clasificar(self, textos: Sequence[str]) -> List[str]:
+        """Categoría de cada texto (sin plegar), una vez por texto distinto."""
+        plegados = [self.plegar(t or "") for t in textos]
+        unicos = list(dict.fromkeys(plegados))
+        cats, _ = self.categorizar(unicos)
+        por_texto = dict(zip(unicos, cats.tolist()))
+        return [por_texto[t] for t in plegados]
+
+
+#------------------------------
+# ARTEFACTO
+#------------------------------
+
+def _ruta_artefacto(huella: str, artefactos: Path) -> Path:
+    # La tabla de marcas depende de la versión de Unicode de Python
+    return artefactos / f"reglas-{huella}-f{FORMATO}-u{unicodedata.unidata_version}.pkl"
+
+
+@functools.lru_cache(maxsize=8)
+def cargar(ruta: Path = REGLAS_JSON, artefactos: Path = ARTEFACTOS_DIR) -> Clasificador:
+    """
+    Clasificador de las reglas de `ruta`: carga el artefacto compilado si
+    existe para su huella; si no, compila las reglas, guarda el artefacto y
+    borra los anteriores. Se memoiza por proceso.
+    """
+    reglas = cargar_reglas(ruta)
+    destino = _ruta_artefacto(huella_reglas(reglas), Path(artefactos))
+    if destino.exists():
+        try:
+            with destino.open("rb") as fh:
+                return Clasificador(pickle.load(fh))
+        except Exception:  # artefacto corrupto o de otra versión: se recompila
+            pass
+
+    artefacto = compilar(reglas)
+    try:
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("wb") as fh:
+            pickle.dump(artefacto, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, destino)
+        for antiguo in destino.parent.glob("reglas-*.pkl"):
+            if antiguo != destino:
+                antiguo.unlink(missing_ok=True)
+    except OSError:  # sin permisos de escritura: se usa sin guardar
+        pass
+    return Clasificador(artefacto)
+
+
+def classify_batch(texts: Sequence[str], reglas: Optional[Path] = None) -> List[str]:
+    """Categoría de cada texto (resumen, descripción o ambos) con las reglas por defecto o las de `reglas`."""
+    return cargar(REGLAS_JSON if reglas is None else Path(reglas)).clasificar(texts)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("textos", nargs="*", help="Textos a clasificar.")
+    ap.add_argument("--reglas", type=Path, default=REGLAS_JSON)
+    ap.add_argument("--compilar", action="store_true", help="Compila (si hace falta) y muestra la huella.")
+    args = ap.parse_args()
+
+    clasificador = cargar(args.reglas)
+    if args.compilar:
+        print(f"Reglas: {args.reglas}\nHuella: {clasificador.huella}\n"
+              f"Artefacto: {_ruta_artefacto(clasificador.huella, ARTEFACTOS_DIR)}")
+    for texto, cat in zip(args.textos, clasificador.clasificar(args.textos)):
+        print(f"{cat}\t{texto}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+duplicados.py
+============================================================================
+
+OBJETIVO
+--------
+Detectar tickets casi duplicados (plantillas, reenvíos, el mismo ticket en
+dos fuentes) sin comparar todos los pares: índice MinHash/LSH sobre los
+shingles de `resumen + descripcion`. Cada ticket recibe un cluster (el
+primer ticket de su grupo de casi duplicados, o él mismo).
+
+PUNTOS CLAVE:
+------------
+1) Shingles: pares de palabras consecutivas del texto ya plegado
+   (`texto_norm`: sin tildes y en minúsculas); un texto de una sola palabra
+   es su propio shingle. Cada palabra se convierte en un hash de 64 bits
+   estable entre procesos (`pd.util.hash_array`).
+2) MinHash: `NUM_PERM` funciones multiply-shift `(a*x + b) >> 32` sobre los
+   hashes de los shingles y mínimo por texto (`np.minimum.reduceat`). Los
+   textos se firman una vez por texto distinto de cada lote.
+3) LSH: la firma se parte en `bandas` de `filas` valores (elegidas según el
+   umbral, como `datasketch`, pero pesando más los falsos negativos: los
+   candidatos se verifican después); dos textos son candidatos si coinciden
+   en alguna banda. Dentro de cada cubo solo se compara cada ticket con el
+   primero del cubo, así que el coste es lineal en nº de tickets x bandas.
+4) Verificación: un candidato se une al cluster si la similitud de Jaccard
+   estimada (fracción de valores de la firma que coinciden) es >= umbral.
+   Los clusters son componentes conexas (unión por etiquetas con NumPy).
+5) Memoria: por ticket se guardan la firma truncada a 16 bits (`NUM_PERM`
+   x 2 bytes) y una clave de 32 bits por banda (~200 bytes por ticket con
+   los valores por defecto). La indexación es incremental (`agregar` por
+   lotes o trozos de `--stream`) y el agrupamiento se hace al final.
+6) Textos vacíos: no se indexan (cada uno es su propio cluster).
+
+Uso:
+    indice = IndiceDuplicados(umbral=0.8)
+    indice.agregar(textos_norm_lote_1); indice.agregar(textos_norm_lote_2)
+    clusters = indice.clusters()  # posición del primer ticket de cada cluster
+"""
+
+from __future__ import annotations
+
+import itertools
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+NUM_PERM: int = 64
+UMBRAL: float = 0.8
+LOTE: int = 100_000             # textos distintos firmados a la vez
+LOTE_VERIFICACION: int = 1_000_000  # pares candidatos comparados a la vez
+SEMILLA: int = 1
+# Pesos de falsos positivos / negativos al elegir bandas: un falso positivo
+# solo cuesta una verificación, un falso negativo es un duplicado perdido.
+PESO_FP: float = 0.1
+PESO_FN: float = 0.9
+
+_MEZCLA = np.uint64(0x9E3779B97F4A7C15)  # mezcla de hashes de palabras consecutivas
+_FNV = np.uint64(0x100000001B3)          # combinación de los valores de una banda
+
+
+#------------------------------
+# PARÁMETROS LSH
+#------------------------------
+
+def _probabilidad(s: np.ndarray, bandas: int, filas: int) -> np.ndarray:
+    """Probabilidad de que dos textos con similitud `s` coincidan en alguna banda."""
+    return 1.0 - (1.0 - s ** filas) ** bandas
+
+
+def parametros_lsh(umbral: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    (bandas, filas) con `bandas * filas <= num_perm` que minimizan la suma
+    ponderada de falsos positivos (similitud < umbral que coinciden) y falsos
+    negativos (similitud >= umbral que no coinciden), como `datasketch`.
+    """
+    if not 0.0 < umbral < 1.0:
+        raise ValueError(f"umbral debe estar entre 0 y 1: {umbral!r}")
+    bajo, alto = np.linspace(0.0, umbral, 200), np.linspace(umbral, 1.0, 200)
+    mejor, params = float("inf"), (1, num_perm)
+    for bandas in range(1, num_perm + 1):
+        for filas in range(1, num_perm // bandas + 1):
+            fp = np.trapz(_probabilidad(bajo, bandas, filas), bajo)
+            fn = np.trapz(1.0 - _probabilidad(alto, bandas, filas), alto)
+            coste = PESO_FP * fp + PESO_FN * fn
+            if coste < mejor:
+                mejor, params = coste, (bandas, filas)
+    return params
+
+
+#------------------------------
+# FIRMAS
+#------------------------------
+
+def _shingles(textos: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashes de los shingles de todos los textos (en orden) y nº de shingles por texto."""
+    palabras = pd.Series(textos, dtype=object).str.split()
+    n_pal = palabras.str.len().to_numpy(dtype=np.int64)
+    total = int(n_pal.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(len(n_pal), dtype=np.int64)
+    h = pd.util.hash_array(np.fromiter(itertools.chain.from_iterable(palabras), dtype=object, count=total))
+    texto = np.repeat(np.arange(len(n_pal)), n_pal)
+
+    # Par (palabra, siguiente) si la siguiente es del mismo texto; palabra sola si el texto tiene una
+    sigue = np.zeros(total, dtype=bool)
+    sigue[:-1] = texto[1:] == texto[:-1]
+    pares = h.copy()
+    pares[:-1] = h[:-1] * _MEZCLA + h[1:]
+    sola = n_pal[texto] == 1
+    valores = np.where(sigue, pares, h)[sigue | sola]
+    return valores, np.where(n_pal > 1, n_pal - 1, n_pal)
+
+
+def _minhash(valores: np.ndarray, por_texto: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Firma (textos con shingles x permutaciones), `uint32`."""
+    inicios = np.concatenate([[0], np.cumsum(por_texto)[:-1]])[por_texto > 0]
+    firma = np.empty((len(inicios), len(a)), dtype=np.uint32)
+    buf = np.empty_like(valores)
+    for k in range(len(a)):  # operaciones in situ sobre un único buffer
+        np.multiply(valores, a[k], out=buf)
+        np.add(buf, b[k], out=buf)
+        np.right_shift(buf, np.uint64(32), out=buf)
+        firma[:, k] = np.minimum.reduceat(buf, inicios)
+    return firma
+
+
+def _claves_bandas(firma: np.ndarray, bandas: int, filas: int) -> np.ndarray:
+    """Clave de 32 bits de cada banda (textos x bandas)."""
+    claves = np.empty((len(firma), bandas), dtype=np.uint32)
+    for j in range(bandas):
+        clave = np.full(len(firma), 0xCBF29CE484222325, dtype=np.uint64)
+        for t in range(j * filas, (j + 1) * filas):
+            clave = (clave ^ firma[:, t].astype(np.uint64)) * _FNV
+        claves[:, j] = (clave >> np.uint64(32)).astype(np.uint32)
+    return claves
+
+
+#------------------------------
+# CLUSTERS
+#------------------------------
+
+def _unir(etiquetas: np.ndarray, u: np.ndarray, v: np.ndarray) -> None:
+    """
+    Une (in situ) los componentes de los pares (u, v). Invariante: cada
+    posición apunta a la raíz de su componente, que es su posición mínima.
+    """
+    while len(u):
+        eu, ev = etiquetas[u], etiquetas[v]
+        distintas = eu != ev
+        if not distintas.any():
+            return
+        u, v, eu, ev = u[distintas], v[distintas], eu[distintas], ev[distintas]
+        np.minimum.at(etiquetas, np.maximum(eu, ev), np.minimum(eu, ev))  # enganchar raíz mayor a menor
+        while True:  # comprimir caminos hasta que todo apunte a su raíz
+            siguiente = etiquetas[etiquetas]
+            if np.array_equal(siguiente, etiquetas):
+                break
+            etiquetas[:] = siguiente
+
+
+class IndiceDuplicados:
+    """Índice MinHash/LSH incremental de textos (`texto_norm`) en orden de llegada."""
+
+    def __init__(self, umbral: float = UMBRAL, num_perm: int = NUM_PERM, semilla: int = SEMILLA):
+        self.umbral = umbral
+        self.num_perm = num_perm
+        self.bandas, self.filas = parametros_lsh(umbral, num_perm)
+        rng = np.random.default_rng(semilla)
+        self._a = rng.integers(0, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)  # impares
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self._firmas: List[np.ndarray] = []   # uint16 (n x num_perm)
+        self._claves: List[np.ndarray] = []   # uint32 (n x bandas)
+        self._vacios: List[np.ndarray] = []   # bool (n,)
+        self._ids: List[np.ndarray] = []      # identificadores (opcionales) de los textos
+        self.n = 0
+
+    def agregar(self, textos: Sequence[str], ids: Optional[Sequence[str]] = None) -> None:
+        """Firma e indexa un lote de textos (una vez por texto distinto), con sus ids si se dan."""
+        codigos, unicos = pd.factorize(pd.Series(textos, dtype=object).fillna(""), use_na_sentinel=False)
+        unicos = np.asarray(unicos, dtype=object)
+        firmas = np.zeros((len(unicos), self.num_perm), dtype=np.uint16)
+        claves = np.zeros((len(unicos), self.bandas), dtype=np.uint32)
+        vacios = np.ones(len(unicos), dtype=bool)
+        for i in range(0, len(unicos), LOTE):
+            valores, por_texto = _shingles(unicos[i:i + LOTE])
+            con = np.flatnonzero(por_texto > 0) + i
+            if len(con):
+                firma = _minhash(valores, por_texto, self._a, self._b)
+                firmas[con] = firma.astype(np.uint16)  # b-bit MinHash: 16 bits bastan para estimar
+                claves[con] = _claves_bandas(firma, self.bandas, self.filas)
+                vacios[con] = False
+        self._firmas.append(firmas[codigos])
+        self._claves.append(claves[codigos])
+        self._vacios.append(vacios[codigos])
+        if ids is not None:
+            self._ids.append(np.asarray(ids, dtype=object))
+        self.n += len(codigos)
+
+    def ids(self) -> np.ndarray:
+        """Ids de los textos indexados (en orden), o sus posiciones si no se dieron."""
+        return np.concatenate(self._ids) if self._ids else np.arange(self.n)
+
+    def clusters(self) -> np.ndarray:
+        """
+        Para cada texto indexado (en orden), la posición del primer texto de
+        su cluster de casi duplicados (él mismo si no tiene).
+        """
+        etiquetas = np.arange(self.n, dtype=np.int64)
+        if self.n == 0:
+            return etiquetas
+        firmas = np.concatenate(self._firmas)
+        claves = np.concatenate(self._claves)
+        indexados = np.flatnonzero(~np.concatenate(self._vacios))
+        minimo = int(np.ceil(self.umbral * self.num_perm - 1e-9))  # coincidencias para similitud >= umbral
+
+        for j in range(self.bandas):
+            orden = indexados[np.argsort(claves[indexados, j], kind="stable")]
+            k = claves[orden, j]
+            nuevo = np.ones(len(k), dtype=bool)
+            nuevo[1:] = k[1:] != k[:-1]
+            primero = orden[np.flatnonzero(nuevo)][np.cumsum(nuevo) - 1]  # primer texto del cubo
+            u, v = orden[~nuevo], primero[~nuevo]
+            pendientes = etiquetas[u] != etiquetas[v]  # ya unidos por otra banda: no se verifican
+            u, v = u[pendientes], v[pendientes]
+            for i in range(0, len(u), LOTE_VERIFICACION):
+                uu, vv = u[i:i + LOTE_VERIFICACION], v[i:i + LOTE_VERIFICACION]
+                similares = (firmas[uu] == firmas[vv]).sum(axis=1) >= minimo
+                _unir(etiquetas, uu[similares], vv[similares])
+        return etiquetas
+
+    def resumen(self, etiquetas: np.ndarray) -> dict:
+        """Parámetros y totales para el reporte."""
+        tamanos = np.bincount(etiquetas, minlength=self.n)
+        return {
+            "umbral": self.umbral, "num_perm": self.num_perm,
+            "bandas": self.bandas, "filas_por_banda": self.filas,
+            "tickets": int(self.n),
+            "clusters": int((tamanos > 1).sum()),
+            "tickets_en_clusters": int(tamanos[tamanos > 1].sum()),
+            "redundantes": int((tamanos[tamanos > 1] - 1).sum()),
+        }
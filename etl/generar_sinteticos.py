@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+generar_sinteticos.py
+============================================================================
+
+OBJETIVO
+--------
+Generar fuentes sintéticas de tickets de cualquier tamaño (millones de filas)
+para pruebas de carga del ETL, sin usar tickets reales. Se escriben los tres
+formatos de entrada que acepta `normalizar_CSVs.py`:
+
+  - `dataset_kaggle_english_V2.csv`: cabeceras en inglés estilo Kaggle
+    (`number`, `date`, `channel`, `short_description`, `content`, `status`,
+    `priority`, `resolved_at`, `agent`), separador `,`, valores en inglés.
+  - `tickets_soporte_sintetico.csv`: cabeceras del sintético en español,
+    separador `;`, UTF-8 con BOM, ids `synt_INC.../synt_TASK...`.
+  - `tickets_soporte_sintetico_2.csv`: mismo formato, ids `synt2_`/`synt3_`.
+
+y un `fuentes.json` para ejecutar el ETL sobre ellos:
+    python etl/normalizar_CSVs.py --fuentes data/sinteticos/fuentes.json
+
+PUNTOS CLAVE:
+------------
+1) Texto: `resumen`/`descripcion` salen de un repertorio por categoría y
+   formato, construido con el vocabulario de `KW`/`ADD` (más algún término de
+   `NEG` como ruido) y palabras de relleno ES/EN. Cada fila combina un resumen
+   y una descripción de su categoría (pocas frases distintas, muchas
+   combinaciones, como en los datos reales).
+2) Catálogos con distribuciones no uniformes y variantes "sucias" (mayúsculas,
+   alias, vacíos) de prioridad, estado, canal y `sla_met`.
+3) Fechas coherentes (creación -> primera respuesta -> cierre en estados de
+   cierre) escritas con formatos mezclados, más tasas configurables de ids
+   vacíos, cierres en el futuro, fechas invertidas y fechas ilegibles.
+4) Vectorizado con NumPy y por bloques (`--bloque` filas): la memoria no
+   depende de `--filas`. Las fechas se formatean en el buffer de
+   `datetime_as_string` (plantillas de ancho fijo), sin `strftime` por fila.
+5) Reproducible: la misma `--seed` (con las mismas `--filas` y `--bloque`)
+   genera ficheros idénticos.
+
+Uso:
+    python etl/generar_sinteticos.py --filas 10000000 [--destino data/sinteticos] [--seed 42]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import clasificador_reglas
+import registro_fuentes
+
+
+# Solo las rutas/registro de fuentes y el JSON de reglas: importar
+# `normalizar_CSVs` crearía `data/s3` y `logs` y compilaría el clasificador.
+REGLAS: dict = clasificador_reglas.cargar_reglas()
+
+DESTINO: Path = registro_fuentes.ROOT / "data" / "sinteticos"
+BLOQUE: int = 200_000
+FRASES_POR_CATEGORIA: int = 2_000
+
+# Reparto de filas entre formatos (suma 1)
+REPARTO: Dict[str, float] = {"kaggle_1": 0.6, "sintetico": 0.2, "sintetico_2": 0.2}
+
+# Tasas por defecto de datos "sucios"
+TASAS: Dict[str, float] = {
+    "ids_vacios": 0.02,         # id de origen vacío (-> *_GEN{n})
+    "cierres_futuros": 0.01,    # fecha_cierre en el futuro (regla 0 del postfix)
+    "fechas_invertidas": 0.02,  # cierre antes de creación / primera respuesta (reglas 3 y 4)
+    "fechas_ilegibles": 0.01,   # texto que no es una fecha válida
+}
+
+# Distribución de categorías (no uniforme, como el sintético original)
+CATEGORIAS: Dict[str, float] = {"SW": 0.22, "MAIL": 0.17, "NET": 0.15, "SRV": 0.12,
+                                "APP": 0.12, "ACC": 0.10, "HW": 0.08, "POL": 0.04}
+
+RELLENO = {
+    "en": ("the user reports that since yesterday it is not working please help urgent "
+           "again today my team cannot use it after the last change still failing").split(),
+    "es": ("el usuario indica que desde ayer no funciona por favor ayuda urgente "
+           "otra vez hoy mi equipo no puede usarlo tras el último cambio sigue fallando").split(),
+}
+
+# Valores crudos por formato: (valores, pesos)
+CRUDOS: Dict[str, Dict[str, Tuple[Sequence[str], Sequence[float]]]] = {
+    "kaggle": {
+        "canal":     (["Email", "Chat", "Phone", "Self-Service", "mail", "email", ""],
+                      [0.34, 0.25, 0.18, 0.15, 0.03, 0.03, 0.02]),
+        "estado":    (["Closed", "Resolved", "Open", "In Progress", "Reopened", "done", "new", ""],
+                      [0.30, 0.25, 0.15, 0.15, 0.05, 0.04, 0.04, 0.02]),
+        "prioridad": (["Medium", "High", "Low", "Critical", "P2", "urgent", "minor", ""],
+                      [0.35, 0.25, 0.22, 0.06, 0.04, 0.03, 0.03, 0.02]),
+    },
+    "sintetico": {
+        "canal":     (["EMAIL", "PORTAL_SOPORTE", "PORTAL_INTERNO", "PORTAL_DOCUMENTAL"],
+                      [0.38, 0.37, 0.15, 0.10]),
+        "estado":    (["Cerrado", "Resuelto", "Abierto", "En curso", "Reabierto", "pendiente"],
+                      [0.30, 0.25, 0.17, 0.16, 0.08, 0.04]),
+        "prioridad": (["Media", "Alta", "Baja", "Crítica", "normal"],
+                      [0.38, 0.27, 0.24, 0.06, 0.05]),
+        "sla_met":   (["true", "false", "'true", "'false", '="1"', '="0"', "Sí", "no", ""],
+                      [0.40, 0.30, 0.05, 0.05, 0.04, 0.04, 0.04, 0.04, 0.04]),
+    },
+}
+AGENTES: Sequence[str] = [f"Agent-{i}" for i in range(1, 13)]
+PESOS_AGENTES = np.arange(12, 0, -1) / np.arange(12, 0, -1).sum()  # unos agentes llevan más tickets
+SLA_HORAS: Sequence[str] = ["8", "24", "72", "120", ""]
+PESOS_SLA: Sequence[float] = [0.15, 0.40, 0.30, 0.10, 0.05]
+
+# Estados tal como vienen en origen (el ETL aún no los ha normalizado) que
+# deben tener fecha de cierre
+ESTADOS_CIERRE = {"Closed", "Resolved", "done", "Cerrado", "Resuelto"}
+
+# Fechas: creación en [INICIO, FIN), cierres "futuros" a partir de FUTURO
+INICIO = np.datetime64("2023-01-01T00:00", "s")
+FIN = np.datetime64("2025-01-01T00:00", "s")
+FUTURO = np.datetime64("2031-01-01T00:00", "s")
+
+# Formatos de fecha por formato de fuente: (plantilla, peso). Letras de la
+# plantilla: Y año, M mes, D día, h hora, m minuto, s segundo; lo demás es literal.
+FORMATOS_FECHA: Dict[str, List[Tuple[str, float]]] = {
+    "kaggle": [("YYYY-MM-DD hh:mm:ss", 0.45), ("YYYY-MM-DDThh:mm:ssZ", 0.25),
+               ("MM/DD/YYYY hh:mm", 0.15), ("YYYY-MM-DD", 0.10), ("DD/MM/YYYY", 0.05)],
+    "sintetico": [("YYYY-MM-DD hh:mm", 0.70), ("DD/MM/YYYY hh:mm", 0.15),
+                  ("YYYY-MM-DD hh:mm:ss", 0.10), ("DD/MM/YYYY", 0.05)],
+}
+ILEGIBLES: Sequence[str] = ["garbage", "2024-02-30", "13/13/2024", "2024-05-06T25:00", "n/a", "3 Jan 2024"]
+
+# Posición de cada campo en `YYYY-MM-DDThh:mm:ss` (salida de `datetime_as_string`)
+_POSICIONES = {"Y": [0, 1, 2, 3], "M": [5, 6], "D": [8, 9], "h": [11, 12], "m": [14, 15], "s": [17, 18]}
+
+CABECERAS: Dict[str, List[str]] = {
+    "kaggle": ["number", "date", "channel", "short_description", "content",
+               "status", "priority", "resolved_at", "agent"],
+    "sintetico": ["id_ticket", "canal", "fecha_creacion", "first_reply_at", "fecha_cierre", "estado",
+                  "prioridad", "categoria", "agente_id", "sla_target_horas", "sla_met", "resumen", "descripcion"],
+}
+
+# fuente -> (formato, fichero, separador, encoding, prefijos de id con sus pesos)
+SALIDAS: Dict[str, Tuple[str, str, str, str, List[Tuple[str, float]]]] = {
+    "kaggle_1":    ("kaggle", registro_fuentes.KAGGLE_ORIGEN1.name, ",", "utf-8", [("INC", 0.8), ("k1_", 0.2)]),
+    "sintetico":   ("sintetico", registro_fuentes.SINTETICO.name, ";", "utf-8-sig", [("synt_INC", 0.7), ("synt_TASK", 0.3)]),
+    "sintetico_2": ("sintetico", registro_fuentes.SINTETICO2.name, ";", "utf-8-sig", [("synt2_", 0.6), ("synt3_", 0.3), ("", 0.1)]),
+}
+
+
+#------------------------------
+# TEXTO
+#------------------------------
+
+def _frases(rnd: random.Random, idioma: str, categoria: str, n: int,
+            terminos: Tuple[int, int], relleno: Tuple[int, int]) -> np.ndarray:
+    """`n` textos de la categoría: términos de `KW`/`ADD` mezclados con relleno."""
+    vocab = REGLAS["KW"][categoria] + REGLAS["ADD"].get(categoria, [])
+    ruido = [t for ts in REGLAS["NEG"].values() for t in ts]
+    out = []
+    for _ in range(n):
+        palabras = rnd.sample(vocab, min(len(vocab), rnd.randint(*terminos)))
+        palabras += rnd.choices(RELLENO[idioma], k=rnd.randint(*relleno))
+        if rnd.random() < 0.05:
+            palabras.append(rnd.choice(ruido))
+        rnd.shuffle(palabras)
+        texto = " ".join(palabras)
+        out.append(texto.upper() if rnd.random() < 0.1 else texto)
+    return np.array(out, dtype=object)
+
+
+def _repertorio(seed: int, idioma: str, n: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Por categoría: (resúmenes, descripciones)."""
+    rnd = random.Random(f"{seed}-{idioma}")
+    return {c: (_frases(rnd, idioma, c, n, (1, 2), (2, 6)),
+                _frases(rnd, idioma, c, n, (1, 3), (6, 20)))
+            for c in CATEGORIAS}
+
+
+#------------------------------
+# FECHAS
+#------------------------------
+
+def _columnas_plantilla(plantilla: str) -> list:
+    usadas = {k: iter(v) for k, v in _POSICIONES.items()}
+    return [next(usadas[c]) if c in usadas else c for c in plantilla]
+
+
+def _formatear(fechas: np.ndarray, plantilla: str) -> np.ndarray:
+    """Array `datetime64[s]` (sin NaT) -> array `U` con la plantilla, sin strftime."""
+    src = np.datetime_as_string(fechas, unit="s").astype("U19").view(np.uint32).reshape(len(fechas), 19)
+    cols = _columnas_plantilla(plantilla)
+    out = np.empty((len(fechas), len(cols)), dtype=np.uint32)
+    for j, c in enumerate(cols):
+        out[:, j] = src[:, c] if isinstance(c, int) else ord(c)
+    return out.view(f"<U{len(cols)}").ravel()
+
+
+def _fechas_texto(rng: np.random.Generator, fechas: np.ndarray, formato: str,
+                  tasa_ilegibles: float) -> np.ndarray:
+    """Fechas (NaT = vacía) -> texto con formatos mezclados y algunas ilegibles."""
+    out = np.full(len(fechas), "", dtype=object)
+    plantillas, pesos = zip(*FORMATOS_FECHA[formato])
+    elegido = rng.choice(len(plantillas), size=len(fechas), p=pesos)
+    validas = ~np.isnat(fechas)
+    for i, plantilla in enumerate(plantillas):
+        filas = np.flatnonzero(validas & (elegido == i))
+        if len(filas):
+            out[filas] = _formatear(fechas[filas], plantilla).astype(object)
+    ilegible = rng.random(len(fechas)) < tasa_ilegibles
+    out[ilegible] = np.asarray(ILEGIBLES, dtype=object)[rng.integers(0, len(ILEGIBLES), int(ilegible.sum()))]
+    return out
+
+
+def _minutos(rng: np.random.Generator, bajo: float, alto: float, n: int) -> np.ndarray:
+    return rng.uniform(bajo, alto, n).astype("timedelta64[m]").astype("timedelta64[s]")
+
+
+def _fechas(rng: np.random.Generator, estado: np.ndarray, tasas: Dict[str, float]
+            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Creación, primera respuesta y cierre (`datetime64[s]`, NaT = vacía) coherentes + inyecciones."""
+    n = len(estado)
+    rango = int((FIN - INICIO) / np.timedelta64(1, "m"))
+    crea = INICIO + rng.integers(0, rango, n).astype("timedelta64[m]")
+    first = crea + _minutos(rng, 5, 480, n)
+    first[rng.random(n) < 0.05] = np.datetime64("NaT")
+    # Cierre: horas tras la primera respuesta (log-normal, mediana ~1 día)
+    base = np.where(np.isnat(first), crea, first)
+    cierre = base + (rng.lognormal(np.log(24 * 60), 1.0, n)).astype("timedelta64[m]").astype("timedelta64[s]")
+    cierra = np.isin(estado, list(ESTADOS_CIERRE))
+    cierre[~cierra & (rng.random(n) > 0.03)] = np.datetime64("NaT")  # algún abierto con cierre
+    cierre[cierra & (rng.random(n) < 0.03)] = np.datetime64("NaT")   # algún cerrado sin cierre
+
+    futuro = rng.random(n) < tasas["cierres_futuros"]
+    cierre[futuro] = FUTURO + _minutos(rng, 0, 365 * 24 * 60, int(futuro.sum()))
+    invertida = rng.random(n) < tasas["fechas_invertidas"]
+    antes_crea = invertida & (rng.random(n) < 0.5)
+    cierre[antes_crea] = crea[antes_crea] - _minutos(rng, 60, 30 * 24 * 60, int(antes_crea.sum()))
+    antes_first = invertida & ~antes_crea & ~np.isnat(first)
+    cierre[antes_first] = crea[antes_first] + (first[antes_first] - crea[antes_first]) // 2
+    return crea, first, cierre
+
+
+#------------------------------
+# FILAS
+#------------------------------
+
+def _elegir(rng: np.random.Generator, valores: Sequence[str], pesos: Sequence[float], n: int) -> np.ndarray:
+    return np.asarray(valores, dtype=object)[rng.choice(len(valores), size=n, p=np.asarray(pesos) / np.sum(pesos))]
+
+
+def _ids(rng: np.random.Generator, inicio: int, n: int, prefijos: List[Tuple[str, float]],
+         tasa_vacios: float) -> np.ndarray:
+    valores, pesos = zip(*prefijos)
+    numeros = np.char.zfill(np.arange(inicio, inicio + n).astype(str), 7).astype(object)
+    ids = _elegir(rng, valores, pesos, n) + numeros
+    ids[rng.random(n) < tasa_vacios] = ""
+    return ids
+
+
+def _bloque(rng: np.random.Generator, fuente: str, inicio: int, n: int, textos: dict,
+            tasas: Dict[str, float]) -> pd.DataFrame:
+    """`n` filas crudas de `fuente` (la primera con número `inicio`)."""
+    formato, _, _, _, prefijos = SALIDAS[fuente]
+    crudos = CRUDOS[formato]
+    cats = _elegir(rng, list(CATEGORIAS), list(CATEGORIAS.values()), n)
+    resumen = np.empty(n, dtype=object)
+    descripcion = np.empty(n, dtype=object)
+    for c, (resumenes, descripciones) in textos.items():
+        filas = np.flatnonzero(cats == c)
+        resumen[filas] = resumenes[rng.integers(0, len(resumenes), len(filas))]
+        descripcion[filas] = descripciones[rng.integers(0, len(descripciones), len(filas))]
+
+    estado = _elegir(rng, *crudos["estado"], n)
+    crea, first, cierre = _fechas(rng, estado, tasas)
+    ilegibles = tasas["fechas_ilegibles"]
+    comun = {
+        "id": _ids(rng, inicio, n, prefijos, tasas["ids_vacios"]),
+        "canal": _elegir(rng, *crudos["canal"], n),
+        "crea": _fechas_texto(rng, crea, formato, ilegibles),
+        "cierre": _fechas_texto(rng, cierre, formato, ilegibles),
+        "estado": estado,
+        "prioridad": _elegir(rng, *crudos["prioridad"], n),
+        "agente": _elegir(rng, AGENTES, PESOS_AGENTES, n),
+    }
+    if formato == "kaggle":
+        return pd.DataFrame(dict(zip(CABECERAS[formato], [
+            comun["id"], comun["crea"], comun["canal"], resumen, descripcion,
+            comun["estado"], comun["prioridad"], comun["cierre"], comun["agente"]])))
+    return pd.DataFrame(dict(zip(CABECERAS[formato], [
+        comun["id"], comun["canal"], comun["crea"], _fechas_texto(rng, first, formato, ilegibles),
+        comun["cierre"], comun["estado"], comun["prioridad"], cats, comun["agente"],
+        _elegir(rng, SLA_HORAS, PESOS_SLA, n), _elegir(rng, *crudos["sla_met"], n), resumen, descripcion])))
+
+
+def generar(destino: Path, filas: int, seed: int = 42, bloque: int = BLOQUE,
+            tasas: Dict[str, float] = TASAS, frases: int = FRASES_POR_CATEGORIA) -> Dict[str, Path]:
+    """
+    Escribe las tres fuentes (`filas` en total, según `REPARTO`) y
+    `fuentes.json` en `destino`. Devuelve fuente -> ruta.
+    """
+    destino.mkdir(parents=True, exist_ok=True)
+    repertorios = {"kaggle": _repertorio(seed, "en", frases), "sintetico": _repertorio(seed, "es", frases)}
+    rutas: Dict[str, Path] = {}
+    for i, (fuente, parte) in enumerate(REPARTO.items()):
+        formato, fichero, sep, encoding, _ = SALIDAS[fuente]
+        total = int(round(filas * parte))
+        ruta = destino / fichero
+        t0 = time.perf_counter()
+        with open(ruta, "w", encoding=encoding, newline="") as fh:
+            for j, inicio in enumerate(range(0, max(total, 1), bloque)):
+                n = min(bloque, total - inicio)
+                rng = np.random.default_rng([seed, i, j])
+                df = _bloque(rng, fuente, inicio, n, repertorios[formato], tasas)
+                df.to_csv(fh, sep=sep, index=False, header=(j == 0), lineterminator="\n")
+        seg = time.perf_counter() - t0
+        print(f"{fuente:<12} {total:>12,} filas  {seg:7.1f} s  ({total / max(seg, 1e-9):,.0f} filas/s)  -> {ruta}")
+        rutas[fuente] = ruta
+
+    registro = [{**spec, "ruta": str(rutas[spec["fuente"]].resolve())}
+                for spec in registro_fuentes.FUENTES if spec["fuente"] in rutas]
+    (destino / "fuentes.json").write_text(json.dumps(registro, indent=2, ensure_ascii=False), encoding="utf-8")
+    return rutas
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--filas", type=int, default=1_000_000, help="Filas en total (repartidas según REPARTO).")
+    ap.add_argument("--destino", type=Path, default=DESTINO)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--bloque", type=int, default=BLOQUE, help="Filas generadas y escritas a la vez.")
+    ap.add_argument("--frases", type=int, default=FRASES_POR_CATEGORIA,
+                    help="Resúmenes/descripciones distintos por categoría y formato.")
+    for nombre, tasa in TASAS.items():
+        ap.add_argument(f"--{nombre.replace('_', '-')}", type=float, default=tasa, dest=nombre,
+                        help=f"Proporción de filas (por defecto {tasa}).")
+    args = ap.parse_args()
+
+    tasas = {k: getattr(args, k) for k in TASAS}
+    t0 = time.perf_counter()
+    generar(args.destino, args.filas, args.seed, args.bloque, tasas, args.frases)
+    print(f"Total: {args.filas:,} filas en {time.perf_counter() - t0:.1f} s -> {args.destino / 'fuentes.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+instrumentacion.py
+============================================================================
+
+OBJETIVO
+--------
+Medir cada etapa del ETL (`normalizar_CSVs.py`) por fuente: tiempo real,
+tiempo de CPU, filas/segundo y memoria pico. El resumen va al reporte y,
+opcionalmente, se exporta una traza en formato Chrome (`chrome://tracing`,
+Perfetto) con un evento por etapa.
+
+PUNTOS CLAVE:
+------------
+1) Sin `Perfil` (None) cada etapa es un `nullcontext`: el coste es
+   despreciable y el ETL se ejecuta igual que sin instrumentación.
+2) Memoria:
+   - "rss": máximo de RSS del proceso al acabar la etapa (`getrusage`). No
+     añade coste, pero es acumulado: no baja de una etapa a la siguiente.
+   - "tracemalloc": pico de memoria reservada *durante* la etapa
+     (`tracemalloc.reset_peak`). Más preciso, pero ralentiza la ejecución y
+     no ve la memoria que reserva pyarrow.
+3) El tiempo de CPU es el del proceso que ejecuta la etapa (sin los workers
+   de `--workers`).
+4) Cada proceso tiene su propio `Perfil`. Los eventos son dicts simples que se
+   devuelven al proceso principal y se juntan con `extender`.
+
+Uso:
+    perfil = Perfil("rss")
+    with etapa(perfil, "leer", "kaggle_1") as ev:
+        df = leer(...)
+        ev["filas"] = len(df)
+    perfil.resumen(); perfil.traza_chrome(LOGS_DIR / "normalizar_traza.json")
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:  # `resource` no existe en Windows: sin RSS
+    import resource
+except ImportError:
+    resource = None
+
+
+MEMORIAS: Tuple[str, ...] = ("rss", "tracemalloc")
+_FIN = object()
+
+
+def _rss_max_mb() -> Optional[float]:
+    """Máximo de RSS del proceso en MB (`ru_maxrss` está en KB en Linux y en bytes en macOS)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+class Perfil:
+    """Eventos (una etapa de una fuente) medidos en este proceso."""
+
+    def __init__(self, memoria: str = "rss"):
+        if memoria not in MEMORIAS:
+            raise ValueError(f"memoria debe ser una de {MEMORIAS}: {memoria!r}")
+        self.memoria = memoria
+        self.eventos: List[dict] = []
+        if memoria == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def etapa(self, nombre: str, fuente: Optional[str] = None) -> Iterator[dict]:
+        """Mide el bloque; el llamador puede anotar `filas` en el dict que se cede."""
+        ev = {"etapa": nombre, "fuente": fuente, "pid": os.getpid(), "filas": None}
+        if self.memoria == "tracemalloc":
+            tracemalloc.reset_peak()
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield ev
+        finally:
+            ev["inicio_s"] = t0
+            ev["wall_s"] = time.perf_counter() - t0
+            ev["cpu_s"] = time.process_time() - c0
+            if self.memoria == "tracemalloc":
+                ev["mem_mb"] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+            else:
+                ev["mem_mb"] = _rss_max_mb()
+            self.eventos.append(ev)
+
+    def extender(self, eventos: Iterable[dict]) -> None:
+        """Añade eventos medidos en otro proceso."""
+        self.eventos.extend(eventos)
+
+    def resumen(self) -> List[dict]:
+        """
+        Totales por (etapa, fuente), en orden de primera aparición: llamadas
+        (trozos en `--stream`), segundos reales y de CPU, filas, filas/segundo
+        y memoria máxima.
+        """
+        grupos: Dict[Tuple[str, Optional[str]], dict] = {}
+        for ev in self.eventos:
+            g = grupos.setdefault((ev["etapa"], ev["fuente"]), {
+                "etapa": ev["etapa"], "fuente": ev["fuente"], "llamadas": 0,
+                "wall_s": 0.0, "cpu_s": 0.0, "filas": None, "mem_mb": None})
+            g["llamadas"] += 1
+            g["wall_s"] += ev["wall_s"]
+            g["cpu_s"] += ev["cpu_s"]
+            if ev["filas"] is not None:
+                g["filas"] = (g["filas"] or 0) + ev["filas"]
+            if ev["mem_mb"] is not None:
+                g["mem_mb"] = max(g["mem_mb"] or 0.0, ev["mem_mb"])
+
+        out = []
+        for g in grupos.values():
+            filas_s = g["filas"] / g["wall_s"] if g["filas"] and g["wall_s"] > 0 else None
+            out.append({**g, "wall_s": round(g["wall_s"], 4), "cpu_s": round(g["cpu_s"], 4),
+                        "filas_s": round(filas_s, 1) if filas_s is not None else None,
+                        "mem_mb": round(g["mem_mb"], 1) if g["mem_mb"] is not None else None})
+        return out
+
+    def traza_chrome(self, destino: Path) -> None:
+        """
+        Escribe los eventos en formato Chrome Trace (eventos completos "X" en
+        microsegundos, un proceso por pid). `perf_counter` es el reloj
+        monotónico del sistema, así que los pids se alinean en el tiempo.
+        """
+        base = min((ev["inicio_s"] for ev in self.eventos), default=0.0)
+        eventos = [{"name": ev["etapa"] if ev["fuente"] is None else f"{ev['etapa']} [{ev['fuente']}]",
+                    "cat": ev["etapa"], "ph": "X", "pid": ev["pid"], "tid": 0,
+                    "ts": round((ev["inicio_s"] - base) * 1e6, 1),
+                    "dur": round(ev["wall_s"] * 1e6, 1),
+                    "args": {k: ev[k] for k in ("fuente", "filas", "cpu_s", "mem_mb")}}
+                   for ev in self.eventos]
+        nombres = {}
+        for ev in self.eventos:
+            nombres.setdefault(ev["pid"], "principal" if ev["pid"] == os.getpid() else f"proceso {ev['pid']}")
+        eventos += [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": str(n)}}
+                    for pid, n in nombres.items()]
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_text(json.dumps({"traceEvents": eventos, "displayTimeUnit": "ms"}), encoding="utf-8")
+
+
+def etapa(perfil: Optional[Perfil], nombre: str, fuente: Optional[str] = None):
+    """`perfil.etapa(...)`, o un contexto vacío si no se mide."""
+    if perfil is None:
+        return contextlib.nullcontext({})
+    return perfil.etapa(nombre, fuente)
+
+
+def iterar(perfil: Optional[Perfil], nombre: str, fuente: Optional[str], trozos: Iterable) -> Iterator:
+    """Recorre `trozos` midiendo cada `next` como una etapa (p. ej. lectura por trozos)."""
+    it = iter(trozos)
+    while True:
+        with etapa(perfil, nombre, fuente) as ev:
+            trozo = next(it, _FIN)
+            ev["filas"] = 0 if trozo is _FIN else len(trozo)
+        if trozo is _FIN:
+            return
+        yield trozo
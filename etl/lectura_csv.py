@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+lectura_csv.py
+============================================================================
+
+OBJETIVO
+--------
+Capa común de lectura de CSV para el ETL (`normalizar_CSVs.py`) y los
+scripts de ML (`ml/scripts/06`, `07`, `10`).
+
+PUNTOS CLAVE:
+------------
+1) Sniff del separador leyendo solo la cabecera del fichero (64 KB).
+2) Se prueba primero el motor rápido (`c`, o `pyarrow` si se pide y está
+   instalado) y después `python`. Las codificaciones que no decodifican la
+   cabecera se descartan sin parsear el fichero.
+3) El dialecto que funciona (encoding, sep, motor) se guarda en un manifiesto
+   JSON por fichero, con su huella (tamaño + mtime + hash de la cabecera).
+   Si la huella no cambia, las siguientes ejecuciones leen directamente con
+   ese dialecto, sin detección.
+
+Uso:
+    from lectura_csv import leer_csv
+    df = leer_csv(ruta, manifiesto=LOGS_DIR / "csv_dialectos.json", dtype=str)
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+import pandas as pd
+
+
+BYTES_CABECERA: int = 65536
+
+ENCODINGS: Sequence[str] = ("utf-8-sig", "utf-8", "cp1252", "latin-1")
+SEPARADORES: Sequence[str] = (",", ";", "\t", "|")
+MOTORES: Sequence[str] = ("c", "python")
+
+try:  # pyarrow es opcional: solo se usa si se pide en `motores`
+    import pyarrow  # noqa: F401
+    HAY_ARROW = True
+except ImportError:
+    HAY_ARROW = False
+
+
+#------------------------------
+# HUELLA Y MANIFIESTO
+#------------------------------
+
+def _cabecera(path: Path) -> bytes:
+    with path.open("rb") as fh:
+        return fh.read(BYTES_CABECERA)
+
+
+def huella(path: Path, cabecera: Optional[bytes] = None) -> Dict[str, object]:
+    """Tamaño, mtime (ns) y hash BLAKE2 de la cabecera del fichero."""
+    st = path.stat()
+    cab = _cabecera(path) if cabecera is None else cabecera
+    return {"tamano": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "hash": hashlib.blake2b(cab, digest_size=16).hexdigest()}
+
+
+def _perfil(opciones: dict) -> str:
+    """Clave de las opciones de lectura (el mismo fichero puede leerse con varias)."""
+    return json.dumps(opciones, sort_keys=True, default=lambda o: getattr(o, "__name__", str(o)))
+
+
+def _cargar_manifiesto(manifiesto: Path) -> Dict[str, dict]:
+    try:
+        return json.loads(manifiesto.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_dialecto(manifiesto: Path, path: Path, firma: dict, perfil: str, dialecto: dict) -> None:
+    """
+    Añade/actualiza la entrada del fichero. Se relee el manifiesto justo antes
+    de escribir y se reemplaza de forma atómica, así que las fuentes leídas en
+    procesos paralelos no lo corrompen (en el peor caso se pierde una entrada
+    y se vuelve a detectar en la siguiente ejecución).
+    """
+    datos = _cargar_manifiesto(manifiesto)
+    clave = str(path.resolve())
+    entrada = datos.get(clave, {})
+    if entrada.get("huella") != firma:
+        entrada = {"huella": firma, "dialectos": {}}
+    entrada["dialectos"][perfil] = dialecto
+    datos[clave] = entrada
+
+    manifiesto.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifiesto.with_name(f"{manifiesto.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(datos, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, manifiesto)
+
+
+def _dialecto_guardado(manifiesto: Optional[Path], path: Path, firma: dict, perfil: str) -> Optional[dict]:
+    if manifiesto is None:
+        return None
+    entrada = _cargar_manifiesto(manifiesto).get(str(path.resolve()))
+    if not entrada or entrada.get("huella") != firma:
+        return None
+    return entrada["dialectos"].get(perfil)
+
+
+#------------------------------
+# DETECCIÓN
+#------------------------------
+
+def _sniff_sep(cabecera: bytes) -> str:
+    """Separador más probable según la cabecera (desde bytes, sin UnicodeDecodeError)."""
+    sample_text = cabecera.decode("utf-8", errors="ignore")
+    try:
+        return csv.Sniffer().sniff(sample_text, delimiters=";,|\t,").delimiter
+    except Exception:
+        counts = {s: sample_text.count(s) for s in (",", ";", "\t", "|")}
+        return max(counts, key=counts.get) if any(counts.values()) else ","
+
+
+def _decodifica(cabecera: bytes, encoding: str) -> bool:
+    """
+    ¿La cabecera es válida en `encoding`? (sin exigir que acabe en un carácter
+    completo). Si no lo es, leer el fichero entero con ese encoding fallaría.
+    """
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(cabecera, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def combinaciones(path: Path, encodings: Sequence[str] = ENCODINGS,
+                  seps: Optional[Sequence[str]] = None,
+                  motores: Sequence[str] = MOTORES,
+                  sniff: bool = True, sep_auto: bool = True,
+                  cabecera: Optional[bytes] = None) -> Iterator[dict]:
+    """
+    Dialectos a probar, en orden de preferencia: por encoding (los que
+    decodifican la cabecera), cada motor (`motores`; `pyarrow` se omite si no
+    está instalado) y cada separador, empezando por el del sniff (`sniff`).
+    Último recurso (`sep_auto`): `sep=None` con el motor `python` (pandas infiere).
+    """
+    cab = _cabecera(path) if cabecera is None else cabecera
+    candidatos = list(SEPARADORES if seps is None else seps)
+    if sniff:
+        candidatos = list(dict.fromkeys([_sniff_sep(cab), *candidatos]))
+    motores = [m for m in motores if m != "pyarrow" or HAY_ARROW]
+
+    for enc in encodings:
+        if not _decodifica(cab, enc):
+            continue
+        for eng in motores:
+            for sep in candidatos:
+                yield dict(sep=sep, encoding=enc, engine=eng)
+    if sep_auto:
+        yield dict(sep=None, engine="python")
+
+
+#------------------------------
+# LECTURA
+#------------------------------
+
+def leer_csv(path: Path, manifiesto: Optional[Path] = None,
+             validar: Optional[Callable[[pd.DataFrame], bool]] = None,
+             encodings: Sequence[str] = ENCODINGS, seps: Optional[Sequence[str]] = None,
+             motores: Sequence[str] = MOTORES, sniff: bool = True, sep_auto: bool = True,
+             **opciones) -> pd.DataFrame:
+    """
+    Lee `path` con el primer dialecto de `combinaciones` que parsea sin error
+    (y, si se da, cumple `validar`). `opciones` se pasan tal cual a
+    `pd.read_csv`. Con `manifiesto`, el dialecto se reutiliza mientras la
+    huella del fichero no cambie.
+    """
+    path = Path(path)
+    cab = _cabecera(path)
+    firma = huella(path, cab)
+    perfil = _perfil(opciones)
+
+    guardado = _dialecto_guardado(manifiesto, path, firma, perfil)
+    if guardado is not None:
+        try:
+            df = pd.read_csv(path, **guardado, **opciones)
+            if validar is None or validar(df):
+                return df
+        except Exception:
+            pass
+
+    error: Optional[BaseException] = None
+    for dialecto in combinaciones(path, encodings, seps, motores, sniff, sep_auto, cab):
+        try:
+            df = pd.read_csv(path, **dialecto, **opciones)
+        except Exception as e:
+            error = e
+            continue
+        if validar is not None and not validar(df):
+            continue
+        if manifiesto is not None:
+            _guardar_dialecto(manifiesto, path, firma, perfil, dialecto)
+        return df
+    raise RuntimeError(f"Imposible leer {path} con encodings/sep probados") from error
+
+
+def leer_csv_trozos(path: Path, chunksize: int, manifiesto: Optional[Path] = None,
+                    encodings: Sequence[str] = ENCODINGS, seps: Optional[Sequence[str]] = None,
+                    motores: Sequence[str] = MOTORES, sniff: bool = True, sep_auto: bool = True,
+                    **opciones) -> Iterator[pd.DataFrame]:
+    """
+    Versión por trozos de `leer_csv` (memoria acotada). Cada dialecto se valida
+    recorriendo el fichero a trozos sin conservarlos, igual que la lectura
+    completa falla ante un error en cualquier fila; el primero válido se relee.
+    Con un dialecto del manifiesto no hace falta la pasada de validación.
+    """
+    path = Path(path)
+    cab = _cabecera(path)
+    firma = huella(path, cab)
+    perfil = _perfil(opciones)
+
+    guardado = _dialecto_guardado(manifiesto, path, firma, perfil)
+    if guardado is not None:
+        return pd.read_csv(path, chunksize=chunksize, **guardado, **opciones)
+
+    error: Optional[BaseException] = None
+    for dialecto in combinaciones(path, encodings, seps, motores, sniff, sep_auto, cab):
+        try:
+            for _ in pd.read_csv(path, chunksize=chunksize, **dialecto, **opciones):
+                pass
+        except Exception as e:
+            error = e
+            continue
+        if manifiesto is not None:
+            _guardar_dialecto(manifiesto, path, firma, perfil, dialecto)
+        return pd.read_csv(path, chunksize=chunksize, **dialecto, **opciones)
+    raise RuntimeError(f"Imposible leer {path} con encodings/sep probados") from error
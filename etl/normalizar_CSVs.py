@@ -28,15 +28,38 @@ PUNTOS CLAVE:
 
 from __future__ import annotations
 
+import argparse
+import bz2
+import contextlib
+import csv
+import functools
+import gzip
+import hashlib
+import itertools
 import json
+import lzma
+import operator
+import os
 import re
+import shutil
+import time
 import unicodedata
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
 
+import numpy as np
 import pandas as pd
 
+import clasificador_reglas
+import duplicados
+import lectura_csv
+from lectura_csv import leer_csv, leer_csv_trozos
+from instrumentacion import MEMORIAS, Perfil, etapa, iterar
+from registro_fuentes import FUENTES, KAGGLE_ORIGEN1, ROOT, SINTETICO, SINTETICO2
+
 
 #---- CAMBIO 2025-11-02: Sustitución de Kaggle2 por Sintético2 ----
 # - Se quita Kaggle2 del script.
@@ -48,12 +71,12 @@ import pandas as pd
 # RUTAS Y CONSTANTES GENERALES
 # -----------------------------------------------------------------------------
 
-ROOT: Path = Path(".").resolve()
-
-# Entradas
-KAGGLE_ORIGEN1: Path = ROOT / "data" / "s2" / "dataset_kaggle_english_V2.csv"
-SINTETICO2:     Path  = ROOT / "data" / "s2" / "tickets_soporte_sintetico_2.csv"
-SINTETICO:      Path = ROOT / "data" / "s2" / "tickets_soporte_sintetico.csv"
+#---- CAMBIO: rutas de entrada y registro en `registro_fuentes.py` ----
+# `ROOT`, las rutas de entrada y `FUENTES` (registro por defecto; ver el
+# formato de cada entrada allí) están en un módulo sin efectos al importar,
+# para que los scripts auxiliares no tengan que importar el ETL completo.
+# Con `--fuentes fichero.json` se sustituye por una lista con el mismo formato.
+#----------------------------------------------------------------------
 
 # Salidas
 OUT_DIR:  Path = ROOT / "data" / "s3"; OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -68,6 +91,9 @@ OUT_BY_CHANNEL: Dict[str, Path] = {
 }
 REPORT_PATH: Path = LOGS_DIR / "normalizar_report.json"
 POSTFIX_LOG: Path  = LOGS_DIR / "postfix_changes.csv"
+POSTFIX_LOG_PARQUET: Path = LOGS_DIR / "postfix_changes"  # con --parquet
+TRAZA_PATH: Path = LOGS_DIR / "normalizar_traza.json"     # con --traza
+DUPLICADOS_CSV: Path = OUT_DIR / "duplicados.csv"          # con --duplicados
 
 # Esquema. Si faltasen columnas en origen, se crean vacías para evitar errores y asegurar consistencia.
 CAMPOS_FINALES: List[str] = [
@@ -108,88 +134,35 @@ CODIGOS: List[str] = ["utf-8","utf-8-sig","latin-1","cp1252","utf-16","utf-16le"
 #   4) Reglas contextuales para casos ambiguos.
 # Después de puntuar, si hay empate, se desempatan con `CAT_ORDER`.
 
-KW: Dict[str, List[str]] = {
-    "ACC": [
-        "login","inicio de sesión","iniciar sesion","autenticación","autenticacion","sso","mfa","2fa",
-        "contraseña","contrasena","restablecer contraseña","cambiar contraseña","olvidé la contraseña","olvide la contrasena",
-        "cuenta bloqueada","desbloquear cuenta","permiso denegado","acceso denegado",
-        "credentials","credenciales","password","reset password","forgot password","account locked","access denied"
-    ],
-    "SW": [
-        "instalar","instalación","instalacion","reinstalar","actualización","actualizacion","parche","licencia","serial",
-        "driver","software","aplicación de escritorio","aplicacion de escritorio","desinstalar","update","patch",
-        "license","product key","desktop app","uninstall","upgrade","downgrade","bug","error","crash"
-    ],
-    "HW": [
-        "hardware","portátil","portatil","laptop","equipo","pc","teclado","ratón","raton","mouse","monitor","pantalla",
-        "impresora","scanner","escáner","escaner","webcam","auriculares","ssd","disco","batería","bateria",
-        "cargador","charger","dock","docking station","keyboard","display","printer","headset","battery"
-    ],
-    "NET": [
-        "vpn","wi fi","wifi","red","conexión","conexion","conectividad","lan","wan","proxy","dns","ip","gateway","ping",
-        "latencia","pérdida de paquetes","perdida de paquetes","cable de red","ethernet","switch","router",
-        "network","connection","connectivity","packet loss","no internet","high latency"
-    ],
-    "MAIL": [
-        "correo","email","buzón","buzon","outlook","exchange","smtp","imap","pop3","calendario","meeting","invite",
-        "firma","signature","alias","mailbox","ndr","bounce","delivery failed","o365","microsoft 365"
-    ],
-    "APP": [
-        "sap","erp","crm","bpm","salesforce","dynamics","navision","sage","jira","confluence",
-        "power bi","sharepoint","servicenow","oracle","oracle database","oracle db","workday","netsuite","odoo","sccm","webex",
-        "intranet", "intranet corporativa", "portal interno","intranet site", "sitio de intranet", 
-        "página de intranet", "pagina de intranet"
-    ],
-    "SRV": [
-        "alta","baja","solicito","solicitud","petición","peticion","permiso de acceso","como hago","manual","procedimiento",
-        "crear usuario","dar de alta","cambio planificado","aprobar","provisionar","provision","request",
-        "new user","onboarding","offboarding","how to","grant access","please provide","standard change","service request","access to"
-    ],
-    "POL": [
-        "antivirus","phishing","malware","ransomware","cifrado","encriptado","bloqueado por política","bloqueado por politica",
-        "dlp","firewall","política de seguridad","politica de seguridad","seguridad","quarantine","blocked for security",
-        "encryption","security policy","microsoft defender","windows defender","endpoint protection","network policy","policy"
-    ],
-}
+#---- CAMBIO: reglas en fichero externo y artefacto compilado ----
+# Los diccionarios, pesos, reglas contextuales y orden de desempate están en
+# `etl/reglas/categorias.json`. `clasificador_reglas.py` los compila una vez
+# (patrones, índice por primera palabra, tabla de tildes) en un artefacto
+# serializado con el hash del contenido de las reglas y solo lo reconstruye
+# cuando cambian. Los workers cargan el artefacto en vez de recompilar, y el
+# mismo clasificador se puede usar fuera del ETL (`classify_batch`).
+#-----------------------------------------------------------------
+
+CLASIFICADOR = clasificador_reglas.cargar()
+
+KW: Dict[str, List[str]] = CLASIFICADOR.reglas["KW"]
 
 # Refuerzos: términos que, si aparecen, empujan más hacia la categoría indicada.
-ADD: Dict[str, List[str]] = {
-    "ACC": ["active directory","otp","one time code","codigo mfa","codigo otp","failed login","invalid credentials"],
-    "MAIL": ["shared mailbox","distribution list","delegation","ndr","delivery failed","auto-reply","out of office"],
-    "NET": ["ip address","dns server","proxy auth","802.1x","ssid","packet drop","routing","no internet access"],
-    "APP": ["sap gui","s 4hana","salesforce lightning","dynamics 365","sharepoint site","jira project","power bi dataset","webex app","configuration manager"],
-    "POL": ["blocked by policy","security incident","threat detected","quarantined","bitlocker","filevault"],
-    "HW":  ["battery not charging","ac adapter","power adapter","keyboard not working","screen flicker","paper jam"],
-    "SW":  ["deprecated","obsolete feature","missing license","product activation","runtime error","dll"],
-    "SRV": ["grant access to","please grant","need access","how do i","procedure steps"]
-}
+ADD: Dict[str, List[str]] = CLASIFICADOR.reglas["ADD"]
 
 # Penalizaciones: términos cuya presencia restará puntuación a la categoría.
-NEG: Dict[str, List[str]] = {
-    "ACC": ["outlook","imap","smtp"],
-    "MAIL": ["vpn","dns","proxy"],
-    "NET": ["outlook","mailbox"],
-    "APP": ["printer","monitor","battery"],
-    "HW":  ["oracle","sharepoint","jira"],
-    "SW":  ["oracle","sccm","webex","jira"],
-    "POL": ["printer","monitor"]
-}
+NEG: Dict[str, List[str]] = CLASIFICADOR.reglas["NEG"]
 
 # Pesos de las señales.
-W_HIT: float = 1.0
-W_ADD: float = 1.5
-W_NEG: float = -1.0
+W_HIT: float = CLASIFICADOR.reglas["pesos"]["KW"]
+W_ADD: float = CLASIFICADOR.reglas["pesos"]["ADD"]
+W_NEG: float = CLASIFICADOR.reglas["pesos"]["NEG"]
 
 # Reglas contextuales: si aparecen ciertos términos (“if_any”), "prefiere" una categoría y “degrada” otras. Para casos ambiguos.
-REGLAS_CONTEXTUALES: List[dict] = [
-    {"if_any": ["outlook","mailbox","imap","smtp","email"], "prefer": "MAIL", "demote": ["ACC"], "boost": 0.5, "force": False},
-    {"if_any": ["oracle","oracle database","sharepoint","jira","confluence","power bi","servicenow","sccm","webex","intranet","portal interno","intranet site","sitio de intranet","página de intranet","pagina de intranet"], "prefer": "APP", "demote": ["SW","HW","NET","SRV"], "boost": 0.7, "force": False},
-    {"if_any": ["defender","endpoint protection","security policy","network policy","blocked by policy","quarantine"], "prefer": "POL", "demote": ["NET","SW"], "boost": 0.7, "force": False},
-    {"if_any": ["ip address","dns","vpn","proxy","router","switch","packet loss","latency"], "prefer": "NET", "demote": ["MAIL","SRV"], "boost": 0.5, "force": False},
-]
+REGLAS_CONTEXTUALES: List[dict] = CLASIFICADOR.reglas["reglas_contextuales"]
 
 # Orden estable de desempate entre categorías cuando las puntuaciones empatan.
-CAT_ORDER: List[str] = ["ACC","MAIL","NET","HW","SW","APP","POL","SRV"]
+CAT_ORDER: List[str] = CLASIFICADOR.orden
 
 
 #---------------------------------------------
@@ -212,70 +185,84 @@ def _normalize_col(col: str) -> str:
     return s
 
 
+#---- CAMBIO: lectura con la capa común `lectura_csv` ----
+# Sniff solo de la cabecera, motor `c` antes que `python`, se descartan sin
+# parsear las codificaciones que no decodifican la cabecera, y el dialecto
+# detectado se guarda en `logs/csv_dialectos.json` (por tamaño + mtime + hash
+# de la cabecera): mientras la entrada no cambie, no se repite la detección.
+#---------------------------------------------------------
+
+MANIFIESTO_CSV: Path = LOGS_DIR / "csv_dialectos.json"
+OPCIONES_LECTURA: dict = dict(dtype=str, keep_default_na=False, on_bad_lines="skip")
+
+
 def _read_csv_any(path: Path) -> pd.DataFrame:
+    """Lee el CSV con el primer dialecto (encoding/motor/sep) que funcione."""
+    return leer_csv(path, MANIFIESTO_CSV, **OPCIONES_LECTURA)
+
+
+def _read_csv_chunks(path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Versión por trozos de `_read_csv_any` (memoria acotada)."""
+    return leer_csv_trozos(path, chunksize, MANIFIESTO_CSV, **OPCIONES_LECTURA)
+
+
+#---- CAMBIO: resolución de cabeceras con caché y combinación por máscaras ----
+# La resolución alias -> nombre canónico solo depende de la cabecera, y los
+# mismos formatos de exportación se repiten (y en `--stream` se resuelve en
+# cada trozo): se memoiza por tupla de columnas. Las columnas duplicadas
+# (p. ej. `created_at` + `open_date`) se combinan con máscaras: solo se
+# miran las filas aún vacías de cada columna, sin regex sobre todas las
+# celdas ni `bfill(axis=1)`, y el DF se monta una vez (no un drop + alta por
+# nombre repetido).
+#-------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=64)
+def _resolver_cabecera(columnas: Tuple[str, ...]) -> Tuple[Tuple[str, ...], Dict[str, List[int]]]:
     """
-    Hace sniff del separador desde bytes (evita UnicodeDecodeError en la muestra)
-    y luego prueba combinaciones de encoding/engine/sep. Último recurso: sep=None (pandas infiere).
+    Nombres tras aplicar `ALIASES_MAP` y, para cada nombre repetido (en orden
+    de primera aparición), las posiciones de sus columnas.
     """
-    import csv as _csv
-    # 1) Sniff del separador desde bytes
-    sample_bytes = path.read_bytes()[:65536]
-    sample_text  = sample_bytes.decode("utf-8", errors="ignore")
-    try:
-        sep_sniff = _csv.Sniffer().sniff(sample_text, delimiters=";,|\t,").delimiter
-    except Exception:
-        counts = {",": sample_text.count(","), ";": sample_text.count(";"),
-                  "\t": sample_text.count("\t"), "|": sample_text.count("|")}
-        sep_sniff = max(counts, key=counts.get) if any(counts.values()) else ","
-
-    # 2) Ciclo de prueba: encodings y separadores habituales
-    encodings = ["utf-8-sig", "utf-8", "cp1252", "latin-1"]
-    seps      = [sep_sniff, ",", ";", "\t", "|"]
-    engines   = ["python", "c"]
-    for enc in encodings:
-        for eng in engines:
-            for sep in seps:
-                try:
-                    return pd.read_csv(
-                        path, sep=sep, encoding=enc, engine=eng,
-                        dtype=str, keep_default_na=False, on_bad_lines="skip"
-                    )
-                except Exception:
-                    continue
-    # 3) Último recurso: que pandas adivine el separador
-    try:
-        return pd.read_csv(path, sep=None, engine="python",
-                           dtype=str, keep_default_na=False, on_bad_lines="skip")
-    except Exception as e:
-        raise RuntimeError(f"Imposible leer {path} con encodings/sep probados") from e
+    nombres = tuple(ALIASES_MAP.get(_normalize_col(c), c) for c in columnas)
+    posiciones: Dict[str, List[int]] = {}
+    for i, n in enumerate(nombres):
+        posiciones.setdefault(n, []).append(i)
+    return nombres, {n: pos for n, pos in posiciones.items() if len(pos) > 1}
+
+
+def _coalescer(columnas: List[pd.Series]) -> np.ndarray:
+    """
+    Primer valor no vacío (ni solo espacios) por fila, de izquierda a derecha;
+    "" si no hay ninguno. Los valores se comparan como `str` (NaN -> "nan").
+    """
+    n = len(columnas[0])
+    res = np.full(n, "", dtype=object)
+    pendientes = np.arange(n)
+    for col in columnas:
+        if len(pendientes) == 0:
+            break
+        valores = pd.Series(col.to_numpy(dtype=object)[pendientes]).astype(str)
+        lleno = valores.str.strip().ne("").to_numpy()
+        res[pendientes[lleno]] = valores.to_numpy(dtype=object)[lleno]
+        pendientes = pendientes[~lleno]
+    return res
 
 
 def _rename_cols(df: pd.DataFrame) -> pd.DataFrame:
     """
     Aplica el mapeo de aliases a nombres canónicos. Si tras renombrar
-    quedan columnas duplicadas, se combina tomando la primera no vacía por fila.
+    quedan columnas duplicadas, se combina tomando la primera no vacía por fila
+    (las combinadas quedan al final, en orden de primera aparición).
     """
-    mapping = {}
-    for c in df.columns:
-        key = _normalize_col(c)
-        if key in ALIASES_MAP:
-            mapping[c] = ALIASES_MAP[key]
-
-    out = df.rename(columns=mapping).copy()
-
-    # Combinar duplicadas
-    dup = out.columns.duplicated(keep=False)
-    if dup.any():
-        names = list(dict.fromkeys(out.columns[dup]))
-        for n in names:
-            iguales = out.loc[:, out.columns == n].astype(str)
-            combinado = (iguales.replace(r"^\s*$", pd.NA, regex=True)
-                               .bfill(axis=1)
-                               .iloc[:, 0]
-                               .fillna(""))
-            out = out.drop(columns=[c for c in out.columns if c == n])
-            out[n] = combinado
-    return out
+    nombres, duplicadas = _resolver_cabecera(tuple(df.columns))
+    out = df.set_axis(list(nombres), axis=1)
+    if not duplicadas:
+        return out
+
+    quitar = {i for pos in duplicadas.values() for i in pos}
+    resto = out.iloc[:, [i for i in range(out.shape[1]) if i not in quitar]]
+    combinadas = pd.DataFrame({n: _coalescer([out.iloc[:, i] for i in pos])
+                               for n, pos in duplicadas.items()}, index=out.index)
+    return pd.concat([resto, combinadas], axis=1)
 
 
 def _to_iso(s: str) -> str:
@@ -313,6 +300,84 @@ def _to_iso(s: str) -> str:
         return ""
 
 
+#---- CAMBIO: normalización de fechas por columna ----
+# `_to_iso` por celda lanza miles de excepciones (strptime) por columna. Aquí:
+#   1) se trabaja con los valores distintos (memo de cadenas repetidas),
+#   2) cada valor se clasifica por su "forma" exacta (regex con campos de 2/4
+#      dígitos en rango). Las formas son disjuntas y, para cada una, se prueban
+#      con `pd.to_datetime(format=...)` los mismos formatos y en el mismo orden
+#      que `_to_iso` (p. ej. %d/%m antes que %m/%d), así que el resultado coincide,
+#   3) la forma dominante en una muestra se evalúa primero y las demás solo
+#      sobre los valores restantes,
+#   4) lo que no encaja en ninguna forma o no se puede convertir (fechas
+#      imposibles, años fuera de rango de pandas...) pasa por `_to_iso`.
+#-----------------------------------------------------
+
+_HH_MM = r"(?:[01]\d|2[0-3]):[0-5]\d"
+_YMD   = r"\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01])"
+_AB_Y  = r"(?:0[1-9]|[12]\d|3[01])/(?:0[1-9]|[12]\d|3[01])/\d{4}"
+_TZ    = r"(?:Z|[+-](?:[01]\d|2[0-3]):[0-5]\d)?"
+
+# (forma, nº de caracteres a convertir, formatos en el orden de `_to_iso`)
+_FORMAS_FECHA: List[Tuple[re.Pattern, Optional[int], List[str]]] = [
+    (re.compile(rf"{_YMD} {_HH_MM}:[0-5]\d"), None, ["%Y-%m-%d %H:%M:%S"]),
+    (re.compile(rf"{_YMD} {_HH_MM}"),         None, ["%Y-%m-%d %H:%M"]),
+    (re.compile(rf"{_YMD}"),                  None, ["%Y-%m-%d"]),
+    (re.compile(rf"{_AB_Y} {_HH_MM}:[0-5]\d"), None, ["%d/%m/%Y %H:%M:%S", "%m/%d/%Y %H:%M:%S"]),
+    (re.compile(rf"{_AB_Y} {_HH_MM}"),        None, ["%d/%m/%Y %H:%M", "%m/%d/%Y %H:%M"]),
+    (re.compile(rf"{_AB_Y}"),                 None, ["%d/%m/%Y", "%m/%d/%Y"]),
+    # ISO con "T" (ruta `fromisoformat`): la zona horaria se ignora al formatear
+    (re.compile(rf"{_YMD}T{_HH_MM}{_TZ}"),    16,   ["%Y-%m-%dT%H:%M"]),
+    (re.compile(rf"{_YMD}T{_HH_MM}:[0-5]\d(?:\.\d{{3}}|\.\d{{6}})?{_TZ}"), 19, ["%Y-%m-%dT%H:%M:%S"]),
+]
+MUESTRA_FECHAS: int = 1000
+
+
+def _fmt_minutos(dt: pd.Series) -> List[str]:
+    """Datetimes válidos -> `YYYY-MM-DD HH:MM` (como `strftime`, pero en C)."""
+    txt = np.datetime_as_string(dt.to_numpy(dtype="datetime64[ns]"), unit="m")
+    return [t.replace("T", " ") for t in txt.tolist()]
+
+
+def _to_iso_series(s: pd.Series) -> pd.Series:
+    """
+    Equivalente vectorizado de `s.apply(_to_iso)` (mismo resultado, incluido el
+    `dayfirst` del último recurso, que sigue resolviéndolo `_to_iso`).
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    valores = pd.Series(uniques, dtype=object)
+    es_str = valores.map(type).eq(str).to_numpy()
+    limpio = valores[es_str].str.strip()
+    res = pd.Series(pd.NA, index=valores.index, dtype=object)
+    res[limpio.index[limpio == ""]] = ""
+    pendientes = limpio[limpio != ""]
+
+    # Forma dominante primero (las formas son disjuntas: el orden no cambia el resultado)
+    muestra = pendientes.head(MUESTRA_FECHAS)
+    formas = sorted(_FORMAS_FECHA, key=lambda f: -int(muestra.str.fullmatch(f[0]).sum()))
+    for patron, recorte, formatos in formas:
+        if pendientes.empty:
+            break
+        encaja = pendientes.str.fullmatch(patron).to_numpy(dtype=bool)
+        sub = pendientes[encaja]
+        pendientes = pendientes[~encaja]
+        if recorte is not None:
+            sub = sub.str.slice(0, recorte)
+        for fmt in formatos:
+            if sub.empty:
+                break
+            dt = pd.to_datetime(sub, format=fmt, errors="coerce")
+            ok = dt.notna().to_numpy()
+            res[sub.index[ok]] = _fmt_minutos(dt[ok])
+            sub = sub[~ok]
+        # Sin conversión con ningún formato de la forma -> ruta lenta
+        res[sub.index] = [_to_iso(v) for v in valores[sub.index]]
+
+    resto = res.isna().to_numpy()
+    res[resto] = [_to_iso(v) for v in valores[resto]]
+    return pd.Series(res.to_numpy()[codes], index=s.index, dtype=object)
+
+
 def _low(s: str) -> str:
     """Minúsculas sin espacios."""
     return (str(s) if s is not None else "").strip().lower()
@@ -362,26 +427,61 @@ def _norm_sla(v: str) -> str:
     return ""
 
 
+def _map_unicos(s: pd.Series, fn) -> pd.Series:
+    """
+    Equivalente a `s.apply(fn)` para columnas con pocos valores distintos
+    (catálogos): `fn` se evalúa una vez por valor único y el resultado se
+    reparte con los códigos de `pd.factorize`.
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    mapped = np.array([fn(u) for u in uniques], dtype=object)
+    return pd.Series(mapped[codes], index=s.index, dtype=object)
+
+
 #------------------------------------------------------
 # CLASIFICACIÓN POR EXPR. REGULARES (KEYWORDS + REGLAS)
 #------------------------------------------------------
 
-def _normalize_for_regex(token: str) -> str:
-    """Quita tildes y convierte espacios en `\\s+` para cuadrar variantes.”"""
-    t = "".join(c for c in unicodedata.normalize("NFD", token) if unicodedata.category(c) != "Mn")
-    t = re.sub(r"\s+", r"\\s+", t.strip())
-    return t
+#---- CAMBIO: texto normalizado una sola vez por fila ----
+# El plegado (NFD + quitar marcas `Mn` + minúsculas) se hace una vez por texto
+# distinto en `_texto_norm` y todos los comparadores (keywords del clasificador,
+# reglas contextuales y `re_doc`) leen esa columna `texto_norm`. Las marcas se
+# quitan con `str.translate` sobre una tabla precalculada y los textos ASCII
+# (la mayoría) no pasan por `unicodedata`. Los patrones usan `re.I`, así que
+# casan igual sobre el texto en minúsculas.
+#----------------------------------------------------------
 
+# Tabla para `str.translate`: borra todos los caracteres de categoría `Mn`
+# (precalculada en el artefacto de reglas).
+_MARCAS_MN: Dict[int, None] = CLASIFICADOR.marcas
+
+def _quitar_tildes(text: str) -> str:
+    """Descompone (NFD) y elimina las marcas diacríticas."""
+    return unicodedata.normalize("NFD", text or "").translate(_MARCAS_MN)
+
+
+def _plegar(text: str) -> str:
+    """Texto sin tildes y en minúsculas (lo que consumen los comparadores)."""
+    if text.isascii():
+        return text.lower()
+    return _quitar_tildes(text).lower()
 
-# Precompilar patrones (mejor rendimiento en bucles por fila).
-PAT_BASE = {
-    cat: [re.compile(rf"(?<!\w){_normalize_for_regex(tok)}(?!\w)", flags=re.I) for tok in toks]
-    for cat, toks in KW.items()
-}
-PAT_ADD = {cat: [re.compile(rf"(?<!\w){_normalize_for_regex(tok)}(?!\w)", flags=re.I) for tok in toks] for cat, toks in ADD.items()}
-PAT_NEG = {cat: [re.compile(rf"(?<!\w){_normalize_for_regex(tok)}(?!\w)", flags=re.I) for tok in toks] for cat, toks in NEG.items()}
+
+def _texto_norm(textos: pd.Series) -> pd.Series:
+    """
+    Columna `texto_norm`: `_plegar` aplicado una vez por texto distinto
+    (las plantillas y los tickets sintéticos se repiten mucho).
+    """
+    return _map_unicos(textos.astype(str), _plegar)
 
 
+#---- CAMBIO: `_score_text` como envoltorio del clasificador ----
+# La categorización va entera por `CLASIFICADOR.categorizar` (ver
+# `_categorizar`). `_score_text` se mantiene como API por texto para
+# depurar reglas y para `paridad_clasificador.py`, que es donde queda la
+# versión original (un `re.search` por patrón) como referencia.
+#----------------------------------------------------------------
+
 def _score_text(text: str) -> Tuple[Dict[str, float], int, int]:
     """
     Devuelve:
@@ -390,122 +490,198 @@ def _score_text(text: str) -> Tuple[Dict[str, float], int, int]:
       - neg_hit: nº de impactos NEG.
 
     Nota: se usa regex con anclas de palabra para evitar falsos positivos en subcadenas (“mail” dentro de “examplemail” por ejemplo).
+    Es la puntuación de `CLASIFICADOR.puntuar` sobre el texto plegado, antes
+    de las reglas contextuales.
     """
-    t = "".join(c for c in unicodedata.normalize("NFD", text or "") if unicodedata.category(c) != "Mn")
-    scores: Dict[str, float] = {c:0.0 for c in KW.keys()}
-    add_hit = 0
-    neg_hit = 0
-
-    # Keywords base
-    for cat, plist in PAT_BASE.items():
-        for p in plist:
-            if p.search(t): 
-                scores[cat] += W_HIT
-
-    # Refuerzos
-    for cat, plist in PAT_ADD.items():
-        for p in plist:
-            if p.search(t): 
-                scores[cat] += W_ADD
-                add_hit += 1
-
-    # Penalizaciones
-    for cat, plist in PAT_NEG.items():
-        for p in plist:
-            if p.search(t): 
-                scores[cat] += W_NEG
-                neg_hit += 1
-
-    return scores, add_hit, neg_hit
-
-
-def _aplicar_reglas_contexto(text: str, scores: Dict[str, float]) -> Dict[str, float]:
-    """
-    Si el texto contiene términos de `if_any`, se potencia `prefer` y se degradan categorías de `demote`. 
-    Si `force=True`, fuerza que `prefer` quede por encima de cualquier otra puntuación.
-    """
-    t = "".join(c for c in unicodedata.normalize("NFD", text or "") if unicodedata.category(c) != "Mn").lower()
-    s = scores.copy()
-    for regla in REGLAS_CONTEXTUALES:
-        if any(tok in t for tok in regla["if_any"]):
-            pref   = regla.get("prefer")
-            demote = regla.get("demote", [])
-            boost  = float(regla.get("boost", 0.0))
-            force  = bool(regla.get("force", False))
-
-            if pref:
-                s[pref] = s.get(pref, 0.0) + boost
-                if force:
-                    # Forzar “prefer” por encima del resto
-                    for c in s.keys():
-                        if c != pref: 
-                            s[c] = min(s[c], s[pref] - 1e-6)
-
-            for c in demote:
-                s[c] = s.get(c, 0.0) - (boost/2.0)
-    return s
+    return CLASIFICADOR.puntuar(_plegar(text or ""))
+
+
+#---- CAMBIO: categorización por columnas (sin iterrows) ----
+# Misma lógica que la versión por fila original (puntuar, reglas contextuales
+# y decidir), pero sobre una matriz (filas x categorías) en NumPy. Las
+# operaciones por celda se hacen en el mismo orden que la versión por fila,
+# así que las puntuaciones (incluidos los boosts no exactos como 0.7)
+# coinciden bit a bit (`paridad_clasificador.py`).
+#-----------------------------------------------------------
+
+CATS: List[str] = CLASIFICADOR.cats
+_METRICAS: Tuple[str, ...] = clasificador_reglas.METRICAS
+
+
+def _categorizar(textos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Categoriza textos ya normalizados (`texto_norm`). Devuelve el array de
+    categorías y una matriz booleana (textos x `_METRICAS`) con los indicadores
+    de impacto ADD, impacto NEG y ajuste por reglas de cada texto
+    (`Clasificador.categorizar`).
+    """
+    return CLASIFICADOR.categorizar(textos)
+
+
+#---- CAMBIO: categorización multiproceso por lotes de filas ----
+# Con `--workers N` los textos de cada fuente se parten en lotes de
+# `--lote` filas que se categorizan en un pool de procesos. Cada worker
+# importa este módulo una vez, así que carga el artefacto compilado de
+# reglas (`CLASIFICADOR`) una sola vez y lo reutiliza en todos sus lotes.
+# `Executor.map` devuelve los lotes en orden, por lo que las categorías se
+# reensamblan en el orden original de filas y las métricas (contadores por
+# fila) se suman.
+#----------------------------------------------------------------
 
+LOTE_CATEGORIZACION: int = 20_000
 
-def _decide(scores: Dict[str, float]) -> str:
+
+def _categorizar_lote(textos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Punto de entrada de cada worker: categoriza un lote de textos."""
+    return _categorizar(textos)
+
+
+#---- CAMBIO: memoización por texto normalizado ----
+# La categoría solo depende de `texto_norm`, así que se clasifica una vez
+# cada texto distinto (`pd.factorize`) y el resultado se reparte a las filas
+# con los códigos. Los lotes del pool son de textos distintos.
+#---------------------------------------------------
+
+def _categorizar_paralelo(textos_norm: pd.Series, pool: Optional[Executor] = None,
+                          lote: int = LOTE_CATEGORIZACION) -> Tuple[np.ndarray, Dict[str, int]]:
     """
-    Devuelve la categoría ganadora tras puntuación y reglas.
-    Si todas las puntuaciones son menor o = 0 -> asigna SRV (cajón seguro).
-    En caso de empate usa `CAT_ORDER`.
+    Categoriza una columna `texto_norm` completa, una vez por texto distinto
+    y, con `pool`, repartiendo lotes de textos entre procesos. Devuelve el
+    array de categorías y las métricas `_METRICAS` (contadas por fila) más
+    `textos_unicos`.
     """
-    mv = max(scores.values()) if scores else 0.0
-    if mv <= 0.0:
-        return "SRV"
-    cands = [c for c,v in scores.items() if abs(v - mv) < 1e-12]
-    for c in CAT_ORDER:
-        if c in cands: 
-            return c
-    return "SRV"
+    codigos, unicos = pd.factorize(textos_norm, use_na_sentinel=False)
+    valores = list(unicos)
+    n = len(valores)
+    if pool is None or n <= lote:
+        cats, marcas = _categorizar(valores)
+    else:
+        lotes = [valores[i:i + lote] for i in range(0, n, lote)]
+        partes = list(pool.map(_categorizar_lote, lotes))
+        cats = np.concatenate([c for c, _ in partes])
+        marcas = np.concatenate([m for _, m in partes])
+
+    stats = {k: int(v) for k, v in zip(_METRICAS, marcas[codigos].sum(axis=0))}
+    stats["textos_unicos"] = n
+    return cats[codigos], stats
 
 
 #-------------------------------------------
 # NORMALIZACIÓN POR FUENTE + CATEGORIZACIÓN
 #-------------------------------------------
 
-def _build_final_id(source_name: str, original_id: str, row_index: int) -> str:
+MAPAS_CANAL = {"kaggle_1": _map_canal_k1}
+
+# Menciones de documentación/KB (sobre `texto_norm`: sin tildes y en minúsculas)
+RE_DOC = re.compile(r"\b(?:documentation|manual|knowledge\s*base|kb|documentacion)\b")
+
+
+def _build_final_id(spec: dict, original_id: str, row_index: int) -> str:
+    """
+    Id final según el registro de la fuente: `{prefijo}GEN{n}` si no hay id de
+    origen; el id tal cual si ya trae uno de `prefijos_origen` (p. ej. synt2_/synt3_
+    en Sintético2); si no, `{prefijo}{id}`.
+    """
     orig = (original_id or "").strip()
     if orig == "":
-        if source_name == "kaggle_1":
-            return f"kaggle1_GEN{row_index+1}"
-        if source_name == "sintetico_2":
-            return f"synt2_GEN{row_index+1}"
-        return f"synt_GEN{row_index+1}"
+        return f"{spec['prefijo']}GEN{row_index+1}"
 
     low = orig.lower()
+    # No duplica si ya viene con prefijo
+    return orig if low.startswith(tuple(spec["prefijos_origen"])) else f"{spec['prefijo']}{orig}"
+
+
+def _build_final_ids(spec: dict, original_ids: pd.Series, offset: int = 0) -> pd.Series:
+    """
+    Versión por columna de `_build_final_id`: limpieza y comprobación de prefijo
+    con `map` sobre métodos de `str` (sin llamadas Python por fila) y prefijado
+    y `*_GEN{n}` con máscaras NumPy solo sobre las filas que lo necesitan.
+    """
+    acepta = tuple(spec["prefijos_origen"])
+    limpio = list(map(str.strip, original_ids.astype(str).tolist()))
+    con_prefijo = np.fromiter(map(str.startswith, map(str.lower, limpio), itertools.repeat(acepta)),
+                              dtype=bool, count=len(limpio))
+    orig = np.array(limpio, dtype=object)
+    vacio = np.fromiter(map(operator.not_, limpio), dtype=bool, count=len(limpio))
+
+    ids = orig.copy()
+    prefijar = ~(vacio | con_prefijo)
+    ids[prefijar] = spec["prefijo"] + orig[prefijar]
+    pos = np.flatnonzero(vacio)
+    ids[pos] = [f"{spec['prefijo']}GEN{i}" for i in (pos + offset + 1).tolist()]
+    return pd.Series(ids, index=original_ids.index, dtype=object)
+
+
+def _rendimiento(filas: int, segundos: float, textos_unicos: int,
+                 clave_unicos: str = "textos_unicos") -> Dict[str, float]:
+    return {"filas": int(filas), clave_unicos: int(textos_unicos), "segundos": round(segundos, 3),
+            "filas_por_segundo": round(filas / segundos, 1) if segundos > 0 else None}
+
+
+def _normalize_source(spec: dict, pool: Optional[Executor] = None, lote: int = LOTE_CATEGORIZACION,
+                      perfil: Optional[Perfil] = None) -> Tuple[pd.DataFrame, Dict[str, int], Dict[str, float]]:
+    """
+    Lee, normaliza y categoriza una fuente del registro `FUENTES`. Devuelve el
+    DF final, las métricas de impacto de diccionarios y el rendimiento de la
+    categorización.
+    """
+    with etapa(perfil, "leer", spec["fuente"]) as ev:
+        df_raw = _read_csv_any(Path(spec["ruta"]))
+        ev["filas"] = len(df_raw)
+    df, stats, segundos = _normalize_frame(df_raw, spec, pool, lote, perfil=perfil)
+    unicos = stats.pop("textos_unicos")
+    return df, stats, _rendimiento(len(df), segundos, unicos)
 
-    if source_name == "kaggle_1":
-        # No duplica si ya viene con prefijo
-        return orig if low.startswith(("kaggle1_", "k1_")) else f"kaggle1_{orig}"
 
-    if source_name == "sintetico_2":
-        # Acepta synt2_/synt3_/synt_ de origen sin volver a prefijar
-        return orig if low.startswith(("synt2_", "synt3_", "synt_")) else f"synt2_{orig}"
+def _normalize_frame(df_raw: pd.DataFrame, spec: dict, pool: Optional[Executor] = None,
+                     lote: int = LOTE_CATEGORIZACION, offset: int = 0,
+                     perfil: Optional[Perfil] = None) -> Tuple[pd.DataFrame, Dict[str, int], float]:
+    """
+    Normaliza y categoriza un DF leído de la fuente `spec` (completo o un trozo).
+    `offset` es la posición de su primera fila en la fuente (para los `*_GEN{n}`).
+    Devuelve el DF final, las métricas de diccionarios y los segundos de categorización.
+    Con `perfil` se miden las etapas renombrar, normalizar y categorizar.
+    """
+    fuente = spec["fuente"]
+    with etapa(perfil, "renombrar", fuente) as ev:
+        df = _rename_cols(df_raw)
+        ev["filas"] = len(df)
+    with etapa(perfil, "normalizar", fuente) as ev:
+        df = _normalizar_campos(df, spec, offset)
+        ev["filas"] = len(df)
+
+    # Categorización (resumen + descripción)
+    with etapa(perfil, "categorizar", fuente) as ev:
+        t0 = time.perf_counter()
+        cats, stats = _categorizar_paralelo(df["texto_norm"], pool, lote)
+        segundos = time.perf_counter() - t0
+        ev["filas"] = len(df)
 
-    # Fuente 'sintetico' (la genérica)
-    return orig if low.startswith(("synt_", "synt2_", "synt3_")) else f"synt_{orig}"
+    with etapa(perfil, "normalizar", fuente):  # filas ya contadas en la primera parte
+        df["categoria"] = cats
+        df = _compactar(df[CAMPOS_FINALES])
 
+    return df, stats, segundos
 
-def _normalize_source(path: Path, fuente: str) -> Tuple[pd.DataFrame, Dict[str, int]]:
-    df_raw = _read_csv_any(path)
-    df = _rename_cols(df_raw)
 
+def _normalizar_campos(df: pd.DataFrame, spec: dict, offset: int = 0) -> pd.DataFrame:
+    """
+    Campos de la fuente (ya renombrados) a los catálogos/formatos canónicos,
+    más `texto_norm` para la categorización.
+    """
     # Garantizar columnas mínimas
     for c in CAMPOS_FINALES:
         if c not in df.columns:
             df[c] = ""
 
     # Canal por fuente
-    if fuente == "kaggle_1":
-        df["canal"] = df["canal"].apply(_map_canal_k1)
+    if spec.get("mapa_canal"):
+        df["canal"] = _map_unicos(df["canal"], MAPAS_CANAL[spec["mapa_canal"]])
 
     # Fechas de cierre por fuente
     mapped = False
-    if fuente == "kaggle_1":
-        res_cols = [c for c in df.columns if _normalize_col(c) in ("resolved_at",)]
+    if spec.get("col_cierre"):
+        res_cols = [c for c in df.columns if _normalize_col(c) in (spec["col_cierre"],)]
         if res_cols:
             df["fecha_cierre"] = df[res_cols[0]]
             mapped = True
@@ -513,47 +689,115 @@ def _normalize_source(path: Path, fuente: str) -> Tuple[pd.DataFrame, Dict[str,
     if "fecha_cierre" not in df.columns:
         df["fecha_cierre"] = pd.NA
 
+    # Texto normalizado (resumen + descripción) que usan todos los comparadores
+    df["texto_norm"] = _texto_norm(df["resumen"].astype(str) + " | " + df["descripcion"].astype(str))
+
     # Si el texto menciona documentación/KB -> Portal Documental
-    full_txt = (df.get("resumen","").astype(str) + " " + df.get("descripcion","").astype(str))
-    re_doc = re.compile(r"\b(?:documentation|manual|knowledge\s*base|kb|documentaci[oó]n)\b", re.I)
-    df.loc[full_txt.str.contains(re_doc, na=False), "canal"] = "PORTAL_DOCUMENTAL"
+    df.loc[df["texto_norm"].str.contains(RE_DOC, na=False), "canal"] = "PORTAL_DOCUMENTAL"
 
     # Normalizaciones básicas
-    df["prioridad"]      = df["prioridad"].apply(_map_priority)
-    df["estado"]         = df["estado"].apply(_map_state)
-    df["fecha_creacion"] = df["fecha_creacion"].apply(_to_iso)
-    df["first_reply_at"] = df["first_reply_at"].apply(_to_iso)
+    df["prioridad"]      = _map_unicos(df["prioridad"], _map_priority)
+    df["estado"]         = _map_unicos(df["estado"], _map_state)
+    df["fecha_creacion"] = _to_iso_series(df["fecha_creacion"])
+    df["first_reply_at"] = _to_iso_series(df["first_reply_at"])
     if "fecha_cierre" in df.columns:
-        df["fecha_cierre"] = df["fecha_cierre"].apply(_to_iso)
-    df["sla_met"]        = df["sla_met"].apply(_norm_sla)
+        df["fecha_cierre"] = _to_iso_series(df["fecha_cierre"])
+    df["sla_met"]        = _map_unicos(df["sla_met"], _norm_sla)
 
     # ID final
-    base_ids = df.get("id_ticket","").astype(str).tolist()
-    ids = [ _build_final_id(fuente, orig, i) for i, orig in enumerate(base_ids) ]
-    df["id_ticket"] = pd.Series(ids, index=df.index)
+    df["id_ticket"] = _build_final_ids(spec, df["id_ticket"], offset)
+    return df
+
+
+#---- CAMBIO: tipos compactos en memoria ----
+# El DF normalizado ya no es todo `object` (dtype=str):
+#   - catálogos (`canal`, `estado`, `prioridad`, `categoria`) como categorías
+#     con el catálogo fijo (los valores fuera de él se añaden al final),
+#   - `agente_id` y `sla_target_horas` también como categorías: pocos valores
+#     y el texto original se conserva tal cual (p. ej. "24" vs "24.0"),
+#   - fechas como `datetime64[ns]` (NaT = vacío),
+#   - `sla_met` como booleano con nulos (`boolean`),
+#   - `id_ticket`, `resumen` y `descripcion` como strings de Arrow si pyarrow
+#     está instalado (si no, se quedan como `object`).
+# El postfix trabaja directamente sobre las fechas y el texto se genera solo
+# al exportar (`_a_texto`), con el mismo formato que antes. Si una columna de
+# fechas de la fuente tiene valores fuera del rango de `datetime64[ns]` (años
+# < 1678 o > 2261) se queda como texto, como antes: el postfix los trata
+# como vacíos (igual que la versión original) y se exportan tal cual.
+#--------------------------------------------
+
+CATALOGOS_FIJOS: Dict[str, List[str]] = {
+    "canal":     ["EMAIL", "PORTAL_SOPORTE", "PORTAL_DOCUMENTAL", "PORTAL_INTERNO"],
+    "estado":    ["Abierto", "En curso", "Resuelto", "Cerrado", "Reabierto"],
+    "prioridad": ["Urgente", "Alta", "Media", "Baja"],
+    "categoria": CAT_ORDER,
+}
+COLS_CATEGORICAS: List[str] = [*CATALOGOS_FIJOS, "agente_id", "sla_target_horas"]
+COLS_FECHA: List[str] = ["fecha_creacion", "first_reply_at", "fecha_cierre"]
+COLS_TEXTO: List[str] = ["id_ticket", "resumen", "descripcion"]
+TIPO_TEXTO = pd.StringDtype("pyarrow") if lectura_csv.HAY_ARROW else object
 
-    # Categorización (resumen + descripción)
-    cats: List[str] = []
-    add_rows = 0
-    neg_rows = 0
-    ctx_rows = 0
-    for _, r in df.iterrows():
-        text = f"{r.get('resumen','')} | {r.get('descripcion','')}"
-        scores, add_hit, neg_hit = _score_text(text)
-        scores2 = _aplicar_reglas_contexto(text, scores)
-        if scores2 != scores:
-            ctx_rows += 1
-        cats.append(_decide(scores2))
-        if add_hit > 0:
-            add_rows += 1
-        if neg_hit > 0:
-            neg_rows += 1
-
-    df["categoria"] = cats
-    df = df[CAMPOS_FINALES].copy()
-
-    stats = {"filas_con_add": int(add_rows), "filas_con_neg": int(neg_rows), "filas_ajustadas_por_reglas": int(ctx_rows)}
-    return df, stats
+
+def _categorica(s: pd.Series, catalogo: List[str]) -> pd.Series:
+    """Texto -> categoría con `catalogo` primero y el resto de valores detrás."""
+    extra = pd.unique(s[~s.isin(catalogo)].to_numpy(dtype=object))
+    return s.astype(pd.CategoricalDtype([*catalogo, *extra]))
+
+
+def _compactar(df: pd.DataFrame) -> pd.DataFrame:
+    """DF final en texto (CAMPOS_FINALES) -> tipos compactos."""
+    out = df.copy()
+    for c in COLS_CATEGORICAS:
+        out[c] = _categorica(out[c].astype(str), CATALOGOS_FIJOS.get(c, []))
+    for c in COLS_FECHA:
+        fechas = pd.to_datetime(out[c], format="%Y-%m-%d %H:%M", errors="coerce")
+        # Texto no vacío que no cabe en datetime64[ns]: la columna sigue como texto
+        if not (fechas.isna() & out[c].fillna("").ne("")).any():
+            out[c] = fechas
+    out["sla_met"] = out["sla_met"].map({"true": True, "false": False}).astype("boolean")
+    for c in COLS_TEXTO:
+        out[c] = out[c].astype(str).astype(TIPO_TEXTO)
+    return out
+
+
+def _concatenar(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    `pd.concat` conservando las categorías: si las fuentes tienen categorías
+    distintas (valores fuera de catálogo, `agente_id`...) se unen en lugar de
+    volver a `object`. Si alguna fuente tiene una columna de fechas como texto
+    (ver `_compactar`), esa columna pasa a texto en todas.
+    """
+    for c in COLS_FECHA:
+        if len(dfs) > 1 and not all(pd.api.types.is_datetime64_dtype(df[c].dtype) for df in dfs):
+            dfs = [df.assign(**{c: _fmt_iso_array(df[c].to_numpy())})
+                   if pd.api.types.is_datetime64_dtype(df[c].dtype) else df for df in dfs]
+    out = pd.concat(dfs, ignore_index=True)
+    for c in COLS_CATEGORICAS:
+        if len(dfs) > 1 and not isinstance(out[c].dtype, pd.CategoricalDtype):
+            out[c] = pd.api.types.union_categoricals([df[c] for df in dfs])
+    return out
+
+
+def _a_texto(df: pd.DataFrame) -> Dict[str, list]:
+    """
+    Columnas de `df` como listas de texto, igual que el CSV original (fechas
+    `YYYY-MM-DD HH:MM`, `sla_met` true/false y vacío para los nulos).
+    """
+    columnas: Dict[str, list] = {}
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            cats = np.append(s.cat.categories.to_numpy(dtype=object), "")
+            columnas[c] = cats[s.cat.codes.to_numpy()].tolist()  # código -1 -> ""
+        elif pd.api.types.is_datetime64_dtype(s.dtype):
+            columnas[c] = _fmt_iso_array(s.to_numpy()).tolist()
+        elif isinstance(s.dtype, pd.BooleanDtype):
+            txt = np.where(s.fillna(False).to_numpy(dtype=bool), "true", "false").astype(object)
+            txt[s.isna().to_numpy()] = ""
+            columnas[c] = txt.tolist()
+        else:
+            columnas[c] = (s.fillna("") if s.hasnans else s).tolist()
+    return columnas
 
 
 #---------------------------------------
@@ -568,7 +812,10 @@ def _parse_dt_series(s: pd.Series) -> pd.Series:
     """
     Convierte una serie de strings a datetime. Primero intenta el
     formato objetivo, si falla y detecta dígitos, hace un intento final.
+    Si ya es datetime (DF compacto) se devuelve tal cual.
     """
+    if pd.api.types.is_datetime64_dtype(s.dtype):
+        return s
     s3 = pd.to_datetime(s, format="%Y-%m-%d %H:%M", errors="coerce")
     mask = s3.isna() & s.astype(str).str.contains(r"\d", regex=True)
     if mask.any():
@@ -576,15 +823,92 @@ def _parse_dt_series(s: pd.Series) -> pd.Series:
     return s3
 
 
-def _fmt_iso(dt: pd.Series) -> pd.Series:
-    """Formatea una serie datetime a `YYYY-MM-DD HH:MM`, manteniendo vacíos."""
-    return dt.dt.strftime("%Y-%m-%d %H:%M").fillna("")
+def _fmt_iso_array(valores: np.ndarray) -> np.ndarray:
+    """
+    Array `datetime64` -> `YYYY-MM-DD HH:MM` (formateo en C, una vez por valor
+    distinto; NaT -> "").
+    """
+    codigos, unicos = pd.factorize(valores, use_na_sentinel=True)
+    txt = np.datetime_as_string(np.asarray(unicos, dtype=valores.dtype), unit="m")
+    if txt.dtype == np.dtype("<U16"):
+        # Ancho fijo: la "T" (posición 10) se sustituye en el buffer, sin copiar texto
+        txt.view(np.uint32).reshape(-1, 16)[:, 10] = ord(" ")
+        txt = txt.astype(object)
+    else:
+        txt = np.char.replace(txt, "T", " ").astype(object)
+    return np.append(txt, "")[codigos]  # código -1 (NaT) -> ""
+
+
+POSTFIX_COLS: List[str] = ["id_ticket","regla","antes_fecha_cierre","despues_fecha_cierre"]
+
+
+#---- CAMBIO: reglas del postfix como tabla declarativa ----
+# Cada regla es una entrada de `REGLAS_POSTFIX`, en el orden en que se
+# aplican (el mismo que tenía el código):
+#   - regla:  nombre que aparece en `postfix_changes.csv`,
+#   - cuando: máscara de filas afectadas, calculada sobre el estado actual
+#             (`c.close` ya incluye lo que han cambiado las reglas anteriores),
+#   - nuevo:  nueva `fecha_cierre` para esas filas (None = vaciar).
+# `c` es un `_ContextoPostfix` con las fechas parseadas, el estado y `now`.
+# El log de auditoría se acumula como arrays por regla y se formatea una sola
+# vez al final (sin un dict por fila). Con `--parquet` se escribe también en
+# `logs/postfix_changes/` como Parquet.
+#-----------------------------------------------------------
+
+class _ContextoPostfix:
+    """Columnas que usan las reglas del postfix (fechas ya parseadas)."""
+
+    def __init__(self, df: pd.DataFrame, now: pd.Timestamp):
+        self.crea  = _parse_dt_series(df["fecha_creacion"])
+        self.first = _parse_dt_series(df["first_reply_at"])
+        self.close = _parse_dt_series(df["fecha_cierre"])
+        estado = df["estado"].astype(str)
+        self.abierto = estado.isin(OPEN_STATES_ES)
+        self.cerrado = estado.isin(CLOSED_STATES_ES)
+        self.now = now
+
+    def max_first_crea(self) -> pd.Series:
+        return pd.concat([self.first, self.crea], axis=1).max(axis=1)
+
+
+REGLAS_POSTFIX: List[dict] = [
+    # 0) fecha_cierre en el futuro -> vaciar
+    {"regla": "A_future_close_cleared",
+     "cuando": lambda c: c.close.notna() & (c.close > c.now),
+     "nuevo": None},
+    # 1) abierto/en curso/reabierto + fecha_cierre -> vaciar
+    {"regla": "1_open_with_close_cleared",
+     "cuando": lambda c: c.abierto & c.close.notna(),
+     "nuevo": None},
+    # 3) cierre menor que creación -> vaciar
+    {"regla": "3_close_before_creation_cleared",
+     "cuando": lambda c: c.close.notna() & c.crea.notna() & (c.close < c.crea),
+     "nuevo": None},
+    # 4a) cierre menor que first_reply_at y cerrado/resuelto -> max(first, crea) si existe...
+    {"regla": "4_close_before_first_fixed_to_max",
+     "cuando": lambda c: c.close.notna() & c.first.notna() & (c.close < c.first) & c.cerrado
+                         & c.max_first_crea().notna(),
+     "nuevo": lambda c: c.max_first_crea()},
+    # ... y si no -> vaciar
+    {"regla": "4_close_before_first_cleared_no_candidate",
+     "cuando": lambda c: c.close.notna() & c.first.notna() & (c.close < c.first) & c.cerrado,
+     "nuevo": None},
+    # 4b) cierre menor que first_reply_at y estado que no es de cierre -> vaciar
+    {"regla": "4_close_before_first_cleared_open_state",
+     "cuando": lambda c: c.close.notna() & c.first.notna() & (c.close < c.first) & ~c.cerrado,
+     "nuevo": None},
+    # 2) cerrado/resuelto sin fecha_cierre -> imputar max(first, crea)
+    {"regla": "2_closed_without_close_imputed",
+     "cuando": lambda c: c.cerrado & c.close.isna() & c.max_first_crea().notna(),
+     "nuevo": lambda c: c.max_first_crea()},
+]
 
 
-def _postfix_dates_states(df: pd.DataFrame) -> pd.DataFrame:
+def _postfix_dates_states(df: pd.DataFrame, now: Optional[pd.Timestamp] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Aplica 4 reglas de coherencia entre fechas y estado, registrando todas
-    las correcciones en `logs/postfix_changes.csv`:
+    Aplica las reglas de coherencia entre fechas y estado de `REGLAS_POSTFIX`
+    y devuelve el DF corregido junto con el detalle de todas las correcciones
+    (se guarda en `logs/postfix_changes.csv`):
 
     0) `fecha_cierre` en futuro -> vaciar.
     1) Estado abierto/en curso/reabierto + `fecha_cierre` presente -> vaciar.
@@ -596,130 +920,610 @@ def _postfix_dates_states(df: pd.DataFrame) -> pd.DataFrame:
 
     Además, si el estado es Cerrado/Resuelto y la `fecha_cierre` está vacía,
     se imputa `fecha_cierre = max(first_reply_at, fecha_creacion)` cuando sea posible.
+
+    Las reglas son fila a fila, así que se puede aplicar por trozos pasando el
+    mismo `now` a todos ellos.
     """
     out = df.copy()
+    if now is None:
+        now = pd.Timestamp.now()
+    c = _ContextoPostfix(out, now)
+    ids = out["id_ticket"].to_numpy(dtype=object)
+
+    # Log de auditoría como arrays por regla (en el orden de aplicación)
+    log_ids, log_reglas, log_antes, log_despues = [], [], [], []
+    for regla in REGLAS_POSTFIX:
+        mask = regla["cuando"](c).to_numpy(dtype=bool)
+        n = int(mask.sum())
+        if n == 0:
+            continue
+        antes = c.close.to_numpy(dtype="datetime64[ns]")[mask]
+        if regla["nuevo"] is None:
+            despues = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+        else:
+            despues = regla["nuevo"](c).to_numpy(dtype="datetime64[ns]")[mask]
+        log_ids.append(ids[mask])
+        log_reglas.append(np.full(n, regla["regla"], dtype=object))
+        log_antes.append(antes)
+        log_despues.append(despues)
+        c.close = c.close.copy()
+        c.close.iloc[np.flatnonzero(mask)] = despues
+
+    if log_ids:
+        cambios = pd.DataFrame({
+            "id_ticket": np.concatenate(log_ids),
+            "regla": np.concatenate(log_reglas),
+            "antes_fecha_cierre": _fmt_iso_array(np.concatenate(log_antes)),
+            "despues_fecha_cierre": _fmt_iso_array(np.concatenate(log_despues)),
+        }, columns=POSTFIX_COLS)
+    else:
+        cambios = pd.DataFrame(columns=POSTFIX_COLS)
+
+    # Devolver dataframe con `fecha_cierre` corregida (datetime) y los cambios.
+    out["fecha_cierre"] = c.close
+    return out, cambios
+
+
+#---- CAMBIO: escritura de salidas en una pasada ----
+# Antes cada fichero se generaba con `to_csv` sobre su propio filtro
+# (`final[final["canal"] == canal]`), así que cada fila se serializaba dos
+# veces (unificado + su canal). Ahora:
+#   1) las filas se serializan una vez con `csv.writer` (mismo formato que
+#      `to_csv(sep=";")`: QUOTE_MINIMAL, `os.linesep`, nulos como ""),
+#   2) se agrupan por canal en una sola pasada (`groupby(...).indices`),
+#   3) el unificado y cada corte se escriben en un pool de hilos, por
+#      bloques y con buffer, opcionalmente comprimidos (`--comprimir`). La
+#      escritura y la compresión liberan el GIL; la serialización no, por eso
+#      se hace una sola vez antes de repartir.
+#----------------------------------------------------
+
+BUFFER_SALIDA: int = 1 << 20
+FILAS_POR_BLOQUE: int = 10_000
+# Compresión -> (función `open` del módulo, extensión). gzip con nivel 6: el 9
+# por defecto apenas reduce más y tarda bastante más.
+COMPRESIONES: Dict[str, Tuple[object, str]] = {
+    "gzip": (functools.partial(gzip.open, compresslevel=6), ".gz"),
+    "bz2":  (bz2.open, ".bz2"),
+    "xz":   (lzma.open, ".xz"),
+}
 
-    crea  = _parse_dt_series(out["fecha_creacion"])
-    first = _parse_dt_series(out["first_reply_at"])
-    close = _parse_dt_series(out["fecha_cierre"])
-    estado = out["estado"].astype(str)
 
-    changes = []  # Aquí todas las modificaciones para auditar
-    now = pd.Timestamp.now()
+class _Filas(list):
+    """Destino de `csv.writer`: cada `write` recibe una fila ya serializada."""
+    write = list.append
+
+
+def _serializar(df: pd.DataFrame) -> Tuple[str, np.ndarray]:
+    """Cabecera y array de filas CSV (texto) del DF, en su orden."""
+    filas = _Filas()
+    escritor = csv.writer(filas, delimiter=";", lineterminator=os.linesep)
+    escritor.writerow(df.columns)
+    cabecera = filas.pop()
+    escritor.writerows(zip(*_a_texto(df).values()))
+    return cabecera, np.array(filas, dtype=object)
+
+
+def _ruta_salida(ruta: Path, comprimir: Optional[str] = None) -> Path:
+    return ruta if comprimir is None else ruta.with_name(ruta.name + COMPRESIONES[comprimir][1])
+
+
+def _abrir_salidas(stack: contextlib.ExitStack, comprimir: Optional[str] = None) -> Dict[Path, TextIO]:
+    """Abre el unificado y los cortes por canal (UTF-8 con BOM), con buffer o comprimidos."""
+    salidas: Dict[Path, TextIO] = {}
+    for ruta in [OUT_ALL, *OUT_BY_CHANNEL.values()]:
+        destino = _ruta_salida(ruta, comprimir)
+        if comprimir is None:
+            fh = open(destino, "w", encoding="utf-8-sig", newline="", buffering=BUFFER_SALIDA)
+        else:
+            fh = COMPRESIONES[comprimir][0](destino, "wt", encoding="utf-8-sig", newline="")
+        salidas[ruta] = stack.enter_context(fh)
+    return salidas
+
 
-    # Regla 0: fecha_cierre en el futuro -> vaciar
-    maskA = close.notna() & (close > now)
-    if maskA.any():
-        for _id, before in zip(out.loc[maskA, "id_ticket"], _fmt_iso(close[maskA])):
-            changes.append({"id_ticket": _id, "regla": "A_future_close_cleared", "antes_fecha_cierre": before, "despues_fecha_cierre": ""})
-        close.loc[maskA] = pd.NaT
-
-    # Regla 1: abierto/en curso/reabierto + fecha_cierre -> vaciar
-    mask1 = estado.isin(OPEN_STATES_ES) & close.notna()
-    if mask1.any():
-        for _id, before in zip(out.loc[mask1, "id_ticket"], _fmt_iso(close[mask1])):
-            changes.append({"id_ticket": _id, "regla": "1_open_with_close_cleared", "antes_fecha_cierre": before, "despues_fecha_cierre": ""})
-        close.loc[mask1] = pd.NaT
-
-    # Regla 2: cierre menor que creación -> vaciar
-    mask3 = close.notna() & crea.notna() & (close < crea)
-    if mask3.any():
-        for _id, before in zip(out.loc[mask3, "id_ticket"], _fmt_iso(close[mask3])):
-            changes.append({"id_ticket": _id, "regla": "3_close_before_creation_cleared", "antes_fecha_cierre": before, "despues_fecha_cierre": ""})
-        close.loc[mask3] = pd.NaT
-
-    # Regla 3: cierre menor que first_reply_at
-    mask4 = close.notna() & first.notna() & (close < first)
-    # 3a) Si cerrado/resuelto -> fix a max(first, crea) si existe; si no -> vaciar
-    mask4a = mask4 & estado.isin(CLOSED_STATES_ES)
-    if mask4a.any():
-        target = pd.Series(pd.NaT, index=out.index, dtype="datetime64[ns]")
-        target.loc[mask4a] = pd.concat([first.loc[mask4a], crea.loc[mask4a]], axis=1).max(axis=1)
-        repl = target.notna()
-        if repl.any():
-            for _id, before, after in zip(out.loc[mask4a & repl, "id_ticket"], _fmt_iso(close[mask4a & repl]), _fmt_iso(target[mask4a & repl])):
-                changes.append({"id_ticket": _id, "regla": "4_close_before_first_fixed_to_max", "antes_fecha_cierre": before, "despues_fecha_cierre": after})
-            close.loc[mask4a & repl] = target.loc[mask4a & repl]
-        vaciar = mask4a & ~repl
-        if vaciar.any():
-            for _id, before in zip(out.loc[vaciar, "id_ticket"], _fmt_iso(close[vaciar])):
-                changes.append({"id_ticket": _id, "regla": "4_close_before_first_cleared_no_candidate", "antes_fecha_cierre": before, "despues_fecha_cierre": ""})
-            close.loc[vaciar] = pd.NaT
-
-    # 3b) Si el estado no es de cierre -> vaciar
-    mask4b = mask4 & ~estado.isin(CLOSED_STATES_ES)
-    if mask4b.any():
-        for _id, before in zip(out.loc[mask4b, "id_ticket"], _fmt_iso(close[mask4b])):
-            changes.append({"id_ticket": _id, "regla": "4_close_before_first_cleared_open_state", "antes_fecha_cierre": before, "despues_fecha_cierre": ""})
-        close.loc[mask4b] = pd.NaT
-
-    # Regla 4: estado cerrado/resuelto y cierre vacío -> imputar a max(first, crea)
-    mask2 = estado.isin(CLOSED_STATES_ES) & close.isna()
-    if mask2.any():
-        candidate = pd.concat([first, crea], axis=1).max(axis=1)
-        apply2 = mask2 & candidate.notna()
-        if apply2.any():
-            for _id, after in zip(out.loc[apply2, "id_ticket"], _fmt_iso(candidate[apply2])):
-                changes.append({"id_ticket": _id, "regla": "2_closed_without_close_imputed", "antes_fecha_cierre": "", "despues_fecha_cierre": after})
-            close.loc[apply2] = candidate.loc[apply2]
-
-    # Persistir cambios y devolver dataframe con `fecha_cierre` ya formateada.
-    out["fecha_cierre"] = _fmt_iso(close)
-    pd.DataFrame(changes, columns=["id_ticket","regla","antes_fecha_cierre","despues_fecha_cierre"]).to_csv(POSTFIX_LOG, index=False, encoding="utf-8-sig")
+def _volcar(fh: TextIO, cabecera: Optional[str], filas: np.ndarray) -> None:
+    if cabecera is not None:
+        fh.write(cabecera)
+    for i in range(0, len(filas), FILAS_POR_BLOQUE):
+        fh.write("".join(filas[i:i + FILAS_POR_BLOQUE]))
+
+
+def _escribir_salidas(df: pd.DataFrame, salidas: Dict[Path, TextIO], hilos: Executor,
+                      con_cabecera: bool = True) -> None:
+    """Escribe `df` en el unificado y sus filas de cada canal en el corte correspondiente."""
+    cabecera, filas = _serializar(df)
+    posiciones = df.groupby("canal", sort=False, observed=True).indices
+    sin_filas = np.zeros(0, dtype=np.int64)
+    partes = {OUT_ALL: filas}
+    for canal, ruta in OUT_BY_CHANNEL.items():
+        partes[ruta] = filas[posiciones.get(canal, sin_filas)]
+
+    cab = cabecera if con_cabecera else None
+    list(hilos.map(lambda ruta: _volcar(salidas[ruta], cab, partes[ruta]), partes))
+
+
+#---- CAMBIO: exportación Parquet opcional ----
+# Con `--parquet [DIR]` el dataset final se escribe además como Parquet
+# particionado (hive) por `canal` y mes de creación (`mes_creacion=YYYY-MM`,
+# `0000-00` si no hay fecha), con fechas como timestamp, catálogos como
+# categorías (diccionario en Parquet) y `sla_met` booleano. Los lectores
+# pueden podar particiones y columnas, p. ej.:
+#   pd.read_parquet(DIR, columns=["id_ticket", "categoria"],
+#                   filters=[("canal", "=", "EMAIL"), ("mes_creacion", ">=", "2024-01")])
+# pyarrow es opcional: solo hace falta con `--parquet`. Los CSV se siguen
+# escribiendo igual (exportación de compatibilidad).
+#-----------------------------------------------
+
+PARQUET_DIR: Path = OUT_DIR / "parquet"
+CATALOGOS: List[str] = ["estado", "prioridad", "categoria"]
+PARTICIONES: List[str] = ["canal", "mes_creacion"]
+MES_SIN_FECHA: str = "0000-00"
+
+
+def _fechas_ms(s: pd.Series) -> pd.Series:
+    """Fechas (datetime o texto `YYYY-MM-DD HH:MM`) como `datetime64[ms]`: cabe cualquier año."""
+    if pd.api.types.is_datetime64_dtype(s.dtype):
+        return s.astype("datetime64[ms]")
+    valores = np.where(s.fillna("").to_numpy(dtype=object) == "", "NaT", s.to_numpy(dtype=object))
+    return pd.Series(valores.astype("datetime64[ms]"), index=s.index)
+
+
+def _tipar_columnas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copia del DF final (ya compacto) para Parquet, más `mes_creacion`. Solo
+    `CATALOGOS` se guardan como diccionario; el resto de categorías, como texto.
+    Las fechas van en milisegundos para que todas las partes tengan el mismo
+    tipo aunque alguna columna haya quedado como texto (`_compactar`).
+    """
+    out = df.copy()
+    for c in COLS_CATEGORICAS:
+        if c not in CATALOGOS:
+            out[c] = out[c].astype(object)
+    for c in COLS_FECHA:
+        out[c] = _fechas_ms(out[c])
+    # Sin fecha de creación -> "0000-00" (una partición nula no se puede leer
+    # junto a las demás y así queda antes de cualquier mes en los filtros)
+    out["mes_creacion"] = out["fecha_creacion"].dt.strftime("%Y-%m").fillna(MES_SIN_FECHA)
     return out
 
 
+def _exportar_parquet(df: pd.DataFrame, destino: Path, parte: int = 0) -> None:
+    """
+    Añade `df` al dataset Parquet de `destino`. `parte` distingue los ficheros
+    de cada trozo en modo `--stream` (cada llamada escribe los suyos).
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+
+    tabla = pa.Table.from_pandas(_tipar_columnas(df), preserve_index=False)
+    opciones = pads.ParquetFileFormat().make_write_options(compression="zstd", use_dictionary=True)
+    pads.write_dataset(tabla, destino, format="parquet", file_options=opciones,
+                       partitioning=PARTICIONES, partitioning_flavor="hive",
+                       basename_template=f"parte-{parte}-{{i}}.parquet",
+                       existing_data_behavior="overwrite_or_ignore")
+
+
+def _exportar_log_parquet(cambios: pd.DataFrame, destino: Path, parte: int = 0) -> None:
+    """
+    Escribe el log del postfix como `destino/parte-{parte}.parquet` (todas las
+    columnas como texto, igual que en `postfix_changes.csv`).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([(c, pa.string()) for c in POSTFIX_COLS])
+    tabla = pa.Table.from_pandas(cambios, schema=esquema, preserve_index=False)
+    destino.mkdir(parents=True, exist_ok=True)
+    pq.write_table(tabla, destino / f"parte-{parte}.parquet", compression="zstd")
+
+
+#---- CAMBIO: caché por fuente direccionada por contenido ----
+# El DF normalizado y categorizado de cada fuente (antes del postfix, que
+# depende de la hora de ejecución) se guarda en `data/cache/normalizar/` con
+# una clave que combina:
+#   - el hash del CSV de entrada,
+#   - el hash de las reglas (`reglas/categorias.json`: KW/ADD/NEG/reglas contextuales/pesos/orden),
+#   - la versión del código (hash de este módulo, `lectura_csv.py` y `clasificador_reglas.py`),
+#   - la entrada de la fuente en el registro (prefijos, mapa de canal...).
+# Si la clave ya existe se carga el DF; si no, se normaliza, se guarda y se
+# borran las entradas antiguas de esa fuente (solo `<fuente>-<clave>.pkl`
+# exacto: `jira` no toca las de `jira-core`). Concat, postfix y exportación
+# se repiten siempre. En un acierto el rendimiento no se vuelve a medir: se
+# informa de filas y textos únicos con `"cache": "hit"` y sin segundos.
+#-------------------------------------------------------------
+
+CACHE_DIR: Path = ROOT / "data" / "cache" / "normalizar"
+
+
+def _hash_fichero(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with Path(path).open("rb") as fh:
+        for bloque in iter(lambda: fh.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _hash_json(obj) -> str:
+    texto = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _huella_reglas() -> str:
+    """Hash de las reglas que determinan la categoría (`reglas/categorias.json`)."""
+    return CLASIFICADOR.huella
+
+
+def _version_codigo() -> str:
+    """Hash del código que produce el DF normalizado (este módulo + lectura + clasificador)."""
+    h = hashlib.blake2b(digest_size=16)
+    for modulo in (Path(__file__), Path(lectura_csv.__file__), Path(clasificador_reglas.__file__)):
+        h.update(modulo.read_bytes())
+    return h.hexdigest()
+
+
+def _es_entrada_cache(nombre: str, fuente: str) -> bool:
+    """`nombre` es exactamente `<fuente>-<clave>.pkl` (clave de 32 hex)."""
+    return re.fullmatch(rf"{re.escape(fuente)}-[0-9a-f]{{32}}\.pkl", nombre) is not None
+
+
+def _clave_cache(spec: dict) -> str:
+    return _hash_json({"entrada": _hash_fichero(spec["ruta"]), "reglas": _huella_reglas(),
+                       "codigo": _version_codigo(), "fuente": spec})
+
+
+def _normalizar_con_cache(spec: dict, pool: Optional[Executor], lote: int, cache_dir: Path,
+                          perfil: Optional[Perfil] = None) -> Tuple[pd.DataFrame, Dict[str, int], Dict[str, float], str]:
+    """`_normalize_source` con caché en `cache_dir`; devuelve además "hit"/"miss"."""
+    clave = _clave_cache(spec)
+    ruta = cache_dir / f"{spec['fuente']}-{clave}.pkl"
+    if ruta.exists():
+        with etapa(perfil, "cache", spec["fuente"]) as ev:
+            df, stats, rendimiento = pd.read_pickle(ruta)
+            ev["filas"] = len(df)
+        # Los segundos guardados son de la ejecución que creó la entrada
+        rendimiento = {"filas": rendimiento["filas"], "textos_unicos": rendimiento["textos_unicos"],
+                       "segundos": None, "filas_por_segundo": None, "cache": "hit"}
+        return df, stats, rendimiento, "hit"
+
+    df, stats, rendimiento = _normalize_source(spec, pool, lote, perfil)
+    with etapa(perfil, "cache", spec["fuente"]) as ev:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(f".{os.getpid()}.tmp")
+        pd.to_pickle((df, stats, rendimiento), tmp)
+        os.replace(tmp, ruta)
+        for antigua in cache_dir.glob(f"{spec['fuente']}-*.pkl"):
+            if antigua != ruta and _es_entrada_cache(antigua.name, spec["fuente"]):
+                antigua.unlink(missing_ok=True)
+        ev["filas"] = len(df)
+    return df, stats, rendimiento, "miss"
+
+
 #-------------------
 # PROGRAMA PRINCIPAL
 #-------------------
 
-def main() -> None:
+#---- CAMBIO: detección de casi duplicados (MinHash/LSH) ----
+# Con `--duplicados [UMBRAL]` el texto de cada ticket ya normalizado
+# (`resumen | descripcion`, plegado como `texto_norm`) se añade a un índice
+# MinHash/LSH (`duplicados.py`) y, al final, se escribe en
+# `data/s3/duplicados.csv` el cluster de cada ticket: el `id_ticket` del
+# primero de su grupo de casi duplicados (él mismo si no tiene) y el tamaño
+# del grupo. El coste es lineal (no se comparan todos los pares). Con
+# `--stream` se indexa trozo a trozo y se agrupa al final. Las salidas
+# principales no cambian: el fichero sirve para marcar o colapsar duplicados
+# aguas abajo (p. ej. antes de partir train/valid).
+#-------------------------------------------------------------
+
+DUPLICADOS_COLS: List[str] = ["id_ticket", "cluster_id", "tamano_cluster"]
+LOTE_DUPLICADOS: int = 500_000
+
+
+def _indexar_duplicados(indice: duplicados.IndiceDuplicados, df: pd.DataFrame) -> None:
+    """Añade los tickets de `df` (ya normalizados) al índice, por lotes de filas."""
+    for i in range(0, len(df), LOTE_DUPLICADOS):
+        parte = df.iloc[i:i + LOTE_DUPLICADOS]
+        textos = _texto_norm(parte["resumen"].astype(str) + " | " + parte["descripcion"].astype(str))
+        indice.agregar(textos.to_numpy(dtype=object), parte["id_ticket"].to_numpy(dtype=object))
+
+
+def _escribir_duplicados(indice: duplicados.IndiceDuplicados, destino: Path) -> dict:
+    """Agrupa el índice, escribe el cluster de cada ticket y devuelve el resumen para el reporte."""
+    etiquetas = indice.clusters()
+    ids = indice.ids()
+    tamanos = np.bincount(etiquetas, minlength=len(etiquetas))
+    pd.DataFrame({"id_ticket": ids, "cluster_id": ids[etiquetas], "tamano_cluster": tamanos[etiquetas]},
+                 columns=DUPLICADOS_COLS).to_csv(destino, sep=";", index=False, encoding="utf-8-sig")
+    return {**indice.resumen(etiquetas), "salida": str(destino)}
+
+
+def _cargar_fuentes(path: Optional[Path]) -> List[dict]:
+    """
+    Devuelve el registro de fuentes: `FUENTES` o, si se indica, la lista JSON
+    de `path` (mismo formato; rutas relativas a ROOT).
+    """
+    if path is None:
+        return FUENTES
+    fuentes = json.loads(Path(path).read_text(encoding="utf-8"))
+    for spec in fuentes:
+        faltan = {"fuente", "ruta", "prefijo", "prefijos_origen"} - set(spec)
+        if faltan:
+            raise ValueError(f"Fuente {spec.get('fuente', '?')}: faltan claves {sorted(faltan)}")
+        if spec.get("mapa_canal") and spec["mapa_canal"] not in MAPAS_CANAL:
+            raise ValueError(f"Fuente {spec['fuente']}: mapa_canal desconocido {spec['mapa_canal']!r}")
+        spec["ruta"] = ROOT / spec["ruta"]
+    return fuentes
+
+
+def _procesar_fuente(spec: dict, workers: int = 1, lote: int = LOTE_CATEGORIZACION,
+                     cache_dir: Optional[Path] = None, memoria: Optional[str] = None
+                     ) -> Tuple[pd.DataFrame, Dict[str, int], Dict[str, float], str, List[dict]]:
+    """
+    Unidad de trabajo por fuente (se puede ejecutar en otro proceso). Con
+    `workers > 1` la fuente categoriza con su propio pool de procesos. Con
+    `cache_dir` usa la caché por fuente; el 4º elemento es "hit", "miss" u
+    "off" (sin caché). Con `memoria` ("rss"/"tracemalloc") mide las etapas de
+    la fuente en este proceso y las devuelve como último elemento.
+    """
+    perfil = Perfil(memoria) if memoria is not None else None
+
+    def normalizar(pool: Optional[Executor]):
+        if cache_dir is None:
+            return (*_normalize_source(spec, pool, lote, perfil), "off")
+        return _normalizar_con_cache(spec, pool, lote, cache_dir, perfil)
+
+    if workers <= 1:
+        resultado = normalizar(None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            resultado = normalizar(pool)
+    return (*resultado, perfil.eventos if perfil is not None else [])
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Normaliza, categoriza y unifica los CSVs de tickets.")
+    ap.add_argument("--fuentes", type=Path, default=None,
+                    help="JSON con el registro de fuentes (por defecto, FUENTES).")
+    ap.add_argument("--jobs", type=int, default=0,
+                    help="Fuentes procesadas a la vez, cada una en su proceso (0 = auto).")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Procesos para categorizar por lotes de filas (1 = en serie).")
+    ap.add_argument("--lote", type=int, default=LOTE_CATEGORIZACION,
+                    help="Filas por lote enviado a cada worker.")
+    ap.add_argument("--stream", action="store_true",
+                    help="Procesa y escribe por trozos con memoria acotada (ignora --jobs).")
+    ap.add_argument("--chunksize", type=int, default=100_000,
+                    help="Filas por trozo en modo --stream.")
+    ap.add_argument("--comprimir", choices=sorted(COMPRESIONES), default=None,
+                    help="Comprime el CSV unificado y los cortes por canal (añade .gz/.bz2/.xz).")
+    ap.add_argument("--parquet", type=Path, nargs="?", const=PARQUET_DIR, default=None,
+                    help=f"Escribe también el dataset Parquet particionado (por defecto en {PARQUET_DIR}; requiere pyarrow).")
+    ap.add_argument("--sin-cache", action="store_true",
+                    help="No usa ni actualiza la caché por fuente (data/cache/normalizar).")
+    ap.add_argument("--perfil", choices=MEMORIAS, nargs="?", const="rss", default=None,
+                    help="Mide tiempo, CPU, filas/s y memoria por etapa y fuente (memoria: rss por defecto o tracemalloc).")
+    ap.add_argument("--duplicados", type=float, nargs="?", const=duplicados.UMBRAL, default=None, metavar="UMBRAL",
+                    help=f"Detecta casi duplicados (MinHash/LSH, similitud >= UMBRAL, por defecto {duplicados.UMBRAL}) "
+                         f"y escribe el cluster de cada ticket en {DUPLICADOS_CSV}.")
+    ap.add_argument("--traza", type=Path, nargs="?", const=TRAZA_PATH, default=None,
+                    help=f"Escribe las etapas medidas como traza de Chrome (por defecto en {TRAZA_PATH}; implica --perfil).")
+    args = ap.parse_args(argv)
+    if args.traza is not None and args.perfil is None:
+        args.perfil = "rss"
+    if args.parquet is not None and not lectura_csv.HAY_ARROW:
+        ap.error("--parquet requiere pyarrow (pip install pyarrow)")
+    if args.duplicados is not None and not 0.0 < args.duplicados < 1.0:
+        ap.error("--duplicados: el umbral debe estar entre 0 y 1")
+    return args
+
+
+def _conteos(s: pd.Series) -> Dict[str, int]:
+    """`value_counts` sin las categorías que no aparecen."""
+    vc = s.value_counts(dropna=False)
+    return vc[vc > 0].to_dict()
+
+
+def _contar(counter: Counter) -> Dict[str, int]:
+    """Contador acumulado -> dict ordenado como `value_counts` (mayor a menor)."""
+    return {k: int(v) for k, v in counter.most_common()}
+
+
+def _ejecutar_stream(fuentes: List[dict], args: argparse.Namespace, now: pd.Timestamp,
+                     perfil: Optional[Perfil] = None, indice: Optional[duplicados.IndiceDuplicados] = None
+                     ) -> Tuple[int, Counter, Counter, dict, dict]:
+    """
+    Modo `--stream`: lee, normaliza, categoriza, aplica el postfix y añade a los
+    CSV de salida trozo a trozo (`--chunksize` filas), fuente tras fuente en el
+    orden del registro. La memoria no depende del tamaño de la entrada (salvo
+    el índice de duplicados, si se pasa `indice`) y los contadores del reporte
+    se acumulan por trozo.
+    """
+    total = 0
+    por_canal: Counter = Counter()
+    por_categoria: Counter = Counter()
+    impacto: Dict[str, Dict[str, int]] = {}
+    rendimiento: Dict[str, Dict[str, float]] = {}
+
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    with contextlib.ExitStack() as stack:
+        if pool is not None:
+            stack.enter_context(pool)
+        hilos = stack.enter_context(ThreadPoolExecutor(max_workers=1 + len(OUT_BY_CHANNEL)))
+        salidas = _abrir_salidas(stack, args.comprimir)
+        f_log = stack.enter_context(open(POSTFIX_LOG, "w", encoding="utf-8-sig", newline=""))
+        primero = True
+        partes = itertools.count()
+
+        for spec in fuentes:
+            stats: Counter = Counter()
+            filas = 0
+            segundos = 0.0
+            fuente = spec["fuente"]
+            trozos = iterar(perfil, "leer", fuente, _read_csv_chunks(Path(spec["ruta"]), args.chunksize))
+            for chunk in trozos:
+                df, st, seg = _normalize_frame(chunk, spec, pool, args.lote, offset=filas, perfil=perfil)
+                with etapa(perfil, "postfix", fuente) as ev:
+                    df, cambios = _postfix_dates_states(df, now)
+                    ev["filas"] = len(df)
+                filas += len(df)
+                segundos += seg
+                stats.update(st)
+
+                with etapa(perfil, "exportar", fuente) as ev:
+                    _escribir_salidas(df, salidas, hilos, con_cabecera=primero)
+                    cambios.to_csv(f_log, index=False, header=primero)
+                    if args.parquet is not None:
+                        parte = next(partes)
+                        _exportar_parquet(df, args.parquet, parte)
+                        _exportar_log_parquet(cambios, POSTFIX_LOG_PARQUET, parte)
+                    ev["filas"] = len(df)
+                if indice is not None:
+                    with etapa(perfil, "duplicados", fuente) as ev:
+                        _indexar_duplicados(indice, df)
+                        ev["filas"] = len(df)
+                primero = False
+
+                total += len(df)
+                por_canal.update(_conteos(df["canal"]))
+                por_categoria.update(_conteos(df["categoria"]))
+
+            impacto[spec["fuente"]] = {k: int(stats[k]) for k in _METRICAS}
+            # Los textos distintos se cuentan por trozo (contarlos en toda la
+            # fuente obligaría a guardarlos todos): su suma va con otro nombre.
+            rendimiento[spec["fuente"]] = _rendimiento(filas, segundos, stats["textos_unicos"],
+                                                       clave_unicos="textos_unicos_por_trozo")
+
+        if primero:  # ninguna fila: al menos las cabeceras
+            _escribir_salidas(pd.DataFrame(columns=CAMPOS_FINALES), salidas, hilos)
+            pd.DataFrame(columns=POSTFIX_COLS).to_csv(f_log, index=False)
+
+    return total, por_canal, por_categoria, impacto, rendimiento
+
+
+def main(argv: Optional[List[str]] = None) -> None:
     """
     Orquesta el pipeline:
-      1) Normaliza/categoriza los CSVs.
+      1) Normaliza/categoriza los CSVs (fuentes en paralelo) o los carga de
+         la caché por fuente si no han cambiado (ver `_normalizar_con_cache`).
       2) Concatena resultados.
-      3) Aplica postfix de coherencia fechas/estado.
-      4) Exporta CSV unificado y cortes por canal.
-      5) Guarda reporte agregado con contadores de interés.
+      3) Aplica postfix de coherencia fechas/estado (y, con `--duplicados`,
+         indexa los textos para agrupar casi duplicados).
+      4) Exporta CSV unificado y cortes por canal (y, con `--parquet`, el
+         dataset Parquet particionado).
+      5) Guarda reporte agregado con contadores de interés (y, con
+         `--perfil`, tiempo/CPU/memoria por etapa y fuente).
+    Con `--stream` los pasos 1-4 se hacen por trozos (ver `_ejecutar_stream`).
     """
-    # 1) Normalización por fuente (devuelve DF + pequeñas métricas)
-    k1, st1 = _normalize_source(KAGGLE_ORIGEN1, "kaggle_1")
-    k2, st2 = _normalize_source(SINTETICO2, "sintetico_2")
-    sy, st3 = _normalize_source(SINTETICO,      "sintetico")
-
-    # 2) Unificación (mismos campos mismo orden)
-    final = pd.concat([k1, k2, sy], ignore_index=True)
-
-    # 3) Postfix de coherencia temporal
-    final = _postfix_dates_states(final)
-
-    # 4) Exportación de artefactos
+    args = _parse_args(argv)
+    fuentes = _cargar_fuentes(args.fuentes)
+    jobs = 1 if args.stream else (args.jobs or min(len(fuentes), os.cpu_count() or 1))
+    now = pd.Timestamp.now()
+    perfil = Perfil(args.perfil) if args.perfil is not None else None
+    indice = duplicados.IndiceDuplicados(args.duplicados) if args.duplicados is not None else None
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    final.to_csv(OUT_ALL, index=False, encoding="utf-8-sig", sep=";")
-    for canal, ruta in OUT_BY_CHANNEL.items():
-        final[final["canal"] == canal].to_csv(ruta, index=False, encoding="utf-8-sig", sep=";")
+
+    if args.parquet is not None:
+        shutil.rmtree(args.parquet, ignore_errors=True)  # el dataset se reescribe entero
+        shutil.rmtree(POSTFIX_LOG_PARQUET, ignore_errors=True)
+
+    if args.stream:
+        total, por_canal, por_categoria, impacto, rendimiento = _ejecutar_stream(fuentes, args, now, perfil, indice)
+        estados_cache = {spec["fuente"]: "off" for spec in fuentes}  # por trozos no hay caché
+    else:
+        # 1) Normalización por fuente (devuelve DF + pequeñas métricas).
+        # Las fuentes no comparten estado hasta el concat: se procesan a la vez.
+        # Con caché, las fuentes sin cambios se cargan en lugar de recalcularse.
+        cache_dir = None if args.sin_cache else CACHE_DIR
+        n = len(fuentes)
+        if jobs > 1 and n > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as ex:
+                resultados = list(ex.map(_procesar_fuente, fuentes, [args.workers] * n, [args.lote] * n,
+                                         [cache_dir] * n, [args.perfil] * n))
+        else:
+            resultados = [_procesar_fuente(spec, args.workers, args.lote, cache_dir, args.perfil) for spec in fuentes]
+        nombres = [spec["fuente"] for spec in fuentes]
+        if perfil is not None:
+            for _, _, _, _, eventos in resultados:
+                perfil.extender(eventos)
+
+        # 2) Unificación (mismos campos mismo orden)
+        with etapa(perfil, "unificar") as ev:
+            final = _concatenar([df for df, _, _, _, _ in resultados])
+            ev["filas"] = len(final)
+
+        # 3) Postfix de coherencia temporal
+        with etapa(perfil, "postfix") as ev:
+            final, cambios = _postfix_dates_states(final, now)
+            ev["filas"] = len(final)
+        if indice is not None:
+            with etapa(perfil, "duplicados") as ev:
+                _indexar_duplicados(indice, final)
+                ev["filas"] = len(final)
+
+        # 4) Exportación de artefactos
+        with etapa(perfil, "exportar") as ev:
+            cambios.to_csv(POSTFIX_LOG, index=False, encoding="utf-8-sig")
+            with contextlib.ExitStack() as stack:
+                hilos = stack.enter_context(ThreadPoolExecutor(max_workers=1 + len(OUT_BY_CHANNEL)))
+                _escribir_salidas(final, _abrir_salidas(stack, args.comprimir), hilos)
+            if args.parquet is not None:
+                _exportar_parquet(final, args.parquet)
+                _exportar_log_parquet(cambios, POSTFIX_LOG_PARQUET)
+            ev["filas"] = len(final)
+
+        total = len(final)
+        por_canal = Counter(_conteos(final["canal"]))
+        por_categoria = Counter(_conteos(final["categoria"]))
+        impacto = {n: st for n, (_, st, _, _, _) in zip(nombres, resultados)}
+        rendimiento = {n: r for n, (_, _, r, _, _) in zip(nombres, resultados)}
+        estados_cache = {n: e for n, (_, _, _, e, _) in zip(nombres, resultados)}
+
+    # Clusters de casi duplicados (con todos los tickets ya indexados)
+    info_duplicados = None
+    if indice is not None:
+        with etapa(perfil, "duplicados"):  # filas ya contadas al indexar
+            info_duplicados = _escribir_duplicados(indice, DUPLICADOS_CSV)
 
     # 5) Reporte de trazabilidad
     info = {
-        "total": int(len(final)),
-        "por_canal": final["canal"].value_counts(dropna=False).to_dict(),
-        "por_categoria": final["categoria"].value_counts(dropna=False).to_dict(),
-        "impacto_diccionarios": {
-            "kaggle_1":   st1,
-            "sintetico_2": st2,
-            "sintetico":  st3
+        "total": int(total),
+        "por_canal": _contar(por_canal),
+        "por_categoria": _contar(por_categoria),
+        "impacto_diccionarios": impacto,
+        "rendimiento_categorizacion": {
+            "jobs": int(jobs),
+            "workers": int(args.workers),
+            "lote": int(args.lote),
+            "stream": bool(args.stream),
+            "chunksize": int(args.chunksize) if args.stream else None,
+            "por_fuente": rendimiento,
+        },
+        "cache": {
+            "dir": str(CACHE_DIR),
+            "hits": sum(e == "hit" for e in estados_cache.values()),
+            "misses": sum(e == "miss" for e in estados_cache.values()),
+            "por_fuente": estados_cache,
         },
         "salidas": {
-            "todo": str(OUT_ALL),
-            "por_canal": {k: str(v) for k, v in OUT_BY_CHANNEL.items()},
-            "postfix_log": str(POSTFIX_LOG)
-        }
+            "todo": str(_ruta_salida(OUT_ALL, args.comprimir)),
+            "por_canal": {k: str(_ruta_salida(v, args.comprimir)) for k, v in OUT_BY_CHANNEL.items()},
+            "postfix_log": str(POSTFIX_LOG),
+            "parquet": str(args.parquet) if args.parquet is not None else None,
+            "postfix_log_parquet": str(POSTFIX_LOG_PARQUET) if args.parquet is not None else None,
+            "duplicados": str(DUPLICADOS_CSV) if indice is not None else None,
+        },
+        "duplicados": info_duplicados,
+        "perfil": None if perfil is None else {
+            "memoria": perfil.memoria,
+            "etapas": perfil.resumen(),
+            "traza": str(args.traza) if args.traza is not None else None,
+        },
     }
+    if args.traza is not None:
+        perfil.traza_chrome(args.traza)
     REPORT_PATH.write_text(json.dumps(info, indent=2, ensure_ascii=False), encoding="utf-8")
 
     # Mensajes consola
     print("[OK] Normalización + categorización + POST-FIX fechas/estado completadas.")
-    print(f"Unificado: {OUT_ALL}")
+    print(f"Unificado: {_ruta_salida(OUT_ALL, args.comprimir)}")
     print(f"Postfix log: {POSTFIX_LOG}")
     print(f"Reporte:   {REPORT_PATH}")
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+paridad_clasificador.py
+============================================================================
+
+OBJETIVO
+--------
+Comprobar que el clasificador de una sola pasada que usa `normalizar_CSVs.py`
+(`clasificador_reglas.py`: índice por primera palabra + `match` en posición)
+da lo mismo que la versión original, que buscaba cada patrón por separado
+con `re.search`. Es la única copia que queda de esa versión.
+
+La referencia reproduce la versión original tal cual: `_referencia` (el
+`_score_text` original: texto sin tildes, un `re.search` con `re.I` por
+patrón) y `_decision_referencia` (`_aplicar_reglas_contexto`: subcadenas
+sobre el texto sin tildes en minúsculas; `_decide`: máximo con desempate
+por `CAT_ORDER`).
+
+Genera textos aleatorios (con semilla) a partir de los términos de las
+reglas y de palabras sueltas, mezclando mayúsculas/minúsculas, tildes y
+marcas combinantes, separadores (espacios múltiples, tabuladores, saltos de
+línea, puntuación) y los caracteres que `re.I` iguala a letras ASCII
+(ſ -> s, İ/ı -> i, K (Kelvin) -> k). Para cada texto compara, campo a campo,
+las puntuaciones por categoría y los contadores `add_hit`/`neg_hit` con
+`_score_text`, y la categoría final, los indicadores ADD/NEG y si las reglas
+contextuales cambiaron las puntuaciones con `_categorizar` (la ruta del
+ETL). Termina con código 1 si hay alguna diferencia.
+
+Uso:
+    python etl/paridad_clasificador.py [--textos 60000] [--seed 42]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import unicodedata
+from typing import Dict, List, Tuple
+
+import normalizar_CSVs as etl
+
+
+# Piezas para los textos aleatorios
+_SEPARADORES: List[str] = [" ", " ", " ", "  ", "\t", "\n", " | ", "-", "_", "/", ".", ", ", ": ", "(", ")"]
+_RELLENO: List[str] = ["el", "la", "de", "no", "funciona", "usuario", "error", "please", "help", "urgent",
+                       "the", "my", "is", "not", "working", "hoy", "desde", "ayer", "123", "x2", "ok"]
+_PLIEGUES_RE_I: Dict[str, List[str]] = {"s": ["ſ"], "i": ["İ", "ı"], "k": ["K"]}
+_TILDES: Dict[str, List[str]] = {"a": ["á", "à", "ä"], "e": ["é", "è"], "i": ["í", "ï"], "o": ["ó", "ö"],
+                                 "u": ["ú", "ü"], "n": ["ñ"], "c": ["ç"]}
+_COMBINANTES: List[str] = ["́", "̀", "̈", "̃", "̧"]
+
+
+#------------------------------
+# REFERENCIA (versión original)
+#------------------------------
+
+def _sin_tildes(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", text or "") if unicodedata.category(c) != "Mn")
+
+
+def _normalize_for_regex(token: str) -> str:
+    t = _sin_tildes(token)
+    return re.sub(r"\s+", r"\\s+", t.strip())
+
+
+def _compilar_referencia() -> List[Tuple[str, float, Dict[str, List[re.Pattern]]]]:
+    """(tipo, peso, patrones por categoría) en el orden original: KW, ADD, NEG."""
+    return [(tipo, peso, {cat: [re.compile(rf"(?<!\w){_normalize_for_regex(tok)}(?!\w)", flags=re.I) for tok in toks]
+                          for cat, toks in dic.items()})
+            for tipo, peso, dic in (("KW", etl.W_HIT, etl.KW), ("ADD", etl.W_ADD, etl.ADD), ("NEG", etl.W_NEG, etl.NEG))]
+
+
+def _referencia(text: str, patrones: List[Tuple[str, float, Dict[str, List[re.Pattern]]]]
+                ) -> Tuple[Dict[str, float], int, int]:
+    """(scores, add_hit, neg_hit) antes de las reglas contextuales, como el `_score_text` original."""
+    t = _sin_tildes(text)
+    scores: Dict[str, float] = {c: 0.0 for c in etl.KW}
+    impactos = {"ADD": 0, "NEG": 0}
+    for tipo, peso, por_cat in patrones:
+        for cat, plist in por_cat.items():
+            for p in plist:
+                if p.search(t):
+                    scores[cat] += peso
+                    if tipo in impactos:
+                        impactos[tipo] += 1
+    return scores, impactos["ADD"], impactos["NEG"]
+
+
+def _decision_referencia(text: str, scores: Dict[str, float]) -> Tuple[str, bool]:
+    """(categoría, ajustada por reglas) como `_aplicar_reglas_contexto` + `_decide` originales."""
+    t = _sin_tildes(text).lower()
+    s = scores.copy()
+    for regla in etl.REGLAS_CONTEXTUALES:
+        if any(tok in t for tok in regla["if_any"]):
+            pref   = regla.get("prefer")
+            demote = regla.get("demote", [])
+            boost  = float(regla.get("boost", 0.0))
+            force  = bool(regla.get("force", False))
+            if pref:
+                s[pref] = s.get(pref, 0.0) + boost
+                if force:
+                    for c in s.keys():
+                        if c != pref:
+                            s[c] = min(s[c], s[pref] - 1e-6)
+            for c in demote:
+                s[c] = s.get(c, 0.0) - (boost/2.0)
+
+    mv = max(s.values()) if s else 0.0
+    cat = "SRV"
+    if mv > 0.0:
+        cands = [c for c, v in s.items() if abs(v - mv) < 1e-12]
+        cat = next((c for c in etl.CAT_ORDER if c in cands), "SRV")
+    return cat, s != scores
+
+
+#------------------------------
+# TEXTOS ALEATORIOS
+#------------------------------
+
+def _alterar(palabra: str, rng: random.Random) -> str:
+    """Mayúsculas, tildes, marcas combinantes y pliegues de `re.I` al azar, letra a letra."""
+    out = []
+    for c in palabra:
+        r = rng.random()
+        low = c.lower()
+        if r < 0.04 and low in _PLIEGUES_RE_I:
+            c = rng.choice(_PLIEGUES_RE_I[low])
+        elif r < 0.10 and low in _TILDES:
+            c = rng.choice(_TILDES[low])
+        elif r < 0.13 and c.isalpha():
+            c = c + rng.choice(_COMBINANTES)
+        if rng.random() < 0.2:
+            c = c.swapcase()
+        out.append(c)
+    return "".join(out)
+
+
+def _texto(rng: random.Random, terminos: List[str]) -> str:
+    partes = []
+    for _ in range(rng.randint(1, 12)):
+        palabra = rng.choice(terminos) if rng.random() < 0.6 else rng.choice(_RELLENO)
+        if rng.random() < 0.5:
+            palabra = _alterar(palabra, rng)
+        if rng.random() < 0.1:
+            palabra = palabra.upper()
+        partes.append(palabra)
+        partes.append(rng.choice(_SEPARADORES))
+    # Como en el ETL: resumen | descripción
+    return "".join(partes[:-1]) if rng.random() < 0.5 else f"{''.join(partes[:-1])} | {rng.choice(terminos)}"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--textos", type=int, default=60_000)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    patrones = _compilar_referencia()
+    terminos = sorted({tok for dic in (etl.KW, etl.ADD, etl.NEG) for toks in dic.values() for tok in toks}
+                      | {tok for regla in etl.REGLAS_CONTEXTUALES for tok in regla["if_any"]})
+
+    rng = random.Random(args.seed)
+    textos = [_texto(rng, terminos) for _ in range(args.textos)]
+    cats, marcas = etl._categorizar([etl._plegar(t) for t in textos])
+    col = {m: etl._METRICAS.index(m) for m in ("filas_con_add", "filas_con_neg", "filas_ajustadas_por_reglas")}
+
+    diferencias = 0
+    for i, text in enumerate(textos):
+        scores, add_hit, neg_hit = _referencia(text, patrones)
+        ref = {"scores": scores, "add_hit": add_hit, "neg_hit": neg_hit, "con_add": add_hit > 0, "con_neg": neg_hit > 0}
+        ref["categoria"], ref["reglas"] = _decision_referencia(text, scores)
+
+        n_scores, n_add, n_neg = etl._score_text(text)
+        nuevo = {"scores": n_scores, "add_hit": n_add, "neg_hit": n_neg,
+                 "con_add": bool(marcas[i, col["filas_con_add"]]), "con_neg": bool(marcas[i, col["filas_con_neg"]]),
+                 "categoria": cats[i], "reglas": bool(marcas[i, col["filas_ajustadas_por_reglas"]])}
+
+        campos = [k for k in ref if ref[k] != nuevo[k]]
+        if campos:
+            diferencias += 1
+            if diferencias <= 10:
+                print(f"DIFERENCIA {text!r}: " + "; ".join(f"{k}: referencia={ref[k]} nuevo={nuevo[k]}" for k in campos))
+
+    print(f"Textos: {len(textos):,} | diferencias: {diferencias}")
+    if diferencias:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
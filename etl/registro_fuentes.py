@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+registro_fuentes.py
+============================================================================
+
+OBJETIVO
+--------
+Rutas de entrada y registro de fuentes por defecto del ETL, sin efectos al
+importar (no crea directorios ni carga las reglas). Lo usan
+`normalizar_CSVs.py` y los scripts auxiliares que solo necesitan saber qué
+fuentes hay y cómo se llaman sus ficheros (`generar_sinteticos.py`).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List
+
+
+ROOT: Path = Path(".").resolve()
+
+# Entradas
+KAGGLE_ORIGEN1: Path = ROOT / "data" / "s2" / "dataset_kaggle_english_V2.csv"
+SINTETICO2:     Path  = ROOT / "data" / "s2" / "tickets_soporte_sintetico_2.csv"
+SINTETICO:      Path = ROOT / "data" / "s2" / "tickets_soporte_sintetico.csv"
+
+# Cada fuente se describe con:
+#   - fuente:          nombre (clave en el reporte),
+#   - ruta:            CSV de entrada (relativa a ROOT si viene de fichero),
+#   - prefijo:         prefijo del `id_ticket` final (y de los `*_GEN{n}`),
+#   - prefijos_origen: prefijos que, si ya vienen en origen, no se repiten,
+#   - mapa_canal:      (opcional) clave de `MAPAS_CANAL` para traducir el canal,
+#   - col_cierre:      (opcional) columna de origen a usar como `fecha_cierre`.
+# Con `--fuentes fichero.json` se sustituye por una lista con el mismo formato.
+FUENTES: List[dict] = [
+    {"fuente": "kaggle_1",    "ruta": KAGGLE_ORIGEN1, "prefijo": "kaggle1_",
+     "prefijos_origen": ["kaggle1_", "k1_"], "mapa_canal": "kaggle_1", "col_cierre": "resolved_at"},
+    {"fuente": "sintetico_2", "ruta": SINTETICO2,     "prefijo": "synt2_",
+     "prefijos_origen": ["synt2_", "synt3_", "synt_"]},
+    {"fuente": "sintetico",   "ruta": SINTETICO,      "prefijo": "synt_",
+     "prefijos_origen": ["synt_", "synt2_", "synt3_"]},
+]
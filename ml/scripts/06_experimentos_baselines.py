@@ -19,17 +19,16 @@ Salida: resultados/experimentos/YYYYMMDD_HHMMSS_baselines/
 Reproducibilidad: fijado random_state=42 en los componentes que lo permiten.
 
 """
-import json, os, sys, time, warnings
+import argparse, json, os, sys, time, warnings
 from pathlib import Path
 import numpy as np
 import pandas as pd
 from joblib import dump
 
 from sklearn.metrics import classification_report, confusion_matrix, f1_score
-from sklearn.model_selection import StratifiedKFold, GridSearchCV
+from sklearn.model_selection import StratifiedKFold
 from sklearn.preprocessing import OneHotEncoder, LabelEncoder
 from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.linear_model import LogisticRegression
@@ -46,6 +45,34 @@ RANDOM_STATE = 42
 N_JOBS = -1
 CV_FOLDS = 5
 
+# Rango de C para la búsqueda por ruta (`--ruta-c N`), en escala logarítmica
+RUTA_C_MIN = 0.01
+RUTA_C_MAX = 100.0
+
+# Grid del TF-IDF para `--halving` (se combina con el grid de cada modelo)
+GRID_TEXTO = {
+    "pre__tfidf__ngram_range": [(1, 1), (1, 2), (1, 3)],
+    "pre__tfidf__min_df": [1, 2, 3],
+    "pre__tfidf__max_df": [0.8, 0.9, 1.0],
+    "pre__tfidf__sublinear_tf": [False, True],
+}
+
+ap = argparse.ArgumentParser(description="E1/E2: baselines TF-IDF (NB, LogReg, LinearSVC)")
+modo = ap.add_mutually_exclusive_group()
+modo.add_argument("--ruta-c", type=int, default=0, metavar="N",
+                  help="LogReg y SVM: N valores de C con ruta de regularización en caliente "
+                       "en vez del grid de MODELOS")
+modo.add_argument("--halving", action="store_true",
+                  help="Successive halving sobre GRID_TEXTO x grid de cada modelo")
+ap.add_argument("--factor", type=int, default=3, help="--halving: fracción de candidatos que pasa de ronda (1/factor)")
+ap.add_argument("--presupuesto", type=float, default=None,
+                help="--halving: coste máximo por modelo en ajustes equivalentes sobre el train completo")
+ap.add_argument("--presupuesto-s", type=float, default=None,
+                help="--halving: tiempo máximo por modelo en segundos")
+ap.add_argument("--sin-cache", action="store_true",
+                help="No usa ni actualiza la caché de evaluaciones (data/cache/experimentos)")
+ARGS = ap.parse_args()
+
 ROOT = Path(__file__).resolve().parents[2]
 DATA_ML = ROOT / "data" / "ml"
 RESULTS_ROOT = ROOT / "Resultados" / "experimentos"
@@ -55,6 +82,15 @@ RUN_DIR.mkdir(parents=True, exist_ok=True)
 TRAIN_CSV = DATA_ML / "train.csv"
 VALID_CSV = DATA_ML / "valid.csv"
 
+# Capa de lectura común con el ETL (etl/lectura_csv.py)
+sys.path.insert(0, str(ROOT / "etl"))
+from lectura_csv import leer_csv
+MANIFIESTO_CSV = ROOT / "logs" / "csv_dialectos.json"
+
+# Búsqueda con matrices TF-IDF por pliegue (ml/scripts/busqueda_cv.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from busqueda_cv import CacheResultados, MatricesCV, buscar_grid, buscar_halving, buscar_ruta, escribir_cv_results
+
 #-----------
 # Utilidades
 #-----------
@@ -62,22 +98,16 @@ def read_any_csv(path: Path) -> pd.DataFrame:
     """
     Lee un CSV exportado desde MySQL Workbench detectando separador/encoding.
     Prueba UTF-8 con/sin BOM y ;/, y si falla, usa sep=None (engine='python').
+    La detección la hace `etl/lectura_csv.py` y el dialecto queda en el
+    manifiesto `logs/csv_dialectos.json` (no se repite mientras el CSV no cambie).
     """
-    tried = []
-    for enc in ("utf-8-sig", "utf-8"):
-        for sep in (";", ","):
-            try:
-                df = pd.read_csv(path, sep=sep, encoding=enc)
-                if df.shape[1] == 1:
-                    tried.append((enc, sep, "1col"))
-                    continue
-                return df
-            except Exception as e:
-                tried.append((enc, sep, str(e)))
-                continue
-    # último intento autodetección
-    df = pd.read_csv(path, sep=None, engine="python", encoding="utf-8-sig")
-    return df
+    try:
+        return leer_csv(path, MANIFIESTO_CSV, validar=lambda df: df.shape[1] > 1,
+                        encodings=("utf-8-sig", "utf-8"), seps=(";", ","), motores=("c",),
+                        sniff=False, sep_auto=False)
+    except RuntimeError:
+        # último intento autodetección
+        return pd.read_csv(path, sep=None, engine="python", encoding="utf-8-sig")
 
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -171,22 +201,67 @@ MODELOS = {
     ),
 }
 
+#---- CAMBIO: TF-IDF una vez por pliegue y bloque ----
+# Antes cada `GridSearchCV(Pipeline(pre, clf))` reajustaba el preprocesador
+# para cada candidato de cada pliegue (45 ajustes idénticos por bloque). Ahora
+# `MatricesCV` lo ajusta una vez por pliegue y una sobre el train completo, y
+# `buscar_grid` prueba todos los modelos y valores del grid sobre esas
+# matrices. Mismos pliegues, clones y scorer: mismos `best_params_`, F1 y
+# `model.joblib` (Pipeline pre + clf) que con `GridSearchCV`.
+#-----------------------------------------------------
+
+#---- CAMBIO: matrices compartidas entre workers ----
+# Las matrices de cada pliegue se guardan una vez en ficheros mapeados en
+# memoria y los workers de `N_JOBS` las abren sin copiarlas (ver
+# `busqueda_cv.py`): la memoria no crece con el número de núcleos.
+#-----------------------------------------------------
+
+#---- CAMBIO: ruta de C con arranque en caliente (`--ruta-c N`) ----
+# LogReg y SVM recorren N valores de C (escala log entre RUTA_C_MIN y
+# RUTA_C_MAX) en orden creciente, cada ajuste desde los coeficientes del
+# anterior (`buscar_ruta`). La F1-macro de cada C en cada pliegue queda en
+# `ruta_C.csv`; el modelo final se reajusta en frío con el mejor C.
+#--------------------------------------------------------------------
+RUTA_C = np.logspace(np.log10(RUTA_C_MIN), np.log10(RUTA_C_MAX), ARGS.ruta_c).tolist() if ARGS.ruta_c else []
+
+#---- CAMBIO: successive halving con presupuesto (`--halving`) ----
+# Con `--halving` cada modelo busca sobre GRID_TEXTO x su grid (cientos de
+# candidatos) por rondas (`buscar_halving`): las primeras con submuestras del
+# train y solo los mejores pasan a la siguiente, hasta el train completo.
+# `--presupuesto` (ajustes equivalentes) y `--presupuesto-s` (segundos)
+# limitan el coste. Mismos `metrics.json` y `model.joblib`; además
+# `rondas.json` (traza por ronda) y `halving_cv_results.csv`.
+#--------------------------------------------------------------------
+
+#---- CAMBIO: caché de evaluaciones direccionada por contenido ----
+# Cada evaluación (datos del train y pliegue, preprocesador, modelo con sus
+# parámetros, scorer) y cada modelo final se guardan en
+# `data/cache/experimentos/` (ver `CacheResultados` en busqueda_cv.py). Al
+# repetir o reanudar una ejecución interrumpida solo se ajusta lo que falta:
+# un modelo o valor nuevo del grid cuesta solo sus ajustes y, si no falta
+# nada, ni siquiera se vectoriza. Las salidas son las mismas que sin caché.
+# Con `--sin-cache` se recalcula todo sin leer ni escribir la caché.
+#-------------------------------------------------------------------
+CACHE = None if ARGS.sin_cache else CacheResultados(ROOT / "data" / "cache" / "experimentos")
+
 def run_block(name, X_train, y_train, X_valid, y_valid, with_meta):
     pre = make_preprocessor(with_meta)
     resultados = {}
 
+    skf = StratifiedKFold(n_splits=CV_FOLDS, shuffle=True, random_state=RANDOM_STATE)
+    # En halving las matrices dependen de cada candidato y de la ronda
+    matrices = None if ARGS.halving else MatricesCV(pre, X_train, y_train, skf, n_jobs=N_JOBS, nombre_pre="pre")
+
     for key, (est, grid) in MODELOS.items():
-        pipe = Pipeline(steps=[("pre", pre), ("clf", est)])
-        skf = StratifiedKFold(n_splits=CV_FOLDS, shuffle=True, random_state=RANDOM_STATE)
-        gscv = GridSearchCV(
-            pipe,
-            param_grid=grid,
-            cv=skf,
-            scoring="f1_macro",
-            n_jobs=N_JOBS,
-            verbose=0,
-        )
-        gscv.fit(X_train, y_train)
+        if ARGS.halving:
+            gscv = buscar_halving(est, pre, {**GRID_TEXTO, **grid}, X_train, y_train, skf,
+                                  nombre_pre="pre", scoring="f1_macro", factor=ARGS.factor,
+                                  presupuesto=ARGS.presupuesto, presupuesto_s=ARGS.presupuesto_s,
+                                  random_state=RANDOM_STATE, n_jobs=N_JOBS, cache=CACHE)
+        elif ARGS.ruta_c and key in ("logreg", "svm"):
+            gscv = buscar_ruta(est, {"clf__C": RUTA_C}, matrices, scoring="f1_macro", n_jobs=N_JOBS, cache=CACHE)
+        else:
+            gscv = buscar_grid(est, grid, matrices, scoring="f1_macro", n_jobs=N_JOBS, cache=CACHE)
 
         best = gscv.best_estimator_
         y_pred = best.predict(X_valid)
@@ -199,6 +274,12 @@ def run_block(name, X_train, y_train, X_valid, y_valid, with_meta):
         out_dir = RUN_DIR / f"{name}_{key}"
         out_dir.mkdir(exist_ok=True, parents=True)
         dump(best, out_dir / "model.joblib")
+        if ARGS.ruta_c and key in ("logreg", "svm"):
+            escribir_cv_results(gscv, out_dir / "ruta_C.csv")
+        if ARGS.halving:
+            escribir_cv_results(gscv, out_dir / "halving_cv_results.csv")
+            with open(out_dir / "rondas.json", "w", encoding="utf-8") as f:
+                json.dump(gscv.rondas_, f, ensure_ascii=False, indent=2)
 
         pred_df = pd.DataFrame({
             "id_ticket": valid["id_ticket"].values,
@@ -242,6 +323,10 @@ def run_block(name, X_train, y_train, X_valid, y_valid, with_meta):
             "cm_path": str(out_dir / "confusion_matrix.png"),
         }
 
+    # Borra las matrices mapeadas del bloque (directorio temporal)
+    if matrices is not None:
+        matrices.cerrar()
+
     with open(RUN_DIR / f"{name}_summary.json", "w", encoding="utf-8") as f:
         json.dump(resultados, f, ensure_ascii=False, indent=2)
 
@@ -254,4 +339,6 @@ Xva = valid[["texto", "canal", "prioridad"]]
 run_block("E1_texto", Xtr[["texto"]], y_train, Xva[["texto"]], y_valid, with_meta=False)
 run_block("E2_texto_meta", Xtr, y_train, Xva, y_valid, with_meta=True)
 
-print(f"Resultados en: {RUN_DIR}")
\ No newline at end of file
+print(f"Resultados en: {RUN_DIR}")
+if CACHE is not None:
+    print("Caché:", CACHE.resumen())
\ No newline at end of file
@@ -13,7 +13,9 @@ Métrica de selección: F1-macro (validación cruzada estratificada en Train)
 Salida: resultados/experimentos/YYYYMMDD_HHMMSS_E2_meta/
 """
 
+import argparse
 import json
+import sys
 import warnings
 from pathlib import Path
 from datetime import datetime
@@ -22,11 +24,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
-from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import OneHotEncoder
-from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, f1_score
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.linear_model import LogisticRegression
@@ -43,6 +44,42 @@ DATA = BASE / "data" / "ml"
 TRAIN_CSV = DATA / "train.csv"
 VALID_CSV = DATA / "valid.csv"
 
+# Capa de lectura común con el ETL (etl/lectura_csv.py)
+sys.path.insert(0, str(BASE / "etl"))
+from lectura_csv import leer_csv
+MANIFIESTO_CSV = BASE / "logs" / "csv_dialectos.json"
+
+# Búsqueda con matrices TF-IDF por pliegue (ml/scripts/busqueda_cv.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from busqueda_cv import CacheResultados, MatricesCV, buscar_grid, buscar_halving, buscar_ruta, escribir_cv_results
+
+# Búsqueda de C por ruta con arranque en caliente (`--ruta-c N`)
+RUTA_C_MIN = 0.01
+RUTA_C_MAX = 100.0
+# Grid del TF-IDF para `--halving` (se combina con el grid de cada modelo)
+GRID_TEXTO = {
+    "prep__text__ngram_range": [(1, 1), (1, 2), (1, 3)],
+    "prep__text__min_df": [1, 2, 3],
+    "prep__text__max_df": [0.8, 0.9, 1.0],
+    "prep__text__sublinear_tf": [False, True],
+}
+ap = argparse.ArgumentParser(description="E2: texto (TF-IDF) + metadatos")
+modo = ap.add_mutually_exclusive_group()
+modo.add_argument("--ruta-c", type=int, default=0, metavar="N",
+                  help="LR y SVM: N valores de C con ruta de regularización en caliente "
+                       "en vez del grid de models")
+modo.add_argument("--halving", action="store_true",
+                  help="Successive halving sobre GRID_TEXTO x grid de cada modelo")
+ap.add_argument("--factor", type=int, default=3, help="--halving: fracción de candidatos que pasa de ronda (1/factor)")
+ap.add_argument("--presupuesto", type=float, default=None,
+                help="--halving: coste máximo por modelo en ajustes equivalentes sobre el train completo")
+ap.add_argument("--presupuesto-s", type=float, default=None,
+                help="--halving: tiempo máximo por modelo en segundos")
+ap.add_argument("--sin-cache", action="store_true",
+                help="No usa ni actualiza la caché de evaluaciones (data/cache/experimentos)")
+ARGS = ap.parse_args()
+RUTA_C = np.logspace(np.log10(RUTA_C_MIN), np.log10(RUTA_C_MAX), ARGS.ruta_c).tolist() if ARGS.ruta_c else []
+
 STAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
 OUT = BASE / "resultados" / "experimentos" / f"{STAMP}_E2_meta"
 OUT.mkdir(parents=True, exist_ok=True)
@@ -50,52 +87,30 @@ OUT.mkdir(parents=True, exist_ok=True)
 # Lectura CSV 
 def read_csv_robusto(path: Path) -> pd.DataFrame:
     """Intenta sep autodetectado; sin perder filas.
-       Solo como ÚLTIMO recurso, on_bad_lines='skip' (avisando)."""
+       Solo como ÚLTIMO recurso, on_bad_lines='skip' (avisando).
+       La detección la hace etl/lectura_csv.py (motor C primero y dialecto
+       guardado en logs/csv_dialectos.json)."""
     if not path.exists():
         raise FileNotFoundError(f"No existe el fichero: {path}")
 
-    # 1) Autodetección de separador y lectura estricta
+    opciones = dict(quotechar='"', escapechar="\\")
+
+    # 1) Lectura estricta: separador del sniff, ';' y ',' y, como antes,
+    #    `sep=None` (autodetección de pandas) antes de saltar filas
+    #    (si la autodetección fallara, df tendría 1 sola columna)
     try:
-        df = pd.read_csv(
-            path,
-            sep=None, 
-            engine="python",
-            encoding="utf-8-sig",
-            quotechar='"',
-            escapechar="\\",
-            on_bad_lines="error"
-        )
-        # Si la autodetección fallara, df tendría 1 sola columna
-        if df.shape[1] == 1:
-            raise ValueError("Autodetección de separador fallida (1 columna).")
-        return df
-    except Exception:
-        # 2) Reintento manual con ';' y luego con ','
-        for sep in (";", ","):
-            try:
-                df = pd.read_csv(
-                    path,
-                    sep=sep,
-                    engine="python",
-                    encoding="utf-8-sig",
-                    quotechar='"',
-                    escapechar="\\",
-                    on_bad_lines="error"
-                )
-                if df.shape[1] > 1:
-                    return df
-            except Exception:
-                pass
-
-        # 3) Último recurso: saltar líneas conflictivas
+        return leer_csv(path, MANIFIESTO_CSV, validar=lambda df: df.shape[1] > 1,
+                        encodings=("utf-8-sig",), seps=(";", ","), sep_auto=True,
+                        on_bad_lines="error", **opciones)
+    except RuntimeError:
+        # 2) Último recurso: saltar líneas conflictivas
         df = pd.read_csv(
             path,
             sep=None,
             engine="python",
             encoding="utf-8-sig",
-            quotechar='"',
-            escapechar="\\",
-            on_bad_lines="skip"
+            on_bad_lines="skip",
+            **opciones
         )
         print(f"[AVISO] Se han omitido filas problemáticas al leer {path.name}. "
               f"Filas finales: {len(df)}")
@@ -173,18 +188,49 @@ models = {
 
 cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
 
+#---- CAMBIO: TF-IDF una vez por pliegue ----
+# El preprocesador se ajusta una vez por pliegue y una sobre el train completo
+# (`MatricesCV`) y las matrices se reutilizan para los tres modelos y todos
+# los valores del grid (`buscar_grid`), en vez de reajustarlo en cada
+# candidato de `GridSearchCV`. Mismos pliegues y scorer: mismos resultados.
+#---------------------------------------------
+
+#---- CAMBIO: matrices compartidas entre workers ----
+# Las matrices se guardan una vez en ficheros mapeados en memoria y los
+# workers las abren sin copiarlas: la memoria no crece con `n_jobs`.
+#-----------------------------------------------------
+
+#---- CAMBIO: ruta de C con arranque en caliente (`--ruta-c N`) ----
+# LR y SVM recorren N valores de C en orden creciente, cada ajuste desde el
+# anterior (`buscar_ruta`), y escriben la F1 por pliegue en `ruta_C.csv`.
+#--------------------------------------------------------------------
+
+#---- CAMBIO: successive halving con presupuesto (`--halving`) ----
+# Cada modelo busca sobre GRID_TEXTO x su grid por rondas (`buscar_halving`):
+# submuestras crecientes del train y solo los mejores pasan de ronda.
+# `--presupuesto`/`--presupuesto-s` limitan el coste; la traza por ronda va
+# a `rondas.json` y los resultados por candidato a `halving_cv_results.csv`.
+#--------------------------------------------------------------------
+
+#---- CAMBIO: caché de evaluaciones direccionada por contenido ----
+# La misma caché que 06 (`data/cache/experimentos/`, `CacheResultados`):
+# al repetir o reanudar solo se evalúa lo que falta; `--sin-cache` la desactiva.
+#-------------------------------------------------------------------
+CACHE = None if ARGS.sin_cache else CacheResultados(BASE / "data" / "cache" / "experimentos")
+# En halving las matrices dependen de cada candidato y de la ronda
+matrices = None if ARGS.halving else MatricesCV(preprocess, X_train, y_train, cv, n_jobs=-1, nombre_pre="prep")
+
 def run_model(key, est, grid):
-    pipe = Pipeline(steps=[("prep", preprocess), ("clf", est)])
-    gs = GridSearchCV(
-        estimator=pipe,
-        param_grid=grid,
-        scoring="f1_macro",
-        n_jobs=-1,
-        cv=cv,
-        refit=True,
-        verbose=0
-    )
-    gs.fit(X_train, y_train)
+    ruta = bool(ARGS.ruta_c) and key in ("lr", "svm")
+    if ARGS.halving:
+        gs = buscar_halving(est, preprocess, {**GRID_TEXTO, **grid}, X_train, y_train, cv,
+                            nombre_pre="prep", scoring="f1_macro", factor=ARGS.factor,
+                            presupuesto=ARGS.presupuesto, presupuesto_s=ARGS.presupuesto_s,
+                            random_state=42, n_jobs=-1, cache=CACHE)
+    elif ruta:
+        gs = buscar_ruta(est, {"clf__C": RUTA_C}, matrices, scoring="f1_macro", n_jobs=-1, cache=CACHE)
+    else:
+        gs = buscar_grid(est, grid, matrices, scoring="f1_macro", n_jobs=-1, cache=CACHE)
 
     # Validación
     y_pred = gs.predict(X_valid)
@@ -197,6 +243,13 @@ def run_model(key, est, grid):
     subdir.mkdir(exist_ok=True, parents=True)
     with open(subdir / "best_params.json", "w", encoding="utf-8") as f:
         json.dump(gs.best_params_, f, ensure_ascii=False, indent=2)
+    if ruta:
+        # F1-macro por pliegue a lo largo de la ruta de C
+        escribir_cv_results(gs, subdir / "ruta_C.csv")
+    if ARGS.halving:
+        escribir_cv_results(gs, subdir / "halving_cv_results.csv")
+        with open(subdir / "rondas.json", "w", encoding="utf-8") as f:
+            json.dump(gs.rondas_, f, ensure_ascii=False, indent=2)
     with open(subdir / "classification_report.txt", "w", encoding="utf-8") as f:
         f.write(rep_txt)
         f.write(f"\n\naccuracy={acc:.4f}  f1_macro={f1m:.4f}\n")
@@ -227,6 +280,8 @@ def run_model(key, est, grid):
     }
 
 resumen = [run_model(k, spec["estimator"], spec["param_grid"]) for k, spec in models.items()]
+if matrices is not None:
+    matrices.cerrar()
 
 # Guardar resumen
 df_res = pd.DataFrame(resumen).sort_values("f1_macro_valid", ascending=False)
@@ -235,4 +290,6 @@ with open(OUT / "E2_resumen_modelos.txt", "w", encoding="utf-8") as f:
     f.write(df_res.to_string(index=False))
 
 print("Filas TRAIN:", len(train), " | Filas VALID:", len(valid))
-print("Resultados en:", OUT)
\ No newline at end of file
+print("Resultados en:", OUT)
+if CACHE is not None:
+    print("Caché:", CACHE.resumen())
\ No newline at end of file
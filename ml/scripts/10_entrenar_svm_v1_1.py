@@ -1,5 +1,6 @@
 from pathlib import Path
 import json
+import sys
 
 import numpy as np
 import pandas as pd
@@ -26,6 +27,11 @@ MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
 RANDOM_STATE = 42
 
+# Capa de lectura común con el ETL (etl/lectura_csv.py)
+sys.path.insert(0, str(ROOT / "etl"))
+from lectura_csv import leer_csv
+MANIFIESTO_CSV = ROOT / "logs" / "csv_dialectos.json"
+
 #------------
 # Utilidades
 #------------
@@ -64,24 +70,15 @@ def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
 def read_any_csv(path: Path) -> pd.DataFrame:
     """
     Lee un CSV exportado desde MySQL Workbench detectando separador/encoding.
-    Misma lógica que 06_experimentos_baselines.py.
+    Misma lógica que 06_experimentos_baselines.py (vía etl/lectura_csv.py).
     """
-    tried = []
-    for enc in ("utf-8-sig", "utf-8"):
-        for sep in (";", ","):
-            try:
-                df = pd.read_csv(path, sep=sep, encoding=enc)
-                if df.shape[1] == 1:
-                    tried.append((enc, sep, "1col"))
-                    continue
-                return df
-            except Exception as e:
-                tried.append((enc, sep, str(e)))
-                continue
-
-    # Último intento: autodetección de separador
-    df = pd.read_csv(path, sep=None, engine="python", encoding="utf-8-sig")
-    return df
+    try:
+        return leer_csv(path, MANIFIESTO_CSV, validar=lambda df: df.shape[1] > 1,
+                        encodings=("utf-8-sig", "utf-8"), seps=(";", ","), motores=("c",),
+                        sniff=False, sep_auto=False)
+    except RuntimeError:
+        # Último intento: autodetección de separador
+        return pd.read_csv(path, sep=None, engine="python", encoding="utf-8-sig")
 
 
 def read_ml_csv(path: Path) -> pd.DataFrame:
@@ -0,0 +1,879 @@
+#----------------
+# busqueda_cv.py
+#----------------
+"""
+Búsqueda de hiperparámetros con validación cruzada reutilizando las matrices
+de características de cada pliegue (común a 06_experimentos_baselines.py y
+07_experimentos_E2_meta.py).
+
+Con `GridSearchCV` sobre `Pipeline(pre, clf)` el preprocesador (TF-IDF con
+bigramas y `strip_accents="unicode"`, más el one-hot de metadatos en E2) se
+reajusta para cada candidato de cada pliegue aunque solo cambie `clf__alpha`
+o `clf__C`: 3 candidatos x 5 pliegues x 3 modelos = 45 ajustes idénticos por
+bloque. Aquí:
+
+1) `MatricesCV` ajusta el preprocesador una vez por pliegue (sobre el train
+   del pliegue) y una vez sobre el train completo, y guarda las matrices
+   dispersas transformadas.
+2) `buscar_grid` evalúa todos los candidatos de un clasificador sobre esas
+   matrices (en paralelo por candidato x pliegue con joblib, como
+   `GridSearchCV`) y reajusta el mejor sobre el train completo. Las mismas
+   matrices sirven para todos los clasificadores del bloque.
+3) Las matrices no viajan a los workers: cada pliegue se escribe una vez en
+   ficheros `.npy` (`data`/`indices`/`indptr` de la CSR) en un directorio
+   temporal (en `/dev/shm` si existe) y las tareas reciben solo una
+   referencia (`MatrizMapeada`). Cada worker abre los ficheros con
+   `np.load(mmap_mode="r")` y ajusta el clasificador sobre la CSR construida
+   sin copia encima de esos buffers: las páginas las comparte el sistema
+   entre todos los procesos, así que la memoria de las matrices no crece con
+   el número de workers.
+
+Resultados idénticos a `GridSearchCV`: mismos pliegues (`cv.split`), mismos
+clones del preprocesador y del clasificador, mismo scorer (`check_scoring`),
+media sin ponderar de los pliegues y, en caso de empate, el primer candidato
+del grid. El mejor modelo se devuelve como `Pipeline` ajustado (preprocesador
+del train completo + clasificador), igual que `best_estimator_`, así que el
+`model.joblib` y los scripts de inferencia no cambian.
+
+Con `CacheResultados` cada evaluación (datos + pliegue, preprocesador,
+clasificador con sus parámetros, scorer) y cada modelo final se guardan en
+disco direccionados por contenido: al repetir o reanudar un experimento solo
+se ajusta lo que falta (ver la sección "Caché de resultados").
+"""
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+from sklearn.utils import _safe_indexing
+
+# Nombre del paso del clasificador en los grids (`clf__C`, `clf__alpha`).
+PASO_CLF = "clf"
+
+# Buffers de una CSR que se guardan como `.npy` separados.
+_PARTES_CSR: Tuple[str, ...] = ("data", "indices", "indptr")
+
+
+class MatrizMapeada:
+    """
+    Referencia ligera (se serializa en unos bytes) a una matriz guardada en
+    `directorio`: CSR en tres `.npy` (`data`, `indices`, `indptr`) o densa en uno.
+    """
+    __slots__ = ("directorio", "nombre", "shape", "dispersa")
+
+    def __init__(self, directorio: str, nombre: str, shape: Tuple[int, int], dispersa: bool):
+        self.directorio = directorio
+        self.nombre = nombre
+        self.shape = shape
+        self.dispersa = dispersa
+
+    def __getstate__(self):
+        return (self.directorio, self.nombre, self.shape, self.dispersa)
+
+    def __setstate__(self, estado):
+        self.directorio, self.nombre, self.shape, self.dispersa = estado
+
+    def abrir(self):
+        """Matriz sobre los ficheros mapeados en memoria (sin copiar)."""
+        return _abrir(self)
+
+
+def _guardar(m, directorio: str, nombre: str) -> MatrizMapeada:
+    """Escribe la matriz en `directorio` y devuelve su referencia."""
+    base = Path(directorio) / nombre
+    if sp.issparse(m):
+        m = m.tocsr()
+        # Índices ordenados: los estimadores no intentan reordenarlos (los buffers son de solo lectura)
+        m.sort_indices()
+        for parte in _PARTES_CSR:
+            np.save(f"{base}.{parte}.npy", getattr(m, parte))
+        return MatrizMapeada(directorio, nombre, m.shape, True)
+    m = np.ascontiguousarray(m)
+    np.save(f"{base}.npy", m)
+    return MatrizMapeada(directorio, nombre, m.shape, False)
+
+
+# Matrices abiertas en este proceso: {(directorio, nombre): matriz}. Solo se
+# mantienen las del directorio en uso, así que un worker que pasa al
+# siguiente bloque suelta los mapeos del anterior.
+_ABIERTAS: Dict[Tuple[str, str], object] = {}
+
+
+def _abrir(ref: MatrizMapeada):
+    """Abre (una vez por proceso) la matriz de `ref` con `np.load(mmap_mode="r")`."""
+    clave = (ref.directorio, ref.nombre)
+    m = _ABIERTAS.get(clave)
+    if m is None:
+        for otra in [k for k in _ABIERTAS if k[0] != ref.directorio]:
+            del _ABIERTAS[otra]
+        base = Path(ref.directorio) / ref.nombre
+        if ref.dispersa:
+            data, indices, indptr = (np.load(f"{base}.{parte}.npy", mmap_mode="r") for parte in _PARTES_CSR)
+            m = sp.csr_matrix((data, indices, indptr), shape=ref.shape, copy=False)
+        else:
+            m = np.load(f"{base}.npy", mmap_mode="r")
+        _ABIERTAS[clave] = m
+    return m
+
+
+def _directorio_temporal() -> Path:
+    """Directorio para las matrices: en memoria (`/dev/shm`) si está disponible."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+    return Path(tempfile.mkdtemp(prefix="busqueda_cv_", dir=base))
+
+
+def _ajustar_pliegue(preprocesador, X, y, train_idx, test_idx, directorio: str, i: int):
+    """Ajusta un clon del preprocesador en el train del pliegue, transforma ambas partes y las guarda."""
+    pre = clone(preprocesador)
+    X_tr = pre.fit_transform(_safe_indexing(X, train_idx), _safe_indexing(y, train_idx))
+    X_te = pre.transform(_safe_indexing(X, test_idx))
+    return _guardar(X_tr, directorio, f"p{i}_train"), _guardar(X_te, directorio, f"p{i}_test")
+
+
+def _ajustar_completo(preprocesador, X, y, directorio: str):
+    """Ajusta un clon del preprocesador sobre todo el train (para el reajuste final)."""
+    pre = clone(preprocesador)
+    return pre, _guardar(pre.fit_transform(X, y), directorio, "completo")
+
+
+class MatricesCV:
+    """
+    Matrices de características de cada pliegue y del train completo para un
+    preprocesador y un esquema de validación cruzada, guardadas en
+    `directorio` (temporal por defecto) y abiertas como mapeos de solo lectura.
+
+    - `refs`: lista de (ref_train, ref_test, y_train, y_test) por pliegue; es
+      lo que reciben los workers.
+    - `pliegues`: las mismas matrices ya abiertas en este proceso.
+    - `preprocesador` / `X`: preprocesador ajustado sobre todo el train y su salida.
+    - `tiempo_vectorizar`: segundos empleados en ajustar, transformar y guardar.
+    - `huellas` / `huella_completo`: claves de contenido de cada pliegue y del
+      train completo (datos, partición y preprocesador) para `CacheResultados`.
+
+    La vectorización se hace la primera vez que se piden las matrices: si
+    todas las evaluaciones están en la caché no se vectoriza nada.
+
+    Se usa como contexto (`with MatricesCV(...) as matrices:`) o con
+    `cerrar()`; el directorio temporal se borra al cerrar o al liberar el objeto.
+    """
+
+    def __init__(self, preprocesador, X, y, cv, n_jobs: Optional[int] = None,
+                 nombre_pre: str = "pre", directorio: Optional[Path] = None,
+                 huella_datos: Optional[str] = None):
+        self.nombre_pre = nombre_pre
+        self.y = y
+        self._pre_base = preprocesador
+        self._datos = X
+        self._n_jobs = n_jobs
+        self._directorio = directorio
+        self._huella_datos = huella_datos
+        self._huellas: Optional[List[str]] = None
+        self._refs: Optional[List[Tuple]] = None
+        self._borrar = None
+        self.splits = list(cv.split(X, y))
+        self.tiempo_vectorizar = 0.0
+
+    def _vectorizar(self) -> None:
+        """Ajusta el preprocesador por pliegue y en el train completo (una sola vez)."""
+        if self._refs is not None:
+            return
+        t0 = time.perf_counter()
+        if self._directorio is None:
+            self.directorio = _directorio_temporal()
+            self._borrar = weakref.finalize(self, shutil.rmtree, str(self.directorio), True)
+        else:
+            self.directorio = Path(self._directorio)
+            self.directorio.mkdir(parents=True, exist_ok=True)
+        dir_str = str(self.directorio)
+
+        X, y = self._datos, self.y
+        tareas = [delayed(_ajustar_pliegue)(self._pre_base, X, y, tr, te, dir_str, i)
+                  for i, (tr, te) in enumerate(self.splits)]
+        tareas.append(delayed(_ajustar_completo)(self._pre_base, X, y, dir_str))
+        *refs, (self._preprocesador, self._ref_X) = Parallel(n_jobs=self._n_jobs)(tareas)
+        self._refs = [
+            (ref_tr, ref_te, _safe_indexing(y, tr), _safe_indexing(y, te))
+            for (ref_tr, ref_te), (tr, te) in zip(refs, self.splits)]
+        self.tiempo_vectorizar = time.perf_counter() - t0
+
+    @property
+    def refs(self) -> List[Tuple]:
+        self._vectorizar()
+        return self._refs
+
+    @property
+    def preprocesador(self):
+        self._vectorizar()
+        return self._preprocesador
+
+    @property
+    def n_pliegues(self) -> int:
+        return len(self.splits)
+
+    def _calcular_huellas(self) -> List[str]:
+        """Hash de (datos, preprocesador, partición) por pliegue y, al final, del train completo."""
+        if self._huellas is None:
+            datos = self._huella_datos or joblib.hash((self._datos, self.y))
+            pre = joblib.hash(clone(self._pre_base))
+            self._huellas = [joblib.hash((datos, pre, tr, te)) for tr, te in self.splits]
+            self._huellas.append(joblib.hash((datos, pre)))
+        return self._huellas
+
+    @property
+    def huellas(self) -> List[str]:
+        return self._calcular_huellas()[:-1]
+
+    @property
+    def huella_completo(self) -> str:
+        return self._calcular_huellas()[-1]
+
+    @property
+    def pliegues(self) -> List[Tuple]:
+        return [(r_tr.abrir(), r_te.abrir(), y_tr, y_te) for r_tr, r_te, y_tr, y_te in self.refs]
+
+    @property
+    def X(self):
+        self._vectorizar()
+        return self._ref_X.abrir()
+
+    def cerrar(self) -> None:
+        """Suelta los mapeos de este proceso y borra el directorio temporal."""
+        if self._refs is None:
+            return
+        for clave in [k for k in _ABIERTAS if k[0] == str(self.directorio)]:
+            del _ABIERTAS[clave]
+        if self._borrar is not None:
+            self._borrar()
+
+    def __enter__(self) -> "MatricesCV":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
+
+
+def _params_clf(params: Dict) -> Dict:
+    """`{"clf__C": 1.0}` -> `{"C": 1.0}`; el grid solo puede tocar el clasificador."""
+    prefijo = PASO_CLF + "__"
+    fuera = [k for k in params if not k.startswith(prefijo)]
+    if fuera:
+        raise ValueError(f"Parámetros fuera de '{PASO_CLF}' no admitidos con matrices cacheadas: {fuera}")
+    return {k[len(prefijo):]: v for k, v in params.items()}
+
+
+def _evaluar(estimador, params: Dict, ref_tr: MatrizMapeada, ref_te: MatrizMapeada,
+             y_tr, y_te, scoring, cache: Optional["CacheResultados"] = None,
+             clave: Optional[str] = None) -> Tuple[float, float]:
+    """
+    Ajusta un clon con `params` en el pliegue y devuelve (score, segundos de
+    ajuste). Con `cache` el resultado se guarda en cuanto termina (en el worker).
+    """
+    X_tr, X_te = ref_tr.abrir(), ref_te.abrir()
+    clf = clone(estimador).set_params(**_params_clf(params))
+    t0 = time.perf_counter()
+    clf.fit(X_tr, y_tr)
+    t_fit = time.perf_counter() - t0
+    score = float(check_scoring(clf, scoring=scoring)(clf, X_te, y_te))
+    if cache is not None:
+        cache.guardar(clave, {"score": score, "t_fit": t_fit})
+    return score, t_fit
+
+
+#--------------------
+# Caché de resultados
+#--------------------
+# Cada evaluación de un candidato en un pliegue se guarda en un JSON cuyo
+# nombre es el hash de todo lo que la determina:
+#   - datos del train (X, y) y la partición del pliegue (índices),
+#   - el preprocesador sin ajustar (con sus parámetros),
+#   - el clasificador sin ajustar con los parámetros del candidato,
+#   - el scorer y `_VERSION_CACHE`.
+# Los estimadores se resumen con `joblib.hash` sobre el clon sin ajustar
+# (incluye la versión de sklearn). El modelo final (Pipeline reajustado sobre
+# el train completo) se guarda igual con `joblib.dump`.
+#
+# Los workers escriben cada resultado al terminarlo (escritura atómica con
+# `os.replace`), así que una ejecución interrumpida conserva lo ya evaluado.
+# Al repetir, `buscar_*` solo lanza las evaluaciones que faltan y
+# `MatricesCV` solo vectoriza si queda alguna: añadir un modelo o un valor al
+# grid cuesta solo sus ajustes. Los `mean_fit_time` de los resultados leídos
+# son los de la ejecución que los calculó.
+
+# Subir si cambia la forma de evaluar (invalida la caché existente).
+_VERSION_CACHE: int = 1
+
+
+class CacheResultados:
+    """
+    Caché en disco direccionada por contenido: `<directorio>/<ab>/<clave>.json`
+    para evaluaciones y `.joblib` para modelos. `aciertos`/`fallos` cuentan
+    las consultas hechas en este proceso.
+    """
+
+    def __init__(self, directorio: Path):
+        self.directorio = Path(directorio)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _ruta(self, clave: str, sufijo: str) -> Path:
+        return self.directorio / clave[:2] / f"{clave}{sufijo}"
+
+    def _escribir(self, ruta: Path, escribir) -> None:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        escribir(tmp)
+        os.replace(tmp, ruta)
+
+    def leer(self, clave: str) -> Optional[Dict]:
+        """Resultado guardado para `clave` o None (también si el fichero está dañado)."""
+        try:
+            with open(self._ruta(clave, ".json"), encoding="utf-8") as f:
+                valor = json.load(f)
+        except (OSError, ValueError):
+            valor = None
+        if valor is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return valor
+
+    def guardar(self, clave: str, valor: Dict) -> None:
+        def escribir(tmp: Path) -> None:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(valor, f)
+        self._escribir(self._ruta(clave, ".json"), escribir)
+
+    def leer_modelo(self, clave: str):
+        ruta = self._ruta(clave, ".joblib")
+        if not ruta.exists():
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return joblib.load(ruta)
+
+    def guardar_modelo(self, clave: str, modelo) -> None:
+        self._escribir(self._ruta(clave, ".joblib"), lambda tmp: joblib.dump(modelo, tmp))
+
+    def resumen(self) -> str:
+        total = self.aciertos + self.fallos
+        return f"{self.aciertos}/{total} resultados en caché ({self.directorio})"
+
+
+def _clave(tipo: str, huella: str, estimador, params: Dict, *extra) -> str:
+    """Clave de contenido de una evaluación, ruta o modelo (`params` con prefijo `clf__`)."""
+    clf = clone(estimador).set_params(**_params_clf(params))
+    return joblib.hash((_VERSION_CACHE, tipo, huella, clf, *extra))
+
+
+def _evaluar_tareas(estimador, tareas: List[Tuple[Dict, MatricesCV, int]], scoring,
+                    cache: Optional[CacheResultados], n_jobs: Optional[int]) -> List[Tuple[float, float]]:
+    """
+    (score, segundos) de cada tarea (params del clasificador, matrices, pliegue):
+    las que están en `cache` se leen y el resto se evalúa en paralelo.
+    """
+    salida: List[Optional[Tuple[float, float]]] = [None] * len(tareas)
+    pendientes = []
+    for j, (params, matrices, i) in enumerate(tareas):
+        clave = None
+        if cache is not None:
+            clave = _clave("evaluacion", matrices.huellas[i], estimador, params, scoring)
+            valor = cache.leer(clave)
+            if valor is not None:
+                salida[j] = (valor["score"], valor["t_fit"])
+                continue
+        pendientes.append((j, clave))
+    calculadas = Parallel(n_jobs=n_jobs)(
+        delayed(_evaluar)(estimador, tareas[j][0], *tareas[j][1].refs[tareas[j][2]], scoring, cache, clave)
+        for j, clave in pendientes)
+    for (j, _), valor in zip(pendientes, calculadas):
+        salida[j] = valor
+    return salida
+
+
+def _reajustar(estimador, params: Dict, matrices: MatricesCV,
+               cache: Optional[CacheResultados]) -> Pipeline:
+    """Pipeline (preprocesador del train completo + clasificador con `params`), de la caché si está."""
+    clave = None
+    if cache is not None:
+        clave = _clave("modelo", matrices.huella_completo, estimador, params, matrices.nombre_pre)
+        best = cache.leer_modelo(clave)
+        if best is not None:
+            return best
+    clf = clone(estimador).set_params(**_params_clf(params))
+    clf.fit(matrices.X, matrices.y)
+    best = Pipeline(steps=[(matrices.nombre_pre, matrices.preprocesador), (PASO_CLF, clf)])
+    if cache is not None:
+        cache.guardar_modelo(clave, best)
+    return best
+
+
+class ResultadoBusqueda:
+    """
+    Resultado de `buscar_grid` / `buscar_ruta` / `buscar_halving` con los mismos atributos que
+    usan los scripts de `GridSearchCV`: `best_params_`, `best_score_`,
+    `best_index_`, `best_estimator_` (Pipeline ajustado), `cv_results_` y
+    `predict` (`buscar_halving` añade `rondas_`).
+    """
+
+    def __init__(self, cv_results: Dict, best_index: int, best_estimator: Pipeline,
+                 rondas: Optional[List[Dict]] = None):
+        self.cv_results_ = cv_results
+        self.best_index_ = best_index
+        self.best_params_ = cv_results["params"][best_index]
+        self.best_score_ = float(cv_results["mean_test_score"][best_index])
+        self.best_estimator_ = best_estimator
+        # Traza por ronda (solo `buscar_halving`)
+        self.rondas_ = rondas or []
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+
+def buscar_grid(estimador, param_grid: Dict, matrices: MatricesCV, scoring: str = "f1_macro",
+                n_jobs: Optional[int] = -1, cache: Optional[CacheResultados] = None) -> ResultadoBusqueda:
+    """
+    Equivalente a `GridSearchCV(Pipeline([(pre, ...), ("clf", estimador)]), param_grid,
+    cv=..., scoring=scoring, refit=True).fit(X, y)` usando las matrices ya
+    transformadas de `matrices`. Con `cache` solo se ajusta lo que no está guardado.
+    """
+    candidatos = list(ParameterGrid(param_grid))
+    n_pl = matrices.n_pliegues
+    salida = _evaluar_tareas(estimador, [(params, matrices, i) for params in candidatos for i in range(n_pl)],
+                             scoring, cache, n_jobs)
+    scores = np.array([s for s, _ in salida], dtype=float).reshape(len(candidatos), n_pl)
+    t_fit = np.array([t for _, t in salida], dtype=float).reshape(len(candidatos), n_pl)
+    return _resultado(estimador, candidatos, scores, t_fit, matrices, cache=cache)
+
+
+def _resultado(estimador, candidatos: List[Dict], scores: np.ndarray, t_fit: np.ndarray,
+               matrices: MatricesCV, extra: Optional[Dict] = None,
+               cache: Optional[CacheResultados] = None) -> ResultadoBusqueda:
+    """`cv_results_`, mejor candidato y reajuste sobre el train completo (candidatos x pliegues)."""
+    medias = scores.mean(axis=1)
+    cv_results = {
+        "params": candidatos,
+        "mean_test_score": medias,
+        "std_test_score": scores.std(axis=1),
+        "mean_fit_time": t_fit.mean(axis=1),
+        **{f"split{i}_test_score": scores[:, i] for i in range(scores.shape[1])},
+        **(extra or {}),
+    }
+    # Primer máximo (GridSearchCV: rank "min" y argmin del rank)
+    best_index = int(np.nanargmax(medias))
+    best = _reajustar(estimador, candidatos[best_index], matrices, cache)
+    return ResultadoBusqueda(cv_results, best_index, best)
+
+
+#------------------------------------------------
+# Ruta de regularización con arranque en caliente
+#------------------------------------------------
+# `buscar_ruta` recorre los valores de `C` de menor a mayor en cada pliegue y
+# arranca cada ajuste desde los coeficientes del anterior: con soluciones
+# vecinas, los ajustes siguientes necesitan pocas iteraciones y un grid denso
+# (20-50 valores) cuesta un múltiplo pequeño de un ajuste.
+#
+# - LogisticRegression: `warm_start=True` de sklearn (lbfgs parte de `coef_`).
+# - LinearSVC: liblinear no admite arranque en caliente, así que la ruta
+#   resuelve el mismo problema primal (L2 + hinge al cuadrado, one-vs-rest,
+#   sesgo como columna `intercept_scaling` regularizada) con Newton truncado
+#   (gradiente conjugado por columnas + búsqueda de paso) y el criterio de
+#   parada de liblinear: |g| <= tol * max(min(pos, neg), 1) / n * |g(0)|.
+#   Los coeficientes se cargan en un `LinearSVC` para puntuar con el mismo
+#   scorer.
+#
+# Las puntuaciones coinciden con ajustes en frío salvo la tolerancia del
+# optimizador. El modelo final se reajusta en frío con el estimador original
+# (liblinear / lbfgs) y el mejor `C`.
+
+# Iteraciones máximas del gradiente conjugado por paso de Newton.
+_MAX_CG: int = 50
+
+
+def _ruta_hinge2(X, Y: np.ndarray, valores: List[float], tol: float, max_iter: int):
+    """
+    Ruta L2 + hinge al cuadrado sobre `X` (con la columna de sesgo) para las
+    columnas ±1 de `Y`. Genera (W, iteraciones de Newton) para cada `C`.
+    """
+    n, k = Y.shape
+    XT = X.T.tocsr()
+    positivos = (Y > 0).sum(axis=0)
+    tol_col = tol * np.maximum(np.minimum(positivos, n - positivos), 1) / n
+    W = np.zeros((X.shape[1], k))
+    XW = np.zeros((n, k))
+    for C in valores:
+        g0 = np.linalg.norm(2 * C * (XT @ Y), axis=0)       # gradiente en W = 0
+        it = 0
+        while it < max_iter:
+            M = 1 - Y * XW
+            A = M > 0
+            G = W - 2 * C * (XT @ (Y * M * A))
+            gn = np.linalg.norm(G, axis=0)
+            activas = gn > tol_col * g0
+            if not activas.any():
+                break
+            it += 1
+            # (I + 2C X_A' X_A) S = -G, columna a columna
+            S = np.zeros_like(W)
+            R = -G
+            P = R.copy()
+            rr = (R * R).sum(axis=0)
+            for _ in range(_MAX_CG):
+                HP = P + 2 * C * (XT @ (A * (X @ P)))
+                a = np.where(activas, rr / np.maximum((P * HP).sum(axis=0), 1e-300), 0.0)
+                S += a * P
+                R -= a * HP
+                rr_nuevo = (R * R).sum(axis=0)
+                if (np.sqrt(rr_nuevo) <= 0.1 * gn)[activas].all():
+                    break
+                P = R + (rr_nuevo / np.maximum(rr, 1e-300)) * P
+                rr = rr_nuevo
+            # Paso de Armijo por columna
+            XS = X @ S
+            f0 = 0.5 * (W * W).sum(axis=0) + C * ((M * A) ** 2).sum(axis=0)
+            gs = (G * S).sum(axis=0)
+            t = np.ones(k)
+            for _ in range(30):
+                Wt = W + t * S
+                Mt = np.maximum(1 - Y * (XW + t * XS), 0)
+                ft = 0.5 * (Wt * Wt).sum(axis=0) + C * (Mt * Mt).sum(axis=0)
+                ok = (ft <= f0 + 0.01 * t * gs) | ~activas
+                if ok.all():
+                    break
+                t = np.where(ok, t, 0.5 * t)
+            W = W + t * S
+            XW = XW + t * XS
+        yield W, it
+
+
+def _comprobar_svc(svc: LinearSVC) -> None:
+    """La ruta reproduce solo la configuración por defecto de LinearSVC."""
+    p = svc.get_params()
+    if (p["penalty"], p["loss"], p["multi_class"], p["class_weight"]) != ("l2", "squared_hinge", "ovr", None):
+        raise ValueError("Ruta de C para LinearSVC: solo penalty='l2', loss='squared_hinge', "
+                         "multi_class='ovr' y sin class_weight.")
+
+
+def _ruta_pliegue(estimador, param: str, valores: List[float], ref_tr: MatrizMapeada,
+                  ref_te: MatrizMapeada, y_tr, y_te, scoring,
+                  cache: Optional[CacheResultados] = None, clave: Optional[str] = None):
+    """
+    Recorre `valores` de `param` en un pliegue. Devuelve (scores, segundos,
+    iteraciones) por valor; con `cache` los guarda al terminar.
+    """
+    salida = _ruta_pliegue_calcular(estimador, param, valores, ref_tr, ref_te, y_tr, y_te, scoring)
+    if cache is not None:
+        cache.guardar(clave, {"scores": salida[0], "t_fit": salida[1], "iters": salida[2]})
+    return salida
+
+
+def _ruta_pliegue_calcular(estimador, param: str, valores: List[float], ref_tr: MatrizMapeada,
+                           ref_te: MatrizMapeada, y_tr, y_te, scoring):
+    X_tr, X_te = ref_tr.abrir(), ref_te.abrir()
+    scores, tiempos, iters = [], [], []
+    if isinstance(estimador, LogisticRegression):
+        clf = clone(estimador).set_params(warm_start=True)
+        scorer = check_scoring(clf, scoring=scoring)
+        for v in valores:
+            t0 = time.perf_counter()
+            clf.set_params(**{param: v}).fit(X_tr, y_tr)
+            tiempos.append(time.perf_counter() - t0)
+            iters.append(int(np.max(clf.n_iter_)))
+            scores.append(float(scorer(clf, X_te, y_te)))
+        return scores, tiempos, iters
+
+    _comprobar_svc(estimador)
+    clf = clone(estimador)
+    clases = np.unique(y_tr)
+    # Binario: una sola columna con clases_[1] como positiva (como liblinear)
+    positivas = clases[1:] if len(clases) == 2 else clases
+    Y = np.where(np.asarray(y_tr)[:, None] == positivas[None, :], 1.0, -1.0)
+    escala = clf.intercept_scaling if clf.fit_intercept else None
+    if escala is not None:
+        X_tr = sp.hstack([X_tr, np.full((X_tr.shape[0], 1), escala)], format="csr")
+    clf.classes_ = clases
+    clf.n_features_in_ = X_te.shape[1]
+    scorer = check_scoring(clf, scoring=scoring)
+    t0 = time.perf_counter()
+    for W, it in _ruta_hinge2(X_tr, Y, valores, clf.tol, clf.max_iter):
+        if escala is None:
+            clf.coef_, clf.intercept_ = W.T.copy(), np.zeros(W.shape[1])
+        else:
+            clf.coef_, clf.intercept_ = W[:-1].T.copy(), escala * W[-1]
+        tiempos.append(time.perf_counter() - t0)
+        iters.append(it)
+        scores.append(float(scorer(clf, X_te, y_te)))
+        t0 = time.perf_counter()
+    return scores, tiempos, iters
+
+
+def buscar_ruta(estimador, param_grid: Dict, matrices: MatricesCV, scoring: str = "f1_macro",
+                n_jobs: Optional[int] = -1, cache: Optional[CacheResultados] = None) -> ResultadoBusqueda:
+    """
+    Búsqueda de `clf__C` por ruta de regularización (LogisticRegression o
+    LinearSVC): en cada pliegue (en paralelo) los valores se ajustan en
+    orden creciente arrancando del anterior. `cv_results_` sigue el orden
+    creciente de `C` y añade `mean_n_iter` (iteraciones del optimizador por
+    valor); sus `split{i}_test_score` son la F1 a lo largo de la ruta en cada
+    pliegue. Con `cache` se guarda la ruta completa de cada pliegue (cambiar
+    los valores de C recalcula la ruta).
+    """
+    if not isinstance(estimador, (LogisticRegression, LinearSVC)):
+        raise ValueError(f"Ruta de C no disponible para {type(estimador).__name__}")
+    (clave, valores), = param_grid.items()
+    param = next(iter(_params_clf({clave: None})))
+    if param != "C":
+        raise ValueError(f"La ruta solo recorre '{PASO_CLF}__C', no '{clave}'")
+    valores = sorted(set(valores))
+
+    salida: List = [None] * matrices.n_pliegues
+    pendientes = []
+    for i in range(matrices.n_pliegues):
+        clave_cache = None
+        if cache is not None:
+            clave_cache = _clave("ruta", matrices.huellas[i], estimador, {}, param, valores, scoring)
+            valor = cache.leer(clave_cache)
+            if valor is not None:
+                salida[i] = (valor["scores"], valor["t_fit"], valor["iters"])
+                continue
+        pendientes.append((i, clave_cache))
+    calculadas = Parallel(n_jobs=n_jobs)(
+        delayed(_ruta_pliegue)(estimador, param, valores, *matrices.refs[i], scoring, cache, clave_cache)
+        for i, clave_cache in pendientes)
+    for (i, _), valor in zip(pendientes, calculadas):
+        salida[i] = valor
+    scores, t_fit, iters = (np.array([o[j] for o in salida], dtype=float).T for j in range(3))
+    candidatos = [{clave: v} for v in valores]
+    return _resultado(estimador, candidatos, scores, t_fit, matrices,
+                      extra={"mean_n_iter": iters.mean(axis=1)}, cache=cache)
+
+
+#----------------------------------------------
+# Successive halving con presupuesto (texto + clf)
+#----------------------------------------------
+# `buscar_halving` admite en el grid parámetros del preprocesador
+# (`pre__tfidf__ngram_range`, `min_df`, `max_df`, `sublinear_tf`...) además
+# de los del clasificador. Por rondas:
+#
+# - ronda i: los candidatos vivos se evalúan con CV sobre una submuestra
+#   estratificada de n_i filas (las submuestras están anidadas; la última es
+#   el train completo) y pasan a la siguiente los ceil(n/factor) mejores;
+# - n_i = N / factor^(rondas-1-i) y el nº de rondas es el de sklearn
+#   (`HalvingGridSearchCV`, min_resources="exhaust"): hasta quedar pocos
+#   candidatos o llegar a `min_recursos` filas en la primera ronda;
+# - en cada ronda los candidatos se agrupan por parámetros del preprocesador:
+#   cada grupo vectoriza una vez por pliegue (`MatricesCV`) y todos los
+#   valores del clasificador del grupo reutilizan esas matrices.
+#
+# Presupuesto (opcional):
+# - `presupuesto`: coste máximo en "ajustes sobre el train completo" (una
+#   evaluación de un candidato en un pliegue con n filas cuesta n/N). Si el
+#   plan no cabe se evalúa una muestra aleatoria (`random_state`) de los
+#   candidatos en la primera ronda.
+# - `presupuesto_s`: segundos. Antes de cada ronda se estima su coste con la
+#   velocidad medida hasta entonces; si no cabe se promueven menos
+#   candidatos y, si ni con uno cabe, se salta directamente a la ronda final
+#   (el train completo siempre se evalúa con al menos un candidato).
+#
+# El mejor candidato es el primero con mayor F1 media de la última ronda; el
+# modelo final se reajusta sobre todo el train como en `buscar_grid`.
+
+
+def _separar_params(params: Dict, nombre_pre: str) -> Tuple[Dict, Dict]:
+    """Parámetros del preprocesador (sin prefijo) y del clasificador (`clf__...`)."""
+    prefijo = nombre_pre + "__"
+    pre = {k[len(prefijo):]: v for k, v in params.items() if k.startswith(prefijo)}
+    return pre, {k: v for k, v in params.items() if not k.startswith(prefijo)}
+
+
+def _orden_estratificado(y, semilla: int) -> np.ndarray:
+    """
+    Permutación de las filas en la que cualquier prefijo mantiene las
+    proporciones de clase: cada fila se ordena por su posición relativa
+    dentro de su clase (tras barajar).
+    """
+    rng = np.random.default_rng(semilla)
+    _, codigos = np.unique(np.asarray(y), return_inverse=True)
+    perm = rng.permutation(len(codigos))
+    pos = np.empty(len(codigos))
+    for c in range(codigos.max() + 1):
+        filas = perm[codigos[perm] == c]
+        pos[filas] = (np.arange(len(filas)) + rng.random(len(filas))) / len(filas)
+    return np.argsort(pos, kind="stable")
+
+
+def _plan_halving(n_cand: int, n_total: int, factor: int, min_recursos: int) -> Tuple[List[int], List[int]]:
+    """Filas y candidatos por ronda (como `HalvingGridSearchCV` con "exhaust")."""
+    posibles = 1 + int(np.floor(np.log(n_total / min_recursos) / np.log(factor))) if n_total > min_recursos else 1
+    necesarias = 1 + int(np.floor(np.log(n_cand) / np.log(factor))) if n_cand > 1 else 1
+    rondas = min(posibles, necesarias)
+    filas = [n_total // factor ** (rondas - 1 - i) for i in range(rondas)]
+    cands = [int(np.ceil(n_cand / factor ** i)) for i in range(rondas)]
+    return filas, cands
+
+
+def _coste(filas: List[int], cands: List[int], n_total: int, n_splits: int) -> float:
+    """Coste de un plan en ajustes equivalentes sobre el train completo."""
+    return n_splits * sum(f * c / n_total for f, c in zip(filas, cands))
+
+
+def buscar_halving(estimador, preprocesador, param_grid, X, y, cv, nombre_pre: str = "pre",
+                   scoring: str = "f1_macro", factor: int = 3, min_recursos: Optional[int] = None,
+                   presupuesto: Optional[float] = None, presupuesto_s: Optional[float] = None,
+                   random_state: int = 0, n_jobs: Optional[int] = -1,
+                   cache: Optional[CacheResultados] = None) -> ResultadoBusqueda:
+    """
+    Successive halving sobre `Pipeline([(nombre_pre, preprocesador), ("clf", estimador)])`
+    con `param_grid` (dict o lista de dicts, como `GridSearchCV`). `X`/`y` son
+    los datos sin transformar. `cv_results_` incluye todas las evaluaciones
+    (`iter`, `n_resources`) y `rondas_` la traza por ronda. Con `cache` las
+    evaluaciones de cada ronda se leen/guardan como en `buscar_grid`.
+    """
+    t_inicio = time.perf_counter()
+    candidatos = list(ParameterGrid(param_grid))
+    n_total = len(y)
+    n_splits = cv.get_n_splits()
+    n_clases = len(np.unique(np.asarray(y)))
+    if min_recursos is None:
+        min_recursos = min(2 * n_splits * n_clases, n_total)
+    orden = _orden_estratificado(y, random_state)
+
+    filas, cands = _plan_halving(len(candidatos), n_total, factor, min_recursos)
+    if presupuesto is not None and _coste(filas, cands, n_total, n_splits) > presupuesto:
+        n0 = len(candidatos)
+        while n0 > 1:
+            n0 -= 1
+            filas, cands = _plan_halving(n0, n_total, factor, min_recursos)
+            if _coste(filas, cands, n_total, n_splits) <= presupuesto:
+                break
+        elegidos = np.sort(np.random.default_rng(random_state).choice(len(candidatos), n0, replace=False))
+        candidatos = [candidatos[i] for i in elegidos]
+
+    vivos = list(range(len(candidatos)))
+    registros: List[Dict] = []
+    rondas: List[Dict] = []
+    coste_hecho = 0.0
+    ronda = 0
+    final = None
+    while True:
+        ultima = ronda == len(filas) - 1
+        n_filas = filas[ronda]
+        recortado = False
+        if presupuesto_s is not None and ronda > 0:
+            # Segundos por unidad de coste medidos hasta ahora
+            ritmo = (time.perf_counter() - t_inicio) / max(coste_hecho, 1e-9)
+            restante = presupuesto_s - (time.perf_counter() - t_inicio)
+
+            def estimado(n: int, desde: int) -> float:
+                resto = filas[desde:]
+                return ritmo * _coste(resto, [max(1, int(np.ceil(n / factor ** j))) for j in range(len(resto))],
+                                      n_total, n_splits)
+
+            if not ultima and estimado(1, ronda) > restante:
+                # Ni con un candidato caben las rondas intermedias: a la final
+                ronda = len(filas) - 1
+                ultima, n_filas, recortado = True, filas[-1], True
+            n = len(vivos)
+            while n > 1 and estimado(n, ronda) > restante:
+                n -= 1
+            if n < len(vivos):
+                vivos, recortado = vivos[:n], True
+
+        t0 = time.perf_counter()
+        idx = np.sort(orden[:n_filas])
+        X_r, y_r = _safe_indexing(X, idx), _safe_indexing(y, idx)
+        huella_r = joblib.hash((X_r, y_r)) if cache is not None else None
+        grupos: Dict[str, List[int]] = {}
+        for c in vivos:
+            clave = repr(sorted(_separar_params(candidatos[c], nombre_pre)[0].items()))
+            grupos.setdefault(clave, []).append(c)
+        matrices: Dict[str, MatricesCV] = {}
+        for clave, miembros in grupos.items():
+            pre = clone(preprocesador).set_params(**_separar_params(candidatos[miembros[0]], nombre_pre)[0])
+            matrices[clave] = MatricesCV(pre, X_r, y_r, cv, n_jobs=n_jobs, nombre_pre=nombre_pre,
+                                         huella_datos=huella_r)
+        tareas = [(c, clave, pl) for clave, miembros in grupos.items() for c in miembros
+                  for pl in range(n_splits)]
+        salida = _evaluar_tareas(
+            estimador, [(_separar_params(candidatos[c], nombre_pre)[1], matrices[clave], pl)
+                        for c, clave, pl in tareas], scoring, cache, n_jobs)
+        scores: Dict[int, List[float]] = {}
+        tiempos: Dict[int, List[float]] = {}
+        for (c, _, _), (sc, tf) in zip(tareas, salida):
+            scores.setdefault(c, []).append(sc)
+            tiempos.setdefault(c, []).append(tf)
+        for c in vivos:
+            registros.append({"iter": ronda, "n_resources": n_filas, "candidato": c,
+                              "scores": scores[c], "t_fit": tiempos[c]})
+        coste_hecho += _coste([n_filas], [len(vivos)], n_total, n_splits)
+
+        medias = {c: float(np.mean(scores[c])) for c in vivos}
+        # A igual media, el primero del grid
+        ranking = sorted(vivos, key=lambda c: (-medias[c], c))
+        rondas.append({
+            "ronda": ronda,
+            "n_muestras": n_filas,
+            "n_candidatos": len(vivos),
+            "n_vectorizaciones": len(grupos),
+            "segundos": round(time.perf_counter() - t0, 3),
+            "coste_acumulado": round(coste_hecho, 3),
+            "recortado_por_presupuesto": recortado,
+            "mejor_f1_macro": medias[ranking[0]],
+            "mejores": [{"params": candidatos[c], "f1_macro": medias[c]} for c in ranking[:5]],
+        })
+        if ultima:
+            clave_mejor = next(k for k, m in grupos.items() if ranking[0] in m)
+            final = matrices.pop(clave_mejor)
+            for m in matrices.values():
+                m.cerrar()
+            break
+        for m in matrices.values():
+            m.cerrar()
+        # Vivos en orden de ranking: si el presupuesto recorta, se quedan los mejores
+        vivos = ranking[:cands[ronda + 1]]
+        ronda += 1
+
+    mejor = ranking[0]
+    cv_results = {
+        "params": [candidatos[r["candidato"]] for r in registros],
+        "iter": np.array([r["iter"] for r in registros]),
+        "n_resources": np.array([r["n_resources"] for r in registros]),
+        "mean_test_score": np.array([np.mean(r["scores"]) for r in registros]),
+        "std_test_score": np.array([np.std(r["scores"]) for r in registros]),
+        "mean_fit_time": np.array([np.mean(r["t_fit"]) for r in registros]),
+        **{f"split{i}_test_score": np.array([r["scores"][i] for r in registros]) for i in range(n_splits)},
+    }
+    best_index = next(i for i, r in enumerate(registros) if r["iter"] == ronda and r["candidato"] == mejor)
+
+    best = _reajustar(estimador, _separar_params(candidatos[mejor], nombre_pre)[1], final, cache)
+    final.cerrar()
+    return ResultadoBusqueda(cv_results, best_index, best, rondas=rondas)
+
+
+def escribir_cv_results(resultado: ResultadoBusqueda, destino: Path) -> None:
+    """
+    Escribe `cv_results_` como CSV (`;`, UTF-8): una fila por candidato con
+    sus parámetros, la media/desviación y la puntuación de cada pliegue.
+    """
+    cv = resultado.cv_results_
+    params = list(dict.fromkeys(k for cand in cv["params"] for k in cand))
+    otras = [k for k in cv if k != "params"]
+    with open(destino, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(params + otras)
+        for i, cand in enumerate(cv["params"]):
+            w.writerow([cand.get(p, "") for p in params] + [cv[k][i].item() for k in otras])